@@ -1,12 +1,25 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from config import Config
+from app.routing import RoutingSession
 import os
+import sqlite3
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 
+# SQLite ships with foreign key enforcement off; the ON DELETE CASCADE rules on
+# the models rely on it, so enable it on every new connection.
+@event.listens_for(Engine, "connect")
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
@@ -19,9 +32,46 @@ def create_app(config_class=Config):
     except OSError:
         pass # Already exists or other error
 
+    # Each shard database is a bind named shard0 .. shardN-1
+    if app.config.get('SHARD_DATABASE_URLS'):
+        app.config['SQLALCHEMY_BINDS'] = {
+            **(app.config.get('SQLALCHEMY_BINDS') or {}),
+            **{f'shard{index}': url for index, url in enumerate(app.config['SHARD_DATABASE_URLS'])}
+        }
+
     db.init_app(app)
     migrate.init_app(app, db)
 
+    # JSON or MessagePack bodies, negotiated per request (see app/serialization.py)
+    from app.serialization import init_serialization
+    init_serialization(app)
+
+    # Spans for requests, their SQL and serialization (see app/tracing.py); first so they cover every other hook
+    from app.tracing import init_tracing
+    init_tracing(app)
+
+    # Request latency window, then rate limits and load shedding ahead of every other hook
+    from app.metrics import init_metrics
+    from app.admission import init_admission
+    init_metrics(app)
+    init_admission(app)
+
+    # Admin-only ?__profile=cpu|alloc on /api requests
+    from app.profiling import init_profiling
+    init_profiling(app)
+
+    # Slow SQL statements with their query plans (GET /api/admin/slow-queries)
+    from app.slow_queries import init_slow_queries
+    init_slow_queries(app)
+
+    # Short-lived cache for the aggregate statistics endpoints
+    from app.cache import TTLCache
+    app.extensions['stats_cache'] = TTLCache(app.config.get('STATS_CACHE_TTL', 0))
+
+    # Status shared between the purge worker and the /api/deletions endpoint
+    from app.purge import new_purge_status
+    app.extensions['purge_status'] = new_purge_status()
+
     # Import models here to ensure they are registered with SQLAlchemy
     from app import models 
 
@@ -30,11 +80,55 @@ def create_app(config_class=Config):
     from app.routes.stages_bp import stages_api_bp
     from app.routes.tasks_bp import tasks_api_bp
     from app.routes.subtasks_bp import subtasks_api_bp
+    from app.routes.deletions_bp import deletions_api_bp
+    from app.routes.batch_bp import batch_api_bp
+    from app.routes.jobs_bp import jobs_api_bp
+    from app.routes.health_bp import health_bp
+    from app.routes.admin_bp import admin_api_bp
+    from app.routes.activity_bp import activity_api_bp
 
     app.register_blueprint(projects_api_bp, url_prefix='/api')
     app.register_blueprint(stages_api_bp, url_prefix='/api')
     app.register_blueprint(tasks_api_bp, url_prefix='/api')
     app.register_blueprint(subtasks_api_bp, url_prefix='/api')
+    app.register_blueprint(deletions_api_bp, url_prefix='/api')
+    app.register_blueprint(batch_api_bp, url_prefix='/api')
+    app.register_blueprint(jobs_api_bp, url_prefix='/api')
+    app.register_blueprint(admin_api_bp, url_prefix='/api')
+    app.register_blueprint(activity_api_bp, url_prefix='/api')
+    app.register_blueprint(health_bp)
+
+    # gzip/br/zstd for /api responses, negotiated from Accept-Encoding
+    from app.compression import init_compression
+    init_compression(app)
+
+    # GETs read from the replica bind when one is configured
+    from app.replicas import init_replicas
+    init_replicas(app)
+
+    # Requests on a project tree go to that project's shard when sharding is configured
+    from app.sharding import init_sharding
+    init_sharding(app)
+
+    # Thread pool for background jobs (POST /api/jobs)
+    from app.jobs import init_jobs
+    init_jobs(app)
+
+    # Activity feed: committed changes are queued and written in batches in the background
+    from app.activity import init_activity
+    init_activity(app)
+
+    # Register CLI commands (maintenance/repair tasks)
+    from app.commands import register_commands
+    register_commands(app)
+
+    # Background purge of soft-deleted projects/stages. The thread starts with the
+    # first request, so CLI commands (flask db upgrade, ...) and scripts that only
+    # build the app don't leave a purge loop running.
+    if app.config.get('PURGE_WORKER_ENABLED'):
+        from app.purge import PurgeWorker, start_purge_worker
+        app.extensions['purge_worker'] = PurgeWorker(app)
+        app.before_request(start_purge_worker)
     
     # A simple test route (can be moved or kept here)
     @app.route('/hello')
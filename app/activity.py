@@ -0,0 +1,248 @@
+import atexit
+import queue
+import threading
+from datetime import datetime, timezone
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event, insert, select
+from app import db
+from app.models import ActivityEvent, Stage, Task
+from app.routing import RoutingSession
+
+# Per-project activity feed, written off the request path. Handlers call
+# record_activity() next to their write; the event waits in the session until the
+# transaction commits (a rollback, e.g. a failed batch, discards it) and is then put
+# on an in-process queue. No SQL runs for it during the request. A background
+# writer takes the queue every ACTIVITY_FLUSH_INTERVAL seconds (sooner when a full
+# batch is waiting) and appends it to activity_events with one multi-row INSERT.
+#
+# A handler only knows the nearest ancestor it already has in hand (the stage of a
+# task, the task of a subtask), so the writer resolves events to their project with
+# one query per scope kind and shard per batch. An event whose task or stage was
+# deleted before the writer got to it can't be placed and is counted as unresolved.
+#
+# The queue holds ACTIVITY_QUEUE_SIZE events; see ACTIVITY_OVERFLOW for what a full
+# queue does. Whatever is still queued is written when the process exits.
+
+PENDING_KEY = 'activity_pending' # Session.info: events of the open transaction
+SAVEPOINTS_KEY = 'activity_savepoints' # Session.info: savepoint -> events queued before it
+OVERFLOW_POLICIES = ('drop', 'drop-oldest', 'block')
+
+def _actor():
+    header = current_app.config['ACTIVITY_ACTOR_HEADER']
+    if not header or not has_request_context():
+        return None
+    return request.headers.get(header, '')[:255] or None
+
+# Queue an event for when the current transaction commits. Pass the project_id, or
+# failing that the stage_id or task_id the entity belongs to.
+def record_activity(action, entity_id, project_id=None, stage_id=None, task_id=None, details=None):
+    if 'activity' not in current_app.extensions:
+        return
+    if project_id is not None:
+        scope = ('project', project_id)
+    elif stage_id is not None:
+        scope = ('stage', stage_id)
+    else:
+        scope = ('task', task_id)
+    db.session.info.setdefault(PENDING_KEY, []).append({
+        'action': action,
+        'entity_type': action.split('.', 1)[0],
+        'entity_id': entity_id,
+        'scope': scope,
+        'shard': g.get('db_shard'),
+        'actor': _actor(),
+        'details': details,
+    })
+
+def _after_commit(session):
+    pending = session.info.pop(PENDING_KEY, None)
+    session.info.pop(SAVEPOINTS_KEY, None)
+    if pending and has_app_context() and 'activity' in current_app.extensions:
+        committed_at = datetime.now(timezone.utc)
+        for pending_event in pending:
+            pending_event['created_at'] = committed_at
+        current_app.extensions['activity'].put(pending)
+
+def _after_transaction_create(session, transaction):
+    if transaction.nested:
+        session.info.setdefault(SAVEPOINTS_KEY, {})[transaction] = len(session.info.get(PENDING_KEY, ()))
+
+def _after_soft_rollback(session, previous_transaction):
+    if previous_transaction.nested:
+        # A savepoint (one batch operation) was rolled back: drop only its events
+        kept = session.info.get(SAVEPOINTS_KEY, {}).pop(previous_transaction, 0)
+        del session.info.get(PENDING_KEY, [])[kept:]
+    elif previous_transaction.parent is None:
+        session.info.pop(PENDING_KEY, None)
+        session.info.pop(SAVEPOINTS_KEY, None)
+    # else the internal transaction of a failed flush; the rollback that follows decides
+
+class ActivityLog:
+    def __init__(self, app):
+        self.app = app
+        self.queue = queue.Queue(maxsize=app.config['ACTIVITY_QUEUE_SIZE'])
+        self.batch_size = app.config['ACTIVITY_BATCH_SIZE']
+        self.flush_interval = app.config['ACTIVITY_FLUSH_INTERVAL']
+        self.overflow = app.config['ACTIVITY_OVERFLOW']
+        self.block_timeout = app.config['ACTIVITY_BLOCK_TIMEOUT']
+        self.wake = threading.Event() # Set when a full batch is waiting
+        self._lock = threading.Lock()
+        self._counts = {'written': 0, 'dropped': 0, 'unresolved': 0, 'failed': 0}
+        self._last_error = None
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def put(self, events):
+        for pending_event in events:
+            self._put(pending_event)
+        if self.queue.qsize() >= self.batch_size:
+            self.wake.set()
+
+    def _put(self, pending_event):
+        try:
+            self.queue.put_nowait(pending_event)
+            return
+        except queue.Full:
+            pass
+        if self.overflow == 'block':
+            try:
+                self.queue.put(pending_event, timeout=self.block_timeout)
+                return
+            except queue.Full:
+                pass
+        elif self.overflow == 'drop-oldest':
+            try:
+                self.queue.get_nowait()
+                self._count('dropped')
+                self.queue.put_nowait(pending_event)
+                return
+            except (queue.Empty, queue.Full):
+                pass
+        self._count('dropped')
+
+    def _take(self):
+        events = []
+        while len(events) < self.batch_size:
+            try:
+                events.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    # Write everything queued, in batches. Returns the number of events written.
+    def flush(self):
+        written = 0
+        while True:
+            events = self._take()
+            if not events:
+                return written
+            written += self.write(events)
+
+    def _project_ids(self, events):
+        # (kind, id) -> project id, one query per scope kind and shard
+        project_ids = {}
+        wanted = {}
+        for pending_event in events:
+            kind, scope_id = pending_event['scope']
+            if kind == 'project':
+                project_ids[pending_event['scope']] = scope_id
+            else:
+                wanted.setdefault(pending_event['shard'], {}).setdefault(kind, set()).add(scope_id)
+        for shard, kinds in wanted.items():
+            if shard is not None:
+                g.db_shard = shard
+            if 'stage' in kinds:
+                rows = db.session.execute(select(Stage.id, Stage.project_id).where(Stage.id.in_(kinds['stage'])))
+                project_ids.update((('stage', stage_id), project_id) for stage_id, project_id in rows)
+            if 'task' in kinds:
+                rows = db.session.execute(
+                    select(Task.id, Stage.project_id).join(Stage, Task.stage_id == Stage.id).where(Task.id.in_(kinds['task'])))
+                project_ids.update((('task', task_id), project_id) for task_id, project_id in rows)
+        return project_ids
+
+    def write(self, events):
+        with self.app.app_context():
+            try:
+                project_ids = self._project_ids(events)
+                rows = [{
+                    'project_id': project_ids[pending_event['scope']],
+                    'action': pending_event['action'],
+                    'entity_type': pending_event['entity_type'],
+                    'entity_id': pending_event['entity_id'],
+                    'actor': pending_event['actor'],
+                    'details': pending_event['details'],
+                    'created_at': pending_event['created_at'],
+                } for pending_event in events if pending_event['scope'] in project_ids]
+                if rows:
+                    db.session.execute(insert(ActivityEvent), rows)
+                    db.session.commit()
+                self._count('written', len(rows))
+                self._count('unresolved', len(events) - len(rows))
+                return len(rows)
+            except Exception as e:
+                db.session.rollback()
+                self._count('failed', len(events))
+                self._last_error = str(e)
+                print(f"Error writing {len(events)} activity events: {str(e)}")
+                return 0
+            finally:
+                db.session.remove()
+
+    def snapshot(self):
+        with self._lock:
+            return {'queued': self.queue.qsize(), 'queue_size': self.queue.maxsize, 'overflow': self.overflow,
+                    **self._counts, 'last_error': self._last_error}
+
+class ActivityWriter(threading.Thread):
+    """Daemon thread that writes queued activity events every ACTIVITY_FLUSH_INTERVAL
+    seconds, or as soon as a full batch is waiting."""
+
+    def __init__(self, log):
+        super().__init__(name='activity-writer', daemon=True)
+        self.log = log
+        self._stop_event = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.log.wake.wait(self.log.flush_interval)
+            self.log.wake.clear()
+            self.log.flush()
+
+    def stop(self, timeout=5):
+        # Called at exit: let the current batch finish, then write what is left
+        self._stop_event.set()
+        self.log.wake.set()
+        if self.ident is not None:
+            self.join(timeout)
+        self.log.flush()
+
+    def ensure_started(self):
+        if self.ident is not None:
+            return
+        with self._start_lock:
+            if self.ident is None:
+                self.start()
+                atexit.register(self.stop)
+
+# before_request: start the writer once the app is actually serving (events only
+# come from requests), so CLI commands and scripts don't run it
+def start_activity_writer():
+    current_app.extensions['activity_writer'].ensure_started()
+
+def init_activity(app):
+    if not app.config.get('ACTIVITY_ENABLED'):
+        return
+    if app.config['ACTIVITY_OVERFLOW'] not in OVERFLOW_POLICIES:
+        raise RuntimeError(f"Unknown ACTIVITY_OVERFLOW {app.config['ACTIVITY_OVERFLOW']!r}; "
+                           f"expected one of {', '.join(OVERFLOW_POLICIES)}")
+    app.extensions['activity'] = ActivityLog(app)
+    for event_name, listener in (('after_commit', _after_commit), ('after_transaction_create', _after_transaction_create),
+                                 ('after_soft_rollback', _after_soft_rollback)):
+        if not event.contains(RoutingSession, event_name, listener):
+            event.listen(RoutingSession, event_name, listener)
+    if app.config.get('ACTIVITY_WRITER_ENABLED'):
+        app.extensions['activity_writer'] = ActivityWriter(app.extensions['activity'])
+        app.before_request(start_activity_writer)
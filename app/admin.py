@@ -0,0 +1,24 @@
+import hmac
+from functools import wraps
+from flask import current_app, jsonify, request
+
+# Operator-only features (profiling, the slow query log) are gated by a shared
+# secret: requests must send `X-Admin-Token: <ADMIN_TOKEN>`. Without ADMIN_TOKEN
+# configured they are switched off entirely.
+
+ADMIN_TOKEN_HEADER = 'X-Admin-Token'
+
+def is_admin():
+    token = current_app.config.get('ADMIN_TOKEN')
+    supplied = request.headers.get(ADMIN_TOKEN_HEADER, '')
+    return bool(token) and hmac.compare_digest(supplied.encode(), token.encode())
+
+def admin_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_app.config.get('ADMIN_TOKEN'):
+            return jsonify({"error": "Not found"}), 404
+        if not is_admin():
+            return jsonify({"error": f"A valid {ADMIN_TOKEN_HEADER} header is required"}), 403
+        return view(*args, **kwargs)
+    return wrapper
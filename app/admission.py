@@ -0,0 +1,157 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, g, jsonify, request
+from app.metrics import STARTED_KEY
+
+# Admission control for /api, run before any other request hook:
+#   1. Per-client token buckets. Each client (ADMISSION_CLIENT_HEADER, else the
+#      remote address) gets ADMISSION_RATE requests per second with bursts of
+#      ADMISSION_BURST; endpoints in ADMISSION_EXPENSIVE_ENDPOINTS (full board
+#      fetches) draw from a separate, smaller bucket. Over budget: 429.
+#   2. A global concurrency limit: at most ADMISSION_MAX_CONCURRENT requests run
+#      at once and at most ADMISSION_MAX_WAITING wait for a slot, each for up to
+#      ADMISSION_LATENCY_TARGET seconds. While the recent p99 latency is above
+#      that target, requests that can't start right away aren't queued at all.
+#      Shed requests get 503.
+# Both answer immediately with Retry-After. Buckets are in memory per process,
+# or shared between processes through Redis with ADMISSION_REDIS_URL.
+
+SLOT_KEY = 'kanban.admission_slot'
+
+class MemoryBuckets:
+    def __init__(self, max_clients=10000):
+        self.max_clients = max_clients
+        self._buckets = OrderedDict() # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    # Take one token; returns (allowed, seconds until a token is available)
+    def take(self, key, rate, burst):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False) # Forget the least recently seen client
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+# Same algorithm in one Redis script, timed by the Redis clock so every process agrees
+REDIS_TAKE = """
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or burst
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - updated_at) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+if allowed == 1 then
+    return {1, '0'}
+end
+return {0, tostring((1 - tokens) / rate)}
+"""
+
+class RedisBuckets:
+    def __init__(self, url):
+        import redis # Optional dependency, only needed for a shared backend
+        self._take = redis.Redis.from_url(url).register_script(REDIS_TAKE)
+
+    def take(self, key, rate, burst):
+        try:
+            allowed, retry_after = self._take(keys=[f'admission:{key}'], args=[rate, burst])
+        except Exception as e:
+            # Rate limiting is best effort; don't turn a Redis outage into an API outage
+            print(f"Error checking rate limit in Redis: {str(e)}")
+            return True, 0.0
+        return bool(int(allowed)), float(retry_after)
+
+class ConcurrencyLimit:
+    def __init__(self, max_concurrent, max_waiting):
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self.max_waiting = max_waiting
+        self.waiting = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout):
+        if self._slots.acquire(blocking=False):
+            return True
+        if timeout <= 0:
+            return False
+        with self._lock:
+            if self.waiting >= self.max_waiting:
+                return False
+            self.waiting += 1
+        try:
+            return self._slots.acquire(timeout=timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+    def release(self):
+        self._slots.release()
+
+def _client_key():
+    header = current_app.config.get('ADMISSION_CLIENT_HEADER')
+    return (header and request.headers.get(header)) or request.remote_addr or 'unknown'
+
+def _reject(status, message, retry_after):
+    request.environ.pop(STARTED_KEY, None) # Shed requests don't count towards latency
+    response = jsonify({"error": message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+def admit():
+    if not request.path.startswith('/api/') or g.get('in_batch'):
+        return # Batch operations were admitted with their batch
+    config = current_app.config
+    if request.endpoint in config['ADMISSION_EXPENSIVE_ENDPOINTS']:
+        budget, rate, burst = 'expensive', config['ADMISSION_EXPENSIVE_RATE'], config['ADMISSION_EXPENSIVE_BURST']
+    else:
+        budget, rate, burst = 'default', config['ADMISSION_RATE'], config['ADMISSION_BURST']
+    if rate > 0:
+        allowed, retry_after = current_app.extensions['admission_buckets'].take(f'{budget}:{_client_key()}', rate, burst)
+        if not allowed:
+            return _reject(429, "Too many requests; slow down", retry_after)
+
+    target = config['ADMISSION_LATENCY_TARGET']
+    p99 = current_app.extensions['latency'].percentile(0.99)
+    overloaded = p99 is not None and p99 > target
+    if not current_app.extensions['admission_limit'].acquire(0 if overloaded else target):
+        return _reject(503, "Server is busy; try again shortly", 1)
+    request.environ[SLOT_KEY] = True
+
+def release_after_stream(response):
+    # A streamed body keeps using the database after teardown; keep the slot until it's closed
+    if response.is_streamed and request.environ.pop(SLOT_KEY, False):
+        response.call_on_close(current_app.extensions['admission_limit'].release)
+    return response
+
+def release_slot(exc):
+    if request.environ.pop(SLOT_KEY, False):
+        current_app.extensions['admission_limit'].release()
+
+def init_admission(app):
+    if not app.config.get('ADMISSION_ENABLED'):
+        return
+    if app.config.get('ADMISSION_REDIS_URL'):
+        app.extensions['admission_buckets'] = RedisBuckets(app.config['ADMISSION_REDIS_URL'])
+    else:
+        app.extensions['admission_buckets'] = MemoryBuckets()
+    app.extensions['admission_limit'] = ConcurrencyLimit(app.config['ADMISSION_MAX_CONCURRENT'],
+                                                         app.config['ADMISSION_MAX_WAITING'])
+    app.before_request(admit)
+    app.after_request(release_after_stream)
+    app.teardown_request(release_slot)
@@ -0,0 +1,167 @@
+from flask import current_app
+from sqlalchemy import func, select
+from sqlalchemy.orm import defer, selectinload, with_expression
+from app import db
+from app.models import Project, Stage, Task, SubTask, visible_projects
+from app.routing import restore_routing, routing_state
+from app.tracing import current_span, span
+
+# Board views (a project's stages with their tasks and subtasks) send a fixed-length
+# preview of each task and subtask instead of the full content, which can be
+# hundreds of KB of pasted logs. The content column is deferred and only its
+# prefix and length are read from the database; GET /api/tasks/<id> serves the
+# full text.
+
+def preview_length():
+    return current_app.config['CONTENT_PREVIEW_LENGTH']
+
+def _preview_options(model, length):
+    return (
+        defer(model.content),
+        with_expression(model.content_preview, func.substr(model.content, 1, length)),
+        with_expression(model.content_length, func.length(model.content)),
+    )
+
+# The whole board in four queries (project, stages, tasks, subtasks). Soft-deleted
+# stages are left out in SQL, so their tasks and subtasks aren't loaded either.
+def load_board(project_id):
+    length = preview_length()
+    with span('load_board'): # Its SQL spans are children; the rest is ORM hydration
+        return visible_projects().filter(Project.id == project_id).options(
+            selectinload(Project.stages.and_(Stage.deleted_at.is_(None))).selectinload(Stage.tasks).options(
+                *_preview_options(Task, length),
+                selectinload(Task.subtasks).options(*_preview_options(SubTask, length))
+            )
+        ).first()
+
+# Several boards at once (GET /api/boards), loaded to `depth` in 1 + depth queries
+# whatever their number and size: the projects, then one query per level for all
+# of them, each filtering on the project ids (not on an IN list of parent ids,
+# which selectinload would split into chunks of 500). Returns {project id: board}
+# for the live projects among project_ids; the boards are shaped like GET
+# /api/projects/<id>, cut at the requested depth.
+BOARD_DEPTHS = ('project', 'stages', 'tasks', 'subtasks')
+
+def load_boards(project_ids, depth='subtasks'):
+    length = preview_length()
+    levels = BOARD_DEPTHS.index(depth)
+    with span('load_boards', projects=len(project_ids), depth=depth):
+        projects = visible_projects().filter(Project.id.in_(project_ids)).all()
+        if not projects:
+            return {}
+        found = [project.id for project in projects]
+        live_stages = (Stage.project_id.in_(found), Stage.deleted_at.is_(None))
+        stages = tasks = subtasks = []
+        if levels >= 1:
+            stages = db.session.execute(select(Stage).where(*live_stages).order_by(Stage.order, Stage.id)).scalars().all()
+        if levels >= 2:
+            tasks = db.session.execute(
+                select(Task).join(Stage, Task.stage_id == Stage.id).where(*live_stages)
+                .options(*_preview_options(Task, length)).order_by(Task.order, Task.id)
+            ).scalars().all()
+        if levels >= 3:
+            subtasks = db.session.execute(
+                select(SubTask).join(Task, SubTask.parent_task_id == Task.id).join(Stage, Task.stage_id == Stage.id)
+                .where(*live_stages).options(*_preview_options(SubTask, length)).order_by(SubTask.order, SubTask.id)
+            ).scalars().all()
+
+    subtasks_by_task = {}
+    for subtask in subtasks:
+        subtasks_by_task.setdefault(subtask.parent_task_id, []).append(subtask.to_dict(preview_length=length))
+    tasks_by_stage = {}
+    for task in tasks:
+        data = task.to_dict(preview_length=length)
+        if levels >= 3:
+            data['subtasks'] = subtasks_by_task.get(task.id, [])
+        tasks_by_stage.setdefault(task.stage_id, []).append(data)
+    boards = {project.id: project.to_dict() for project in projects}
+    if levels >= 1:
+        for board in boards.values():
+            board['stages'] = []
+        for stage in stages:
+            data = stage.to_dict()
+            if levels >= 2:
+                data['tasks'] = tasks_by_stage.get(stage.id, [])
+            boards[stage.project_id]['stages'].append(data)
+    return boards
+
+# Streamed board JSON. GET /api/projects/<id> sends the board stage by stage as it
+# is read instead of building the whole dict and string first: the tasks and the
+# subtasks of the board are each read through one streaming cursor (yield_per),
+# ordered stage by stage, and merged as they arrive. The bytes are the same as
+# jsonify(project.to_dict(include_stages=True)) for the compact JSON Flask sends
+# outside debug mode (sorted keys, no spaces, trailing newline); items with equal
+# `order` come out by id.
+
+STREAM_BATCH_SIZE = 500 # Rows fetched per round trip by the streaming cursors
+STAGES_KEY = '"stages":[]'
+
+def can_stream_board():
+    provider = current_app.json
+    pretty = (provider.compact is None and current_app.debug) or provider.compact is False
+    return not pretty
+
+def _dumps(obj):
+    return current_app.json.dumps(obj, separators=(',', ':'))
+
+def _live_stages(project_id):
+    return (Stage.project_id == project_id, Stage.deleted_at.is_(None))
+
+def _stream(statement):
+    return db.session.execute(statement.execution_options(yield_per=STREAM_BATCH_SIZE)).scalars()
+
+def _take_while(rows, pending, belongs):
+    # Rows from the front of an ordered stream (plus the one read ahead) that belong to a parent
+    taken = []
+    row = pending[0] if pending else next(rows, None)
+    while row is not None and belongs(row):
+        taken.append(row)
+        row = next(rows, None)
+    pending[:] = [row] if row is not None else []
+    return taken
+
+# The live project (or None) and a generator of its board JSON. The project is
+# read up front so the caller can answer 404 or set the ETag before streaming; the
+# generator runs after the request's teardown (see stream_with_context), so it gets
+# the request's routing and trace span handed over.
+def stream_board(project_id):
+    project = visible_projects().filter(Project.id == project_id).first()
+    if project is None:
+        return None, None
+    head, _, tail = _dumps({**project.to_dict(), 'stages': []}).partition(STAGES_KEY)
+    chunks = _board_chunks(project.id, head, tail, preview_length(), routing_state(), current_span())
+    return project, chunks
+
+def _board_chunks(project_id, head, tail, length, routing, trace_parent):
+    yield head + STAGES_KEY[:-1]
+    restore_routing(routing)
+
+    stage_order = (Stage.order, Stage.id)
+    with span('load_board', parent=trace_parent): # Reading starts here; rows then arrive batch by batch
+        stages = db.session.execute(select(Stage).where(*_live_stages(project_id)).order_by(*stage_order)).scalars().all()
+        tasks = iter(_stream(
+            select(Task).join(Stage, Task.stage_id == Stage.id).where(*_live_stages(project_id))
+            .options(*_preview_options(Task, length))
+            .order_by(*stage_order, Task.order, Task.id)
+        ))
+        subtasks = iter(_stream(
+            select(SubTask).join(Task, SubTask.parent_task_id == Task.id).join(Stage, Task.stage_id == Stage.id)
+            .where(*_live_stages(project_id))
+            .options(*_preview_options(SubTask, length))
+            .order_by(*stage_order, Task.order, Task.id, SubTask.order, SubTask.id)
+        ))
+    pending_task, pending_subtask = [], []
+    for index, stage in enumerate(stages):
+        with span('Stage.to_dict', parent=trace_parent):
+            data = stage.to_dict()
+            data['tasks'] = []
+            for task in _take_while(tasks, pending_task, lambda task: task.stage_id == stage.id):
+                task_data = task.to_dict(preview_length=length)
+                task_data['subtasks'] = [
+                    subtask.to_dict(preview_length=length)
+                    for subtask in _take_while(subtasks, pending_subtask, lambda subtask: subtask.parent_task_id == task.id)
+                ]
+                data['tasks'].append(task_data)
+            chunk = (',' if index else '') + _dumps(data)
+        yield chunk
+    yield ']' + tail + '\n'
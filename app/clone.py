@@ -0,0 +1,113 @@
+from datetime import datetime, timezone
+from sqlalchemy import Column, LargeBinary, MetaData, Table, cast, delete, func, insert, literal, null, select
+from app import db
+from app.models import Project, Stage, Task, SubTask, UUIDBinary
+from app.routing import current_shard_bucket
+from app.sharding import project_id_on_current_shard
+
+# Server-side project clone (templates). The tree is copied inside the database
+# with INSERT ... SELECT statements: first an old id -> new id mapping of every row
+# to copy is built in a temporary table (new ids are random 16-byte keys drawn by
+# the database, with the shard bucket prefix when sharded, like generate_uuid),
+# then each table is copied joined against the mapping for its own new id and its
+# new parent's id. No row or id passes through Python.
+
+_mapping_metadata = MetaData()
+clone_ids = Table(
+    'clone_ids', _mapping_metadata,
+    Column('old_id', UUIDBinary, primary_key=True),
+    Column('new_id', UUIDBinary, nullable=False),
+    prefixes=['TEMPORARY'],
+)
+
+def _random_bytes(count, dialect):
+    if dialect == 'sqlite':
+        return func.randomblob(count)
+    return func.substring(func.uuid_send(func.gen_random_uuid()), 1, count) # PostgreSQL
+
+def _new_id(dialect):
+    bucket = current_shard_bucket()
+    if bucket is None:
+        return _random_bytes(16, dialect)
+    # || yields text on SQLite; the cast keeps the key a 16-byte BLOB
+    return cast(literal(bucket.to_bytes(2, 'big'), LargeBinary).concat(_random_bytes(14, dialect)), LargeBinary)
+
+def _shifted(column, days, dialect):
+    if not days:
+        return column
+    if dialect == 'sqlite':
+        return func.date(column, f'{days:+d} days')
+    return column + days # PostgreSQL: date + integer
+
+# Copy a live project with its live stages and (optionally) tasks and subtasks.
+# Returns (new project, {'stages': n, 'tasks': n, 'subtasks': n}), or None when
+# the source project doesn't exist. The caller commits; a taken name raises
+# IntegrityError.
+def clone_project(source_id, name, description=None, include_tasks=True, include_subtasks=True,
+                  include_assignees=True, shift_days=0):
+    now = datetime.now(timezone.utc)
+    new_project_id = project_id_on_current_shard()
+    description_value = literal(description, Project.description.type) if description is not None else Project.description
+    project = db.session.execute(
+        insert(Project).from_select(
+            ['id', 'name', 'description', 'created_at', 'updated_at'],
+            select(literal(new_project_id, Project.id.type), literal(name, Project.name.type), description_value,
+                   literal(now, Project.created_at.type), literal(now, Project.updated_at.type))
+            .where(Project.id == source_id, Project.deleted_at.is_(None))
+        ).returning(Project)
+    ).scalar_one_or_none()
+    if project is None:
+        return None
+
+    connection = db.session.connection(bind_arguments={'mapper': Project})
+    clone_ids.create(connection, checkfirst=True)
+    dialect = connection.dialect.name
+
+    # Every id to copy, with a fresh id for each. The mapping table isn't a model
+    # table, so it's written through the connection that holds the project's
+    # transaction (the project's shard when sharded).
+    new_id = _new_id(dialect)
+    stage_ids = select(Stage.id).where(Stage.project_id == source_id, Stage.deleted_at.is_(None))
+    to_copy = {'stages': stage_ids}
+    if include_tasks:
+        to_copy['tasks'] = select(Task.id).where(Task.stage_id.in_(stage_ids))
+        if include_subtasks:
+            to_copy['subtasks'] = select(SubTask.id).join(Task, SubTask.parent_task_id == Task.id).where(
+                Task.stage_id.in_(stage_ids))
+    counts = {'stages': 0, 'tasks': 0, 'subtasks': 0}
+    for table, ids in to_copy.items():
+        counts[table] = connection.execute(
+            insert(clone_ids).from_select(['old_id', 'new_id'], ids.add_columns(new_id))
+        ).rowcount
+
+    own, parent = clone_ids.alias('own'), clone_ids.alias('parent')
+    created_at, updated_at = literal(now, Stage.created_at.type), literal(now, Stage.updated_at.type)
+    db.session.execute(insert(Stage).from_select(
+        ['id', 'name', 'project_id', 'order', 'created_at', 'updated_at'],
+        select(own.c.new_id, Stage.name, literal(new_project_id, Stage.project_id.type), Stage.order, created_at, updated_at)
+        .select_from(Stage).join(own, own.c.old_id == Stage.id)
+    ))
+    if include_tasks:
+        db.session.execute(insert(Task).from_select(
+            ['id', 'content', 'stage_id', 'assignee', 'start_date', 'end_date', 'order',
+             'subtask_count', 'completed_subtask_count', 'created_at', 'updated_at'],
+            select(own.c.new_id, Task.content, parent.c.new_id,
+                   Task.assignee if include_assignees else null(),
+                   _shifted(Task.start_date, shift_days, dialect), _shifted(Task.end_date, shift_days, dialect),
+                   Task.order,
+                   Task.subtask_count if include_subtasks else literal(0),
+                   Task.completed_subtask_count if include_subtasks else literal(0),
+                   created_at, updated_at)
+            .select_from(Task).join(own, own.c.old_id == Task.id)
+            .join(parent, parent.c.old_id == Task.stage_id)
+        ))
+    if include_tasks and include_subtasks:
+        db.session.execute(insert(SubTask).from_select(
+            ['id', 'content', 'parent_task_id', 'completed', 'order', 'created_at', 'updated_at'],
+            select(own.c.new_id, SubTask.content, parent.c.new_id, SubTask.completed, SubTask.order,
+                   created_at, updated_at)
+            .select_from(SubTask).join(own, own.c.old_id == SubTask.id)
+            .join(parent, parent.c.old_id == SubTask.parent_task_id)
+        ))
+    connection.execute(delete(clone_ids)) # The temporary table lives as long as the connection
+    return project, counts
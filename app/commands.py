@@ -0,0 +1,78 @@
+import click
+from sqlalchemy import case, func, select, update
+from app import db
+from app.models import Task, SubTask
+from app.purge import purge_deleted
+from app.replicas import replica_enabled, sync_replica
+from app.sharding import each_shard, rebalance_shards, sharding_enabled
+
+# Recompute Task.subtask_count / Task.completed_subtask_count from the subtasks table.
+# The counts come from a single GROUP BY over subtasks; tasks without any subtasks
+# are reset to zero first. Returns the number of tasks that have subtasks.
+def recompute_subtask_counters():
+    counts = (
+        select(
+            SubTask.parent_task_id.label('task_id'),
+            func.count(SubTask.id).label('total'),
+            func.coalesce(func.sum(case((SubTask.completed.is_(True), 1), else_=0)), 0).label('done')
+        )
+        .group_by(SubTask.parent_task_id)
+        .subquery()
+    )
+    updated = 0
+    for _ in each_shard():
+        db.session.execute(
+            update(Task)
+            .values(subtask_count=0, completed_subtask_count=0)
+            .execution_options(synchronize_session=False)
+        )
+        updated += db.session.execute(
+            update(Task)
+            .where(Task.id == counts.c.task_id)
+            .values(subtask_count=counts.c.total, completed_subtask_count=counts.c.done)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    db.session.commit()
+    return updated
+
+@click.command('recount-subtasks')
+def recount_subtasks_command():
+    """Repair the denormalized subtask counters on every task."""
+    updated = recompute_subtask_counters()
+    click.echo(f"Recomputed subtask counters ({updated} tasks with subtasks)")
+
+@click.command('purge-deleted')
+def purge_deleted_command():
+    """Purge soft-deleted projects and stages whose restore window has passed."""
+    purged = purge_deleted()
+    click.echo('Purged ' + ', '.join(f'{count} {table}' for table, count in purged.items()))
+
+@click.command('sync-replica')
+def sync_replica_command():
+    """Copy the primary SQLite database into the read replica file."""
+    if not replica_enabled():
+        raise click.ClickException('No read replica configured (set READ_DATABASE_URL)')
+    sync_replica()
+    click.echo('Replica synced from primary')
+
+@click.command('rebalance-shards')
+@click.option('--source', 'sources', multiple=True, help='Extra database URL to drain (e.g. a shard being removed).')
+@click.option('--dry-run', is_flag=True, help='Only report which projects would move.')
+@click.option('--yes', is_flag=True, help="Confirm that the app is stopped; don't ask.")
+def rebalance_shards_command(sources, dry_run, yes):
+    """Move project trees to the shard their id hashes to under SHARD_DATABASE_URLS."""
+    if not sharding_enabled():
+        raise click.ClickException('Sharding is not configured (set SHARD_DATABASE_URLS)')
+    if not dry_run and not yes:
+        # Nothing fences a tree while it is copied: a write to it in the meantime is lost
+        click.confirm('Rebalancing may only run while the app is stopped. Is it stopped?', abort=True)
+    moved = rebalance_shards(extra_sources=sources, dry_run=dry_run, log=click.echo)
+    verb = 'Would move' if dry_run else 'Moved'
+    click.echo(f"{verb} {sum(moved.values())} projects" + ''.join(
+        f"\n  {source} -> {target}: {count}" for (source, target), count in sorted(moved.items())))
+
+def register_commands(app):
+    app.cli.add_command(recount_subtasks_command)
+    app.cli.add_command(purge_deleted_command)
+    app.cli.add_command(sync_replica_command)
+    app.cli.add_command(rebalance_shards_command)
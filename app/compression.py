@@ -0,0 +1,138 @@
+import zlib
+from flask import current_app, request
+
+# Response compression for /api. Boards and project lists are repetitive JSON
+# (the same keys and ISO timestamps on every object) that shrinks about 10x.
+# The encoding is negotiated from Accept-Encoding among the encoders available
+# here: gzip always, brotli ('br') and zstd when the `brotli` / `zstandard`
+# packages are installed. Responses smaller than COMPRESS_MIN_SIZE bytes are
+# sent as is; streamed responses (unknown size) are always compressed, chunk by
+# chunk, flushing after each chunk so the client still receives data as it is
+# produced.
+
+try:
+    import brotli
+except ImportError: # Optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError: # Optional dependency
+    zstandard = None
+
+class _GzipStream:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31) # 31: gzip container
+
+    def compress(self, chunk):
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+class _BrotliStream:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, chunk):
+        return self._compressor.process(chunk) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+class _ZstdStream:
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, chunk):
+        return self._compressor.compress(chunk) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush()
+
+# Content-Encoding -> (one-shot compress(data, level), stream class, config key of the level)
+ENCODERS = {
+    'gzip': (lambda data, level: zlib.compress(data, level, wbits=31), _GzipStream, 'COMPRESS_GZIP_LEVEL'),
+}
+if brotli is not None:
+    ENCODERS['br'] = (lambda data, level: brotli.compress(data, quality=level), _BrotliStream, 'COMPRESS_BROTLI_LEVEL')
+if zstandard is not None:
+    ENCODERS['zstd'] = (lambda data, level: zstandard.ZstdCompressor(level=level).compress(data), _ZstdStream,
+                        'COMPRESS_ZSTD_LEVEL')
+
+def _accepted(header):
+    # {'gzip': 1.0, 'br': 0.5, '*': 0.1, ...} from an Accept-Encoding header
+    accepted = {}
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+# Best encoding the client accepts: highest q value, ties broken by the server's
+# preference order (COMPRESS_ALGORITHMS). None means send the body as is.
+def negotiate(header, preference=None):
+    accepted = _accepted(header)
+    preference = [coding for coding in (preference or current_app.config['COMPRESS_ALGORITHMS']) if coding in ENCODERS]
+    best, best_q = None, 0.0
+    for coding in preference:
+        q = accepted.get(coding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+def compress(data, coding):
+    one_shot, _, level_key = ENCODERS[coding]
+    return one_shot(data, current_app.config[level_key])
+
+def _compress_stream(chunks, stream):
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            compressed = stream.compress(chunk)
+            if compressed:
+                yield compressed
+        yield stream.finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+def compress_response(response):
+    if not request.path.startswith('/api/') or request.method == 'HEAD':
+        return response
+    if response.status_code < 200 or response.status_code in (204, 304) or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    coding = negotiate(request.headers.get('Accept-Encoding'))
+    if coding is None:
+        return response
+    if response.is_streamed:
+        _, stream_class, level_key = ENCODERS[coding]
+        response.response = _compress_stream(response.response, stream_class(current_app.config[level_key]))
+        response.direct_passthrough = False
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < current_app.config['COMPRESS_MIN_SIZE']:
+            return response
+        response.set_data(compress(data, coding))
+    response.headers['Content-Encoding'] = coding
+    # The compressed bytes differ from the identity representation, so a strong
+    # ETag becomes weak; If-Match accepts both forms (app.versioning).
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def init_compression(app):
+    if app.config.get('COMPRESS_ENABLED'):
+        app.after_request(compress_response)
@@ -0,0 +1,120 @@
+import hashlib
+import itertools
+from datetime import timedelta
+from functools import wraps
+from flask import current_app, g, jsonify, make_response, request
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import IdempotencyKey
+from app.purge import utcnow
+
+# Idempotency-Key support for POST endpoints. The first request with a key
+# claims it by inserting a row (the primary key makes concurrent duplicates
+# lose the race), runs the handler and stores the response. Retries with the
+# same key replay the stored response without touching the write path again.
+#
+# The handler's commit only flushes (see app/routing.py); its writes and the
+# stored response are committed together afterwards. A claim without a response
+# therefore never has writes behind it, and an abandoned one can be run again.
+# With sharding the shard and the default database commit one after the other.
+
+_claims = itertools.count(1)
+
+def _fingerprint():
+    digest = hashlib.sha256()
+    digest.update(request.method.encode() + b' ' + request.path.encode() + b'\n')
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+def _evict_expired():
+    cutoff = utcnow() - timedelta(seconds=current_app.config['IDEMPOTENCY_KEY_TTL'])
+    db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff))
+
+def _claim(key, scope, request_hash):
+    try:
+        db.session.add(IdempotencyKey(key=key, scope=scope, request_hash=request_hash, created_at=utcnow()))
+        if next(_claims) % current_app.config['IDEMPOTENCY_EVICT_EVERY'] == 0:
+            _evict_expired()
+        db.session.commit()
+        return None
+    except IntegrityError:
+        db.session.rollback()
+        return db.session.get(IdempotencyKey, (key, scope), populate_existing=True)
+
+# Delete a stale claim only if it is still the row we looked at: a concurrent
+# request may have reclaimed the key in the meantime
+def _release_stale(existing):
+    condition = [IdempotencyKey.key == existing.key, IdempotencyKey.scope == existing.scope,
+                 IdempotencyKey.created_at == existing.created_at]
+    if existing.status_code is None:
+        condition.append(IdempotencyKey.status_code.is_(None))
+    released = db.session.execute(delete(IdempotencyKey).where(*condition)).rowcount
+    db.session.commit()
+    return released == 1
+
+def _is_stale(existing):
+    now = utcnow()
+    if existing.created_at < now - timedelta(seconds=current_app.config['IDEMPOTENCY_KEY_TTL']):
+        return True
+    # A claim that never got a response (e.g. the worker died) is abandoned after a while
+    return existing.status_code is None and \
+        existing.created_at < now - timedelta(seconds=current_app.config['IDEMPOTENCY_LOCK_TIMEOUT'])
+
+def _replay(existing):
+    response = make_response(existing.response_body, existing.status_code)
+    response.content_type = existing.response_content_type
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def idempotent(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > 255:
+            return jsonify({"error": "Idempotency-Key must be at most 255 characters"}), 400
+
+        scope = f"{request.method} {request.path}"
+        request_hash = _fingerprint()
+        existing = _claim(key, scope, request_hash)
+        if existing is not None and _is_stale(existing):
+            if _release_stale(existing):
+                existing = _claim(key, scope, request_hash)
+            else:
+                existing = db.session.get(IdempotencyKey, (key, scope), populate_existing=True)
+        if existing is not None:
+            if existing.request_hash != request_hash:
+                return jsonify({"error": "Idempotency-Key was already used with a different request"}), 422
+            if existing.status_code is None:
+                response = jsonify({"error": "A request with this Idempotency-Key is still in progress"})
+                response.headers['Retry-After'] = '1'
+                return response, 409
+            return _replay(existing)
+
+        g.defer_commit = True
+        try:
+            response = make_response(view(*args, **kwargs))
+        finally:
+            g.pop('defer_commit', None)
+        try:
+            claim = db.session.get(IdempotencyKey, (key, scope))
+            if response.status_code >= 500 or claim is None:
+                # Server errors aren't remembered so the client can retry for real
+                if claim is not None:
+                    db.session.delete(claim)
+            else:
+                claim.status_code = response.status_code
+                claim.response_body = response.get_data()
+                claim.response_content_type = response.content_type
+            db.session.commit() # The handler's writes and the stored response
+            return response
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error storing idempotent response for key {key}: {str(e)}")
+            # Nothing was committed; free the key so the client can retry
+            db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.key == key, IdempotencyKey.scope == scope))
+            db.session.commit()
+            return jsonify({"error": "Failed to store the response for this Idempotency-Key"}), 500
+    return wrapper
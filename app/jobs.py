@@ -0,0 +1,255 @@
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import delete, select, update
+from app import db
+from app.commands import recompute_subtask_counters
+from app.models import Job
+from app.purge import purge_deleted, utcnow
+from app.writes import insert_returning
+
+# In-process background jobs. POST /api/jobs stores a 'queued' row in the jobs
+# table and hands its id to a bounded thread pool (JOBS_WORKERS threads, at most
+# JOBS_MAX_QUEUED jobs waiting); the caller gets 202 and polls GET /api/jobs/<id>.
+# A job runs in its own app context and reports progress (and notices a
+# cancellation request) through JobContext.progress(). Finished jobs keep their
+# result for JOBS_RESULT_TTL seconds.
+#
+# With JOBS_WORKERS = 0 nothing runs in the background: jobs stay queued until
+# run_pending_jobs() runs them synchronously (used by the tests).
+#
+# The pool lives in memory, so on its first request a process picks up what the
+# previous one left: jobs it was running are failed, queued jobs are submitted
+# again (a job is claimed with a conditional UPDATE, so it never runs twice).
+
+JOB_TYPES = {} # type name -> function(context, **params) returning a JSON-able result
+OWNER = f'{socket.gethostname()}:{os.getpid()}'
+
+def job_type(name):
+    def register(fn):
+        JOB_TYPES[name] = fn
+        return fn
+    return register
+
+class JobCancelled(Exception):
+    pass
+
+class JobQueueFull(Exception):
+    pass
+
+class JobContext:
+    """Handed to a running job. progress() records a progress snapshot and raises
+    JobCancelled when the job was asked to stop. Call it between transactions:
+    it writes on its own connection."""
+
+    def __init__(self, job_id, interval):
+        self.job_id = job_id
+        self.interval = interval
+        self.detail = {}
+        self._last_write = 0.0
+
+    def progress(self, force=False, **detail):
+        self.detail.update(detail)
+        now = time.monotonic()
+        if not force and now - self._last_write < self.interval:
+            return
+        self._last_write = now
+        with db.engine.begin() as conn:
+            cancel_requested = conn.execute(
+                update(Job).where(Job.id == self.job_id).values(progress=dict(self.detail)).returning(Job.cancel_requested)
+            ).scalar()
+        if cancel_requested:
+            raise JobCancelled()
+
+def _finish(job_id, **values):
+    db.session.execute(
+        update(Job).where(Job.id == job_id).values(finished_at=utcnow(), **values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+def run_job(app, job_id):
+    with app.app_context():
+        try:
+            # Claim the job; a job cancelled while it was queued isn't claimed
+            job = db.session.execute(
+                update(Job).where(Job.id == job_id, Job.status == 'queued')
+                .values(status='running', started_at=utcnow(), owner=OWNER)
+                .returning(Job.type, Job.params)
+            ).first()
+            db.session.commit()
+            if job is None:
+                return
+            context = JobContext(job_id, app.config['JOBS_PROGRESS_INTERVAL'])
+            try:
+                result = JOB_TYPES[job.type](context, **(job.params or {}))
+            except JobCancelled:
+                db.session.rollback()
+                _finish(job_id, status='cancelled', progress=context.detail)
+                return
+            _finish(job_id, status='succeeded', result=result, progress=context.detail)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error running job {job_id}: {str(e)}")
+            try:
+                _finish(job_id, status='failed', error=str(e))
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error recording failure of job {job_id}: {str(e)}")
+        finally:
+            db.session.remove()
+
+def expire_jobs():
+    # Forget finished jobs (and their results) after the retention period
+    cutoff = utcnow() - timedelta(seconds=current_app.config['JOBS_RESULT_TTL'])
+    result = db.session.execute(
+        delete(Job).where(Job.finished_at < cutoff).execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True # Exists but belongs to someone else
+    return True
+
+def fail_orphaned_jobs():
+    # Jobs left running by a process on this host that no longer exists
+    host = OWNER.rsplit(':', 1)[0]
+    orphaned = []
+    for job_id, owner in db.session.execute(select(Job.id, Job.owner).where(Job.status == 'running')):
+        owner_host, _, pid = (owner or '').rpartition(':')
+        if owner_host == host and pid.isdigit() and not _pid_alive(int(pid)):
+            orphaned.append(job_id)
+    if orphaned:
+        db.session.execute(
+            update(Job).where(Job.id.in_(orphaned), Job.status == 'running')
+            .values(status='failed', error='Interrupted: the process running the job exited', finished_at=utcnow())
+            .execution_options(synchronize_session=False)
+        )
+    return len(orphaned)
+
+class JobExecutor:
+    """Bounded thread pool for jobs. submit() raises JobQueueFull when
+    JOBS_WORKERS jobs are running and JOBS_MAX_QUEUED more are waiting."""
+
+    def __init__(self, app):
+        self.app = app
+        self.workers = app.config['JOBS_WORKERS']
+        self._slots = threading.BoundedSemaphore(self.workers + app.config['JOBS_MAX_QUEUED']) if self.workers else None
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job') if self.workers else None
+        self._recovered = False
+        self._recover_lock = threading.Lock()
+
+    def reserve(self):
+        # Called before the job row is stored, so a full queue rejects the request up front
+        if self._slots is not None and not self._slots.acquire(blocking=False):
+            raise JobQueueFull()
+
+    def release(self):
+        if self._slots is not None:
+            self._slots.release()
+
+    def submit(self, job_id):
+        if self._pool is None:
+            return # Runs on the next run_pending_jobs()
+        future = self._pool.submit(run_job, self.app, job_id)
+        future.add_done_callback(lambda _: self.release())
+
+    def recover(self):
+        # Once per process: fail the jobs a dead process was running and submit the
+        # queued ones again, oldest first; those that don't fit in the queue fail
+        if self._recovered:
+            return
+        with self._recover_lock:
+            if self._recovered:
+                return
+            fail_orphaned_jobs()
+            queued = []
+            if self._pool is not None:
+                queued = db.session.scalars(select(Job.id).where(Job.status == 'queued').order_by(Job.created_at)).all()
+            resubmit = []
+            for job_id in queued:
+                try:
+                    self.reserve()
+                except JobQueueFull:
+                    break
+                resubmit.append(job_id)
+            dropped = queued[len(resubmit):]
+            try:
+                if dropped:
+                    db.session.execute(
+                        update(Job).where(Job.id.in_(dropped), Job.status == 'queued')
+                        .values(status='failed', error='Not resumed after a restart: the job queue was full',
+                                finished_at=utcnow())
+                        .execution_options(synchronize_session=False)
+                    )
+                db.session.commit()
+            except Exception:
+                for _ in resubmit:
+                    self.release()
+                raise
+            for job_id in resubmit:
+                self.submit(job_id)
+            self._recovered = True
+
+    def housekeeping(self):
+        # Runs in the caller's app context and session; the caller commits
+        expire_jobs()
+
+def enqueue(job_type_name, params=None):
+    """Store a queued job and schedule it. Returns the job as a dict."""
+    executor = current_app.extensions['job_executor']
+    executor.reserve()
+    try:
+        executor.housekeeping()
+        body = insert_returning(Job, {'type': job_type_name, 'params': params or {}}).to_dict()
+        db.session.commit()
+    except Exception:
+        executor.release()
+        raise
+    executor.submit(body['id'])
+    return body
+
+def run_pending_jobs(app=None):
+    """Run every queued job synchronously, oldest first. Returns the number run."""
+    app = app or current_app._get_current_object()
+    with app.app_context():
+        job_ids = db.session.scalars(select(Job.id).where(Job.status == 'queued').order_by(Job.created_at)).all()
+        db.session.remove()
+    for job_id in job_ids:
+        run_job(app, job_id)
+    return len(job_ids)
+
+# before_request: recover the jobs of the previous process on the first request
+def recover_jobs():
+    try:
+        current_app.extensions['job_executor'].recover()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error recovering jobs: {str(e)}")
+
+def init_jobs(app):
+    app.extensions['job_executor'] = JobExecutor(app)
+    app.before_request(recover_jobs)
+
+@job_type('purge-deleted')
+def purge_deleted_job(context):
+    purged_rows = 0
+    def on_batch(rows):
+        nonlocal purged_rows
+        purged_rows += rows
+        context.progress(rows_purged=purged_rows)
+    context.progress(force=True, rows_purged=0) # Also notices a cancellation before the first batch
+    return purge_deleted(on_batch=on_batch)
+
+@job_type('recount-subtasks')
+def recount_subtasks_job(context):
+    return {'tasks_updated': recompute_subtask_counters()}
@@ -0,0 +1,70 @@
+import math
+import threading
+import time
+from collections import deque
+from flask import current_app, request
+
+# Latency of the last METRICS_WINDOW /api requests, for load shedding
+# (app/admission.py) and the readiness probe (/readyz). Samples older than
+# METRICS_MAX_AGE seconds are dropped: an instance drained by its load balancer gets
+# no new requests, and stale slow samples would otherwise keep it unready for good.
+# Timing lives in the WSGI environ
+# rather than on flask.g so requests dispatched inside another request (batch
+# operations) are timed on their own.
+
+STARTED_KEY = 'kanban.request_started'
+
+class LatencyWindow:
+    def __init__(self, size, max_age):
+        self._samples = deque(maxlen=size) # (time.monotonic() when recorded, seconds)
+        self.max_age = max_age
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append((time.monotonic(), seconds))
+
+    def _expire(self):
+        # Called with the lock held
+        cutoff = time.monotonic() - self.max_age
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+
+    def percentile(self, fraction):
+        # Nearest-rank percentile in seconds, None without recent samples
+        with self._lock:
+            self._expire()
+            samples = sorted(seconds for _, seconds in self._samples)
+        if not samples:
+            return None
+        return samples[max(0, math.ceil(fraction * len(samples)) - 1)]
+
+    def __len__(self):
+        with self._lock:
+            self._expire()
+            return len(self._samples)
+
+def start_timer():
+    if not request.path.startswith('/api/'):
+        return # Probes and static routes would dilute the percentiles
+    request.environ[STARTED_KEY] = time.perf_counter()
+
+def defer_for_stream(response):
+    # A streamed body is still being produced after teardown; time it until the server closes it
+    if response.is_streamed:
+        started = request.environ.pop(STARTED_KEY, None)
+        if started is not None:
+            latency = current_app.extensions['latency']
+            response.call_on_close(lambda: latency.record(time.perf_counter() - started))
+    return response
+
+def record_latency(exc):
+    started = request.environ.pop(STARTED_KEY, None)
+    if started is not None:
+        current_app.extensions['latency'].record(time.perf_counter() - started)
+
+def init_metrics(app):
+    app.extensions['latency'] = LatencyWindow(app.config['METRICS_WINDOW'], app.config['METRICS_MAX_AGE'])
+    app.before_request(start_timer)
+    app.after_request(defer_for_stream)
+    app.teardown_request(record_latency)
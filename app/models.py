@@ -1,104 +1,306 @@
 import uuid
 from datetime import datetime, timezone
+from sqlalchemy import select, text
+from sqlalchemy.orm import query_expression
 from app import db # Import db instance from app top-level __init__.py
+from app.routing import current_shard_bucket, pop_new_project_id
+from app.tracing import span
 
-# Helper for default UUID generation
+# Helper for default UUID generation. When the database is sharded, ids created
+# inside a project tree start with the project's 16-bit shard bucket, so any
+# stage/task/subtask id can be routed to its shard on its own (app/sharding.py).
 def generate_uuid():
-    return str(uuid.uuid4())
+    new_id = str(uuid.uuid4())
+    bucket = current_shard_bucket()
+    if bucket is not None:
+        new_id = f'{bucket:04x}{new_id[4:]}'
+    return new_id
+
+# Project ids are minted before the request is routed (the shard is chosen by
+# hashing the id), see app.sharding.choose_shard
+def generate_project_id():
+    return pop_new_project_id() or str(uuid.uuid4())
+
+# Task and subtask content in board views: a fixed-length preview plus the full
+# length. The board query fills content_preview/content_length in SQL without
+# reading the content column (app/board.py); objects loaded any other way have
+# their content and are previewed in Python.
+def content_fields(obj, preview_length):
+    if preview_length is None:
+        return {'content': obj.content}
+    if obj.content_length is not None:
+        return {'content': obj.content_preview, 'content_length': obj.content_length}
+    return {'content': obj.content[:preview_length], 'content_length': len(obj.content)}
+
+# UUID keys stored as 16 raw bytes instead of 36-character text. Python code and
+# the API keep using the canonical string form; conversion happens at the driver
+# boundary. Anything else (a mistyped id in a URL, but also another spelling of a
+# UUID: upper case, no dashes, {braces}, urn:uuid:) is bound as its UTF-8 bytes,
+# which never match a stored key, so lookups simply miss and every id has exactly
+# one spelling.
+def _canonical_uuid_bytes(value):
+    try:
+        parsed = uuid.UUID(value)
+    except ValueError:
+        return None
+    return parsed.bytes if str(parsed) == value else None
+
+class UUIDBinary(db.TypeDecorator):
+    impl = db.LargeBinary(16)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, bytes):
+            return value
+        value = str(value)
+        return _canonical_uuid_bytes(value) or value.encode('utf-8')
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if len(value) != 16:
+            return bytes(value).decode('utf-8', errors='replace')
+        return str(uuid.UUID(bytes=bytes(value)))
 
 class Project(db.Model):
     __tablename__ = 'projects'
-    id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
-    name = db.Column(db.String(100), nullable=False, unique=True)
+    id = db.Column(UUIDBinary, primary_key=True, default=generate_project_id)
+    name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    # Soft delete marker; the purge worker removes the rows once the restore window has passed
+    deleted_at = db.Column(db.DateTime, nullable=True, index=True)
+    # Optimistic concurrency: bumped on every update and exposed as the ETag
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    # Names are unique among live projects only, so a soft-deleted project doesn't block its name
+    __table_args__ = (
+        db.Index('uq_projects_name_live', 'name', unique=True,
+                 sqlite_where=text('deleted_at IS NULL'), postgresql_where=text('deleted_at IS NULL')),
+    )
 
-    stages = db.relationship('Stage', backref='project', lazy=True, cascade="all, delete-orphan")
+    # passive_deletes: children are removed by the database (ON DELETE CASCADE),
+    # so deleting a project never loads its tree into the session
+    stages = db.relationship('Stage', backref='project', lazy=True, cascade="all, delete-orphan", passive_deletes=True)
 
-    def to_dict(self, include_stages=False):
+    # to_dict keeps datetimes and dates as Python objects; app.serialization encodes
+    # them for the response format (ISO 8601 in JSON, timestamps in MessagePack)
+    def to_dict(self, include_stages=False, preview_length=None):
         data = {
             'id': self.id,
             'name': self.name,
             'description': self.description,
-            'created_at': self.created_at.isoformat() + 'Z',
-            'updated_at': self.updated_at.isoformat() + 'Z'
+            'version': self.version,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
         if include_stages:
-            data['stages'] = sorted([stage.to_dict(include_tasks=True) for stage in self.stages], key=lambda s: s['order'])
+            with span('Project.to_dict', stages=len(self.stages)):
+                data['stages'] = sorted([stage.to_dict(include_tasks=True, preview_length=preview_length) for stage in self.stages if stage.deleted_at is None], key=lambda s: s['order'])
         return data
 
 class Stage(db.Model):
     __tablename__ = 'stages'
-    id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
+    id = db.Column(UUIDBinary, primary_key=True, default=generate_uuid)
     name = db.Column(db.String(100), nullable=False)
-    project_id = db.Column(db.String(36), db.ForeignKey('projects.id'), nullable=False)
+    project_id = db.Column(UUIDBinary, db.ForeignKey('projects.id', ondelete='CASCADE'), nullable=False, index=True)
     order = db.Column(db.Integer, nullable=False, default=0) # Default order, will need logic to set correctly
     created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    deleted_at = db.Column(db.DateTime, nullable=True, index=True) # Soft delete marker
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
-    tasks = db.relationship('Task', backref='stage', lazy=True, cascade="all, delete-orphan")
+    tasks = db.relationship('Task', backref='stage', lazy=True, cascade="all, delete-orphan", passive_deletes=True)
 
-    def to_dict(self, include_tasks=False):
+    def to_dict(self, include_tasks=False, preview_length=None):
         data = {
             'id': self.id,
             'name': self.name,
             'project_id': self.project_id,
             'order': self.order,
-            'created_at': self.created_at.isoformat() + 'Z',
-            'updated_at': self.updated_at.isoformat() + 'Z'
+            'version': self.version,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
         if include_tasks:
-            data['tasks'] = sorted([task.to_dict(include_subtasks=True) for task in self.tasks], key=lambda t: t['order'])
+            with span('Stage.to_dict', tasks=len(self.tasks)):
+                data['tasks'] = sorted([task.to_dict(include_subtasks=True, preview_length=preview_length) for task in self.tasks], key=lambda t: t['order'])
         return data
 
 class Task(db.Model):
     __tablename__ = 'tasks'
-    id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
+    id = db.Column(UUIDBinary, primary_key=True, default=generate_uuid)
     content = db.Column(db.Text, nullable=False)
-    stage_id = db.Column(db.String(36), db.ForeignKey('stages.id'), nullable=False)
+    stage_id = db.Column(UUIDBinary, db.ForeignKey('stages.id', ondelete='CASCADE'), nullable=False, index=True)
     assignee = db.Column(db.String(100), nullable=True)
     start_date = db.Column(db.Date, nullable=True)
     end_date = db.Column(db.Date, nullable=True)
     order = db.Column(db.Integer, nullable=False, default=0) # Default order
+    # Denormalized progress counters, kept exact by the write paths in subtasks_bp
+    # (see `flask recount-subtasks` for repairing drift)
+    subtask_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    completed_subtask_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Bumped when the task's own fields change; the subtask counters don't count as an edit
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    # Only populated by the board query (see content_fields)
+    content_preview = query_expression()
+    content_length = query_expression()
 
-    subtasks = db.relationship('SubTask', backref='parent_task', lazy=True, cascade="all, delete-orphan")
+    subtasks = db.relationship('SubTask', backref='parent_task', lazy=True, cascade="all, delete-orphan", passive_deletes=True)
 
-    def to_dict(self, include_subtasks=False):
+    def to_dict(self, include_subtasks=False, preview_length=None):
         data = {
             'id': self.id,
-            'content': self.content,
+            **content_fields(self, preview_length),
             'stage_id': self.stage_id,
             'assignee': self.assignee,
-            'start_date': self.start_date.isoformat() if self.start_date else None,
-            'end_date': self.end_date.isoformat() if self.end_date else None,
+            'start_date': self.start_date,
+            'end_date': self.end_date,
             'order': self.order,
-            'created_at': self.created_at.isoformat() + 'Z',
-            'updated_at': self.updated_at.isoformat() + 'Z'
+            'subtask_count': self.subtask_count,
+            'completed_subtask_count': self.completed_subtask_count,
+            'version': self.version,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
         if include_subtasks:
-            data['subtasks'] = sorted([subtask.to_dict() for subtask in self.subtasks], key=lambda s: s['order'])
+            data['subtasks'] = sorted([subtask.to_dict(preview_length=preview_length) for subtask in self.subtasks], key=lambda s: s['order'])
         return data
 
 class SubTask(db.Model):
     __tablename__ = 'subtasks'
-    id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
+    id = db.Column(UUIDBinary, primary_key=True, default=generate_uuid)
     content = db.Column(db.Text, nullable=False)
-    parent_task_id = db.Column(db.String(36), db.ForeignKey('tasks.id'), nullable=False)
+    parent_task_id = db.Column(UUIDBinary, db.ForeignKey('tasks.id', ondelete='CASCADE'), nullable=False, index=True)
     completed = db.Column(db.Boolean, default=False)
     order = db.Column(db.Integer, nullable=False, default=0) # Default order
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    content_preview = query_expression()
+    content_length = query_expression()
 
-    def to_dict(self):
+    def to_dict(self, preview_length=None):
         return {
             'id': self.id,
-            'content': self.content,
+            **content_fields(self, preview_length),
             'parent_task_id': self.parent_task_id,
             'completed': self.completed,
             'order': self.order,
-            'created_at': self.created_at.isoformat() + 'Z',
-            'updated_at': self.updated_at.isoformat() + 'Z'
+            'version': self.version,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+    # A key is scoped to the method and path it was first used with
+    key = db.Column(db.String(255), primary_key=True)
+    scope = db.Column(db.String(255), primary_key=True)
+    request_hash = db.Column(db.String(64), nullable=False) # sha256 of the request body
+    status_code = db.Column(db.Integer, nullable=True) # NULL while the first request is still running
+    response_body = db.Column(db.LargeBinary, nullable=True)
+    response_content_type = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc), index=True)
+
+# Live project names when projects are sharded (app/project_names.py). Each shard's
+# unique index only sees its own projects; this table on the default database makes
+# a name unique across all of them.
+class ProjectName(db.Model):
+    __tablename__ = 'project_names'
+    name = db.Column(db.String(100), primary_key=True)
+    project_id = db.Column(UUIDBinary, nullable=False, index=True)
+    claimed_at = db.Column(db.DateTime, nullable=False)
+
+# Background jobs (app/jobs.py): one row per submitted job, polled through
+# GET /api/jobs/<id> and deleted JOBS_RESULT_TTL seconds after it finished
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    id = db.Column(UUIDBinary, primary_key=True, default=lambda: str(uuid.uuid4()))
+    type = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True) # queued, running, succeeded, failed, cancelled
+    params = db.Column(db.JSON, nullable=True)
+    progress = db.Column(db.JSON, nullable=True)
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    owner = db.Column(db.String(255), nullable=True) # host:pid of the process running the job
+    created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True, index=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'type': self.type,
+            'status': self.status,
+            'params': self.params,
+            'progress': self.progress,
+            'result': self.result,
+            'error': self.error,
+            'cancel_requested': self.cancel_requested,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+# Per-project activity feed (app/activity.py): append-only, written in batches by a
+# background writer. project_id is not a foreign key: events outlive purged
+# projects, and with sharding the project lives in another database.
+class ActivityEvent(db.Model):
+    __tablename__ = 'activity_events'
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(UUIDBinary, nullable=False)
+    action = db.Column(db.String(50), nullable=False) # e.g. task.moved, subtask.completed
+    entity_type = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(UUIDBinary, nullable=False)
+    actor = db.Column(db.String(255), nullable=True) # ACTIVITY_ACTOR_HEADER of the request
+    details = db.Column(db.JSON, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False) # When the change was committed, not written
+
+    __table_args__ = (
+        db.Index('ix_activity_events_project_id_created_at', 'project_id', 'created_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'action': self.action,
+            'entity_type': self.entity_type,
+            'entity_id': self.entity_id,
+            'actor': self.actor,
+            'details': self.details,
+            'created_at': self.created_at
         }
+
+# Soft delete visibility. A row is visible only while it and all of its ancestors
+# are not marked deleted; every read and write path goes through these helpers.
+def visible_projects():
+    return Project.query.filter(Project.deleted_at.is_(None))
+
+def visible_stages():
+    return Stage.query.join(Project, Stage.project_id == Project.id).filter(
+        Stage.deleted_at.is_(None), Project.deleted_at.is_(None))
+
+def visible_tasks():
+    return Task.query.join(Stage, Task.stage_id == Stage.id).join(Project, Stage.project_id == Project.id).filter(
+        Stage.deleted_at.is_(None), Project.deleted_at.is_(None))
+
+def visible_subtasks():
+    return SubTask.query.join(Task, SubTask.parent_task_id == Task.id).join(Stage, Task.stage_id == Stage.id).join(
+        Project, Stage.project_id == Project.id).filter(Stage.deleted_at.is_(None), Project.deleted_at.is_(None))
+
+# Id subqueries for set-based statements (UPDATE/DELETE ... WHERE x_id IN (...))
+def visible_project_ids():
+    return select(Project.id).where(Project.deleted_at.is_(None))
+
+def visible_stage_ids():
+    return select(Stage.id).join(Project, Stage.project_id == Project.id).where(
+        Stage.deleted_at.is_(None), Project.deleted_at.is_(None))
+
+def visible_task_ids():
+    return select(Task.id).join(Stage, Task.stage_id == Stage.id).join(Project, Stage.project_id == Project.id).where(
+        Stage.deleted_at.is_(None), Project.deleted_at.is_(None))
@@ -0,0 +1,223 @@
+import cProfile
+import itertools
+import math
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import deque
+from datetime import datetime, timezone
+from functools import partial
+from flask import current_app, g, jsonify, request
+from app.admin import ADMIN_TOKEN_HEADER, is_admin
+
+# On-demand profiling of a single /api request, for admins only: add
+# `?__profile=cpu` or `?__profile=alloc` (or send `X-Profile: cpu|alloc`) together
+# with the admin token. The request runs normally under cProfile or tracemalloc; the
+# report is kept in memory (the last PROFILE_KEEP) and its id comes back in the
+# X-Profile-Id header, see GET /api/admin/profiles/<id>.
+#   - cpu: the functions with the most cumulative time, and collapsed stacks
+#     ("a;b;c <microseconds>", the input format of flamegraph.pl and speedscope)
+#     rebuilt from cProfile's caller graph
+#   - alloc: the lines holding the most memory allocated during the request, the
+#     peak, and collapsed allocation stacks weighted by bytes
+# Profilers are process-wide, so one request is profiled at a time and a new
+# profile starts at most every PROFILE_MIN_INTERVAL seconds; others get 429.
+
+PROFILE_PARAM = '__profile'
+PROFILE_HEADER = 'X-Profile'
+PROFILE_KINDS = ('cpu', 'alloc')
+PROFILER_KEY = 'kanban.profiler'
+
+_ids = itertools.count(1)
+
+class ProfileStore:
+    def __init__(self, keep, min_interval):
+        self.reports = deque(maxlen=keep)
+        self.min_interval = min_interval
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+        self._last_started = None
+
+    # Returns 0 when the caller may profile (and must call release()), else seconds to wait
+    def acquire(self):
+        if not self._busy.acquire(blocking=False):
+            return 1
+        now = time.monotonic()
+        if self._last_started is not None and now - self._last_started < self.min_interval:
+            self._busy.release()
+            return self.min_interval - (now - self._last_started)
+        self._last_started = now
+        return 0
+
+    def release(self):
+        self._busy.release()
+
+    def add(self, report):
+        with self._lock:
+            self.reports.append(report)
+
+    def get(self, report_id):
+        with self._lock:
+            return next((report for report in self.reports if report['id'] == report_id), None)
+
+    def summaries(self):
+        with self._lock:
+            return [{key: value for key, value in report.items() if key not in ('cpu', 'alloc')}
+                    for report in reversed(self.reports)]
+
+def _frame_name(func):
+    filename, line, name = func
+    if filename == '~':
+        return name # Built-ins such as <method 'execute' of 'sqlite3.Cursor' objects>
+    return f'{name} ({os.path.basename(filename)}:{line})'
+
+def collapsed_stacks(stats, max_depth=64, min_us=10):
+    # cProfile only knows caller -> callee edges with their totals, so time is split
+    # between a function's callers in proportion to the time each caller spent in it
+    # (what flameprof and gprof2dot do). Recursion is cut where a function repeats,
+    # and branches worth less than min_us microseconds are dropped, which keeps the
+    # walk proportional to the profiled time rather than to the number of call paths.
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, (_, _, _, edge_cumulative) in callers.items():
+            callees.setdefault(caller, []).append((func, edge_cumulative))
+    roots = [func for func, (_, _, _, _, callers) in stats.items() if not callers]
+    lines = {}
+
+    def walk(func, share, path):
+        _, _, own, cumulative, _ = stats[func]
+        path = path + [_frame_name(func)]
+        self_us = own * share * 1e6
+        if self_us >= 1:
+            key = ';'.join(path)
+            lines[key] = lines.get(key, 0) + self_us
+        if len(path) >= max_depth:
+            return
+        for callee, edge_cumulative in callees.get(func, ()):
+            callee_cumulative = stats.get(callee, (0, 0, 0, 0))[3]
+            if callee_cumulative <= 0 or _frame_name(callee) in path:
+                continue
+            # Fraction of the callee's time that belongs to this path
+            callee_share = min(1.0, share * edge_cumulative / callee_cumulative)
+            if callee_share * callee_cumulative * 1e6 >= min_us:
+                walk(callee, callee_share, path)
+
+    for root in roots:
+        walk(root, 1.0, [])
+    return '\n'.join(f'{stack} {round(us)}' for stack, us in sorted(lines.items()))
+
+def _cpu_report(profiler, top):
+    stats = pstats.Stats(profiler).stats
+    hottest = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+    return {
+        'top': [{'function': _frame_name(func), 'calls': calls, 'own_ms': round(own * 1000, 3),
+                 'cumulative_ms': round(cumulative * 1000, 3)}
+                for func, (_, calls, own, cumulative, _) in hottest],
+        'collapsed': collapsed_stacks(stats),
+    }
+
+def _alloc_report(snapshot, peak, top):
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                       tracemalloc.Filter(False, __file__)])
+    stacks = []
+    for stat in snapshot.statistics('traceback'):
+        frames = ';'.join(f'{os.path.basename(frame.filename)}:{frame.lineno}' for frame in reversed(stat.traceback))
+        stacks.append(f'{frames} {stat.size}')
+    return {
+        'peak_bytes': peak,
+        'top': [{'line': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}', 'bytes': stat.size, 'count': stat.count}
+                for stat in snapshot.statistics('lineno')[:top]],
+        'collapsed': '\n'.join(stacks),
+    }
+
+def _reject(status, message, retry_after=None):
+    response = jsonify({"error": message})
+    response.status_code = status
+    if retry_after is not None:
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+def start_profile():
+    kind = request.args.get(PROFILE_PARAM) or request.headers.get(PROFILE_HEADER)
+    if not kind or not request.path.startswith('/api/') or g.get('in_batch'):
+        return
+    if kind not in PROFILE_KINDS:
+        return _reject(400, f"{PROFILE_PARAM} must be one of: {', '.join(PROFILE_KINDS)}")
+    if not is_admin():
+        return _reject(403, f"Profiling requires a valid {ADMIN_TOKEN_HEADER} header")
+    store = current_app.extensions['profiles']
+    wait = store.acquire()
+    if wait:
+        return _reject(429, "A request was profiled too recently; try again shortly", wait)
+    if kind == 'cpu':
+        profiler = cProfile.Profile()
+        profiler.enable()
+    else:
+        profiler = None
+        tracemalloc.start(current_app.config['PROFILE_TRACEMALLOC_FRAMES'])
+    request.environ[PROFILER_KEY] = (kind, profiler, time.perf_counter())
+
+def _report(store, top, started, summary):
+    kind, profiler, started_at = started
+    duration = time.perf_counter() - started_at
+    if kind == 'cpu':
+        profiler.disable()
+        detail = _cpu_report(profiler, top)
+    else:
+        snapshot, (_, peak) = tracemalloc.take_snapshot(), tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        detail = _alloc_report(snapshot, peak, top)
+    store.add({**summary, 'duration_ms': round(duration * 1000, 3), 'created_at': datetime.now(timezone.utc), kind: detail})
+
+def _report_and_release(store, top, started, summary):
+    try:
+        _report(store, top, started, summary)
+    finally:
+        store.release()
+
+def finish_profile(response):
+    started = request.environ.get(PROFILER_KEY)
+    if not started:
+        return response
+    kind = started[0]
+    report_id = f'{kind}-{next(_ids)}'
+    summary = {
+        'id': report_id,
+        'kind': kind,
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+    }
+    store, top = current_app.extensions['profiles'], current_app.config['PROFILE_TOP']
+    response.headers['X-Profile-Id'] = report_id
+    if response.is_streamed:
+        # The body is produced after teardown (e.g. the board); profile until the server closes it
+        request.environ.pop(PROFILER_KEY)
+        response.call_on_close(partial(_report_and_release, store, top, started, summary))
+    else:
+        request.environ[PROFILER_KEY] = None # Reported; teardown only releases the profiler
+        _report(store, top, started, summary)
+    return response
+
+def end_profile(exc):
+    if PROFILER_KEY not in request.environ:
+        return
+    started = request.environ.pop(PROFILER_KEY)
+    if started: # The request failed before finish_profile could report it
+        kind, profiler, _ = started
+        if kind == 'cpu':
+            profiler.disable()
+        else:
+            tracemalloc.stop()
+    current_app.extensions['profiles'].release()
+
+def init_profiling(app):
+    app.extensions['profiles'] = ProfileStore(app.config['PROFILE_KEEP'], app.config['PROFILE_MIN_INTERVAL'])
+    if not app.config.get('ADMIN_TOKEN'):
+        return
+    app.before_request(start_profile)
+    app.after_request(finish_profile)
+    app.teardown_request(end_profile)
@@ -0,0 +1,65 @@
+from datetime import timedelta
+from flask import g
+from sqlalchemy import delete, exists, insert, select, update
+from app import db
+from app.models import Project, ProjectName
+from app.purge import utcnow
+from app.sharding import project_bucket, sharding_enabled, use_bucket
+
+# Globally unique project names when projects are sharded. The unique index on
+# projects.name only covers one shard, so the handlers that give a live project a
+# name (create, clone, rename, restore) also claim it in project_names on the
+# default database, in the same request and session. Two requests claiming the same
+# name race on that table's primary key, and the loser gets an IntegrityError like
+# an unsharded duplicate. Deleting or renaming a project releases its claim.
+#
+# The shard and the default database commit separately, so a crash between the two
+# commits can leave a claim whose project doesn't have the name. Such a claim is
+# taken over once it is ORPHANED_CLAIM_AGE old; younger ones may still be committing.
+# Without sharding, the unique index is enough and these functions do nothing.
+
+ORPHANED_CLAIM_AGE = timedelta(minutes=1)
+
+class ProjectNameTaken(Exception):
+    pass
+
+def _has_live_name(project_id, name):
+    # Look at the project on its own shard, then go back to the request's shard
+    previous = (g.get('db_shard'), g.get('shard_bucket'))
+    try:
+        use_bucket(project_bucket(project_id))
+        return db.session.execute(select(exists().where(
+            Project.id == project_id, Project.name == name, Project.deleted_at.is_(None)))).scalar()
+    finally:
+        g.db_shard, g.shard_bucket = previous
+
+# Claim name for project_id; raises ProjectNameTaken if another live project has it
+def claim_project_name(name, project_id):
+    if not sharding_enabled():
+        return
+    claim = db.session.execute(
+        select(ProjectName.project_id, ProjectName.claimed_at).where(ProjectName.name == name)).first()
+    if claim is None:
+        # A concurrent claim of the same name fails this INSERT on the primary key
+        db.session.execute(insert(ProjectName).values(name=name, project_id=project_id, claimed_at=utcnow()))
+        return
+    if claim.project_id == project_id:
+        return
+    if claim.claimed_at > utcnow() - ORPHANED_CLAIM_AGE or _has_live_name(claim.project_id, name):
+        raise ProjectNameTaken(name)
+    taken_over = db.session.execute(
+        update(ProjectName)
+        .where(ProjectName.name == name, ProjectName.project_id == claim.project_id)
+        .values(project_id=project_id, claimed_at=utcnow())
+    ).rowcount
+    if not taken_over:
+        raise ProjectNameTaken(name)
+
+# Release the names of project_id except keep (a renamed project keeps its new name)
+def release_project_names(project_id, keep=None):
+    if not sharding_enabled():
+        return
+    statement = delete(ProjectName).where(ProjectName.project_id == project_id)
+    if keep is not None:
+        statement = statement.where(ProjectName.name != keep)
+    db.session.execute(statement)
@@ -0,0 +1,170 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import delete, or_, select
+from app import db
+from app.models import Project, Stage, Task, SubTask
+from app.sharding import each_shard
+
+# Soft-deleted projects and stages stay restorable for SOFT_DELETE_RESTORE_WINDOW
+# seconds. After that the purge worker removes them, leaf tables first, in small
+# batches that each commit on their own so other writers get the lock in between.
+
+def utcnow():
+    # Naive UTC, matching how the DateTime columns are stored
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def restore_window():
+    # Rows deleted before this moment can no longer be restored (and may be purged)
+    return utcnow() - timedelta(seconds=current_app.config['SOFT_DELETE_RESTORE_WINDOW'])
+
+def restorable_until(deleted_at):
+    return deleted_at + timedelta(seconds=current_app.config['SOFT_DELETE_RESTORE_WINDOW'])
+
+def _delete_in_batches(model, condition, batch_size, pause, on_batch=None):
+    purged = 0
+    while True:
+        batch_ids = select(model.id).where(condition).limit(batch_size).scalar_subquery()
+        result = db.session.execute(
+            delete(model).where(model.id.in_(batch_ids)).execution_options(synchronize_session=False)
+        )
+        db.session.commit() # One short transaction per batch
+        purged += result.rowcount
+        if on_batch:
+            on_batch(result.rowcount)
+        if result.rowcount < batch_size:
+            return purged
+        if pause:
+            time.sleep(pause)
+
+# Tasks go in chunks of batch_size together with their subtasks, so every batch
+# only touches rows that still exist (no rescanning of already-emptied tasks).
+def _purge_tasks(condition, batch_size, pause, on_batch=None):
+    purged = {'subtasks': 0, 'tasks': 0}
+    while True:
+        task_ids = db.session.scalars(select(Task.id).where(condition).limit(batch_size)).all()
+        if not task_ids:
+            return purged
+        purged['subtasks'] += db.session.execute(
+            delete(SubTask).where(SubTask.parent_task_id.in_(task_ids)).execution_options(synchronize_session=False)
+        ).rowcount
+        purged['tasks'] += db.session.execute(
+            delete(Task).where(Task.id.in_(task_ids)).execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit() # One short transaction per batch
+        if on_batch:
+            on_batch(len(task_ids))
+        if len(task_ids) < batch_size:
+            return purged
+        if pause:
+            time.sleep(pause)
+
+# on_batch(rows) is called after each committed batch (e.g. to report job progress)
+def purge_deleted(cutoff=None, batch_size=None, pause=None, on_batch=None):
+    cutoff = cutoff or restore_window()
+    batch_size = batch_size or current_app.config['PURGE_BATCH_SIZE']
+    pause = current_app.config['PURGE_PAUSE'] if pause is None else pause
+
+    expired_projects = select(Project.id).where(Project.deleted_at <= cutoff)
+    expired_stages = select(Stage.id).where(or_(Stage.deleted_at <= cutoff, Stage.project_id.in_(expired_projects)))
+
+    purged = {'subtasks': 0, 'tasks': 0, 'stages': 0, 'projects': 0}
+    for _ in each_shard():
+        for table, count in _purge_tasks(Task.stage_id.in_(expired_stages), batch_size, pause, on_batch).items():
+            purged[table] += count
+        purged['stages'] += _delete_in_batches(Stage, Stage.id.in_(expired_stages), batch_size, pause, on_batch)
+        purged['projects'] += _delete_in_batches(Project, Project.deleted_at <= cutoff, batch_size, pause, on_batch)
+
+    status = current_app.extensions['purge_status']
+    with status['lock']:
+        status['last_run_at'] = utcnow()
+        status['runs'] += 1
+        for table, count in purged.items():
+            status['rows_purged'][table] += count
+    return purged
+
+def pending_deletions():
+    cutoff = restore_window()
+    items = []
+    for kind, model in (('project', Project), ('stage', Stage)):
+        rows = []
+        for _ in each_shard():
+            rows.extend(model.query.filter(model.deleted_at.isnot(None)).all())
+        for row in sorted(rows, key=lambda row: row.deleted_at):
+            items.append({
+                'type': kind,
+                'id': row.id,
+                'name': row.name,
+                'deleted_at': row.deleted_at.isoformat() + 'Z',
+                'restorable': row.deleted_at > cutoff,
+                'restorable_until': restorable_until(row.deleted_at).isoformat() + 'Z'
+            })
+    return items
+
+def new_purge_status():
+    return {
+        'lock': threading.Lock(),
+        'worker_running': False,
+        'runs': 0,
+        'last_run_at': None,
+        'last_error': None,
+        'rows_purged': {'projects': 0, 'stages': 0, 'tasks': 0, 'subtasks': 0},
+    }
+
+def purge_status_snapshot():
+    status = current_app.extensions['purge_status']
+    with status['lock']:
+        return {
+            'worker_running': status['worker_running'],
+            'runs': status['runs'],
+            'last_run_at': status['last_run_at'].isoformat() + 'Z' if status['last_run_at'] else None,
+            'last_error': status['last_error'],
+            'rows_purged': dict(status['rows_purged']),
+        }
+
+class PurgeWorker(threading.Thread):
+    """Daemon thread that runs purge_deleted() every PURGE_INTERVAL seconds."""
+
+    def __init__(self, app):
+        super().__init__(name='purge-worker', daemon=True)
+        self.app = app
+        self.interval = app.config['PURGE_INTERVAL']
+        self._stop_event = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def run(self):
+        status = self.app.extensions['purge_status']
+        status['worker_running'] = True
+        try:
+            while not self._stop_event.wait(self.interval):
+                self.run_once()
+        finally:
+            status['worker_running'] = False
+
+    def run_once(self):
+        with self.app.app_context():
+            status = self.app.extensions['purge_status']
+            try:
+                purge_deleted()
+                status['last_error'] = None
+            except Exception as e:
+                db.session.rollback()
+                status['last_error'] = str(e)
+                print(f"Error purging deleted rows: {str(e)}")
+            finally:
+                db.session.remove()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def ensure_started(self):
+        if self.ident is not None:
+            return
+        with self._start_lock:
+            if self.ident is None:
+                self.start()
+
+# before_request: start the purge worker once the app is actually serving
+def start_purge_worker():
+    current_app.extensions['purge_worker'].ensure_started()
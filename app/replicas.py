@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+from flask import current_app, g, request
+from sqlalchemy import text
+from app import db
+
+# Read replica routing. With a 'replica' bind configured (READ_DATABASE_URL), GET
+# requests on the four API blueprints read from the replica and everything else
+# uses the primary (SQLALCHEMY_DATABASE_URI). A GET still reads from the primary when
+#   - the client wrote within the last REPLICA_READ_YOUR_WRITES seconds (cookie set
+#     on every successful mutation) or sends `X-Read-Consistency: strong`, or
+#   - the replica is more than REPLICA_MAX_LAG seconds behind the primary.
+# Locally the replica is a second SQLite file refreshed from the primary by
+# sync_replica() (`flask sync-replica`, or the sync worker every REPLICA_SYNC_INTERVAL
+# seconds).
+
+API_BLUEPRINTS = {'projects_api', 'stages_api', 'tasks_api', 'subtasks_api', 'batch_api'}
+READ_METHODS = {'GET', 'HEAD'}
+READ_PRIMARY_COOKIE = 'read_primary_until'
+
+def replica_enabled(app=None):
+    app = app or current_app
+    return 'replica' in (app.config.get('SQLALCHEMY_BINDS') or {})
+
+def new_replica_status():
+    return {
+        'lock': threading.Lock(),
+        'syncs': 0,
+        'last_sync_at': None,
+        'last_error': None,
+        'pg_lag': None,
+        'pg_lag_checked_at': 0.0,
+    }
+
+def _sqlite_mtime(engine):
+    # Last commit time of a SQLite database file (WAL mode commits touch the -wal file)
+    path = engine.url.database
+    times = [os.path.getmtime(p) for p in (path, path + '-wal') if os.path.exists(p)]
+    return max(times) if times else None
+
+def _postgresql_lag(engine, status):
+    # Replay delay reported by the standby itself, checked at most once per second
+    now = time.time()
+    with status['lock']:
+        if now - status['pg_lag_checked_at'] < 1 and status['pg_lag'] is not None:
+            return status['pg_lag']
+    with engine.connect() as conn:
+        lag = conn.execute(text(
+            "SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+        )).scalar()
+    with status['lock']:
+        status['pg_lag'], status['pg_lag_checked_at'] = float(lag), now
+    return float(lag)
+
+# Seconds the replica is behind the primary: 0 when it has every committed write,
+# otherwise the age of its copy. Unknown setups (e.g. MySQL) report 0.
+def replica_lag():
+    primary, replica = db.engines[None], db.engines['replica']
+    if replica.dialect.name == 'postgresql':
+        return _postgresql_lag(replica, current_app.extensions['replica_status'])
+    if primary.dialect.name == 'sqlite' and replica.dialect.name == 'sqlite':
+        primary_mtime, replica_mtime = _sqlite_mtime(primary), _sqlite_mtime(replica)
+        if replica_mtime is None:
+            return float('inf')
+        if primary_mtime is None or replica_mtime >= primary_mtime:
+            return 0.0
+        return time.time() - replica_mtime
+    return 0.0
+
+def _read_your_writes():
+    if request.headers.get('X-Read-Consistency', '').lower() == 'strong':
+        return True
+    try:
+        return float(request.cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+def choose_route():
+    g.db_route = 'primary'
+    if request.method not in READ_METHODS or request.blueprint not in API_BLUEPRINTS:
+        return
+    if _read_your_writes() or g.get('in_batch'):
+        return # Operations of a batch also see the batch's own uncommitted writes
+    try:
+        if replica_lag() > current_app.config['REPLICA_MAX_LAG']:
+            return
+    except Exception as e:
+        # Can't tell how far behind the replica is; the primary is always correct
+        print(f"Error checking replica lag: {str(e)}")
+        return
+    g.db_route = 'replica'
+
+def record_route(response):
+    if request.blueprint not in API_BLUEPRINTS:
+        return response
+    if request.method not in READ_METHODS and response.status_code < 400:
+        # This client's next reads go to the primary until the replica has caught up
+        window = current_app.config['REPLICA_READ_YOUR_WRITES']
+        response.set_cookie(READ_PRIMARY_COOKIE, f'{time.time() + window:.3f}', max_age=int(window) + 1,
+                            httponly=True, samesite='Lax')
+    response.headers['X-DB-Route'] = g.get('db_route', 'primary')
+    return response
+
+def reset_route(exc):
+    g.pop('db_route', None)
+
+# Copy the primary SQLite database into the replica file with SQLite's online
+# backup API. Readers of the replica see either the old or the new copy.
+def sync_replica():
+    primary, replica = db.engines[None], db.engines['replica']
+    if primary.dialect.name != 'sqlite' or replica.dialect.name != 'sqlite':
+        raise RuntimeError("sync_replica copies SQLite files only; use the database's own replication otherwise")
+    source, target = primary.raw_connection(), replica.raw_connection()
+    try:
+        source.driver_connection.backup(target.driver_connection)
+    finally:
+        target.close()
+        source.close()
+    status = current_app.extensions['replica_status']
+    with status['lock']:
+        status['syncs'] += 1
+        status['last_sync_at'] = time.time()
+
+class ReplicaSyncWorker(threading.Thread):
+    """Daemon thread that runs sync_replica() every REPLICA_SYNC_INTERVAL seconds."""
+
+    def __init__(self, app):
+        super().__init__(name='replica-sync', daemon=True)
+        self.app = app
+        self.interval = app.config['REPLICA_SYNC_INTERVAL']
+        self._stop_event = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            with self.app.app_context():
+                status = self.app.extensions['replica_status']
+                try:
+                    sync_replica()
+                    status['last_error'] = None
+                except Exception as e:
+                    status['last_error'] = str(e)
+                    print(f"Error syncing replica: {str(e)}")
+
+    def stop(self):
+        self._stop_event.set()
+
+    def ensure_started(self):
+        if self.ident is not None:
+            return
+        with self._start_lock:
+            if self.ident is None:
+                self.start()
+
+# before_request: start the sync worker once the app is actually serving, so CLI
+# commands (`flask sync-replica`, `flask db upgrade`) and scripts don't run it
+def start_replica_sync_worker():
+    current_app.extensions['replica_sync_worker'].ensure_started()
+
+def init_replicas(app):
+    if not replica_enabled(app):
+        return
+    app.extensions['replica_status'] = new_replica_status()
+    app.before_request(choose_route)
+    app.after_request(record_route)
+    app.teardown_request(reset_route)
+    if app.config.get('REPLICA_SYNC_INTERVAL'):
+        app.extensions['replica_sync_worker'] = ReplicaSyncWorker(app)
+        app.before_request(start_replica_sync_worker)
@@ -0,0 +1,39 @@
+from flask import Blueprint, current_app, jsonify, request
+from sqlalchemy import and_, or_, select
+from app import db
+from app.models import ActivityEvent, Project, visible_projects
+
+activity_api_bp = Blueprint('activity_api', __name__)
+
+# GET /api/projects/<string:project_id>/activity - The project's activity, newest first.
+# Pages are keyset based: pass the response's next_before as ?before= for the next page.
+@activity_api_bp.route('/projects/<string:project_id>/activity', methods=['GET'])
+def get_project_activity(project_id):
+    try:
+        limit = int(request.args.get('limit', current_app.config['ACTIVITY_PAGE_SIZE']))
+        before = request.args.get('before')
+        before = int(before) if before is not None else None
+    except ValueError:
+        return jsonify({"error": "limit and before must be integers"}), 400
+    limit = max(1, min(limit, current_app.config['ACTIVITY_MAX_PAGE_SIZE']))
+
+    try:
+        if not visible_projects().filter(Project.id == project_id).first():
+            return jsonify({"error": "Project not found"}), 404
+        # Walks ix_activity_events_project_id_created_at backwards from the cursor
+        query = select(ActivityEvent).where(ActivityEvent.project_id == project_id)
+        if before is not None:
+            cursor = select(ActivityEvent.created_at).where(ActivityEvent.id == before).scalar_subquery()
+            query = query.where(or_(ActivityEvent.created_at < cursor,
+                                    and_(ActivityEvent.created_at == cursor, ActivityEvent.id < before)))
+        events = db.session.scalars(
+            query.order_by(ActivityEvent.created_at.desc(), ActivityEvent.id.desc()).limit(limit + 1)
+        ).all()
+        return jsonify({
+            "events": [activity.to_dict() for activity in events[:limit]],
+            "next_before": events[limit - 1].id if len(events) > limit else None
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error fetching activity of project {project_id}: {str(e)}")
+        return jsonify({"error": "Failed to retrieve activity due to an internal server error"}), 500
@@ -0,0 +1,57 @@
+from flask import Blueprint, current_app, jsonify, request
+from app.admin import admin_required
+
+admin_api_bp = Blueprint('admin_api', __name__)
+
+# GET /api/admin/profiles - The most recent request profiles (newest first)
+@admin_api_bp.route('/admin/profiles', methods=['GET'])
+@admin_required
+def list_profiles():
+    return jsonify(current_app.extensions['profiles'].summaries()), 200
+
+# GET /api/admin/profiles/<string:profile_id> - One profile; ?format=collapsed for flamegraph input
+@admin_api_bp.route('/admin/profiles/<string:profile_id>', methods=['GET'])
+@admin_required
+def get_profile(profile_id):
+    report = current_app.extensions['profiles'].get(profile_id)
+    if report is None:
+        return jsonify({"error": "Profile not found"}), 404
+    if request.args.get('format') == 'collapsed':
+        return current_app.response_class(report[report['kind']]['collapsed'] + '\n', mimetype='text/plain')
+    return jsonify(report), 200
+
+# GET /api/admin/slow-queries - Recent slow SQL statements (newest first) with their query plans
+@admin_api_bp.route('/admin/slow-queries', methods=['GET'])
+@admin_required
+def list_slow_queries():
+    log = current_app.extensions.get('slow_queries')
+    if log is None:
+        return jsonify({"error": "The slow query log is disabled (SLOW_QUERY_THRESHOLD < 0)"}), 404
+    entries = log.entries()
+    if request.args.get('full_scans', '').lower() in ('1', 'true', 'yes'):
+        entries = [entry for entry in entries if entry['full_scans']]
+    try:
+        limit = int(request.args.get('limit', len(entries)))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    return jsonify({'threshold_ms': current_app.config['SLOW_QUERY_THRESHOLD'] * 1000,
+                    'queries': entries[:max(0, limit)]}), 200
+
+# DELETE /api/admin/slow-queries - Empty the slow query log
+@admin_api_bp.route('/admin/slow-queries', methods=['DELETE'])
+@admin_required
+def clear_slow_queries():
+    log = current_app.extensions.get('slow_queries')
+    if log is not None:
+        log.clear()
+    return jsonify({"message": "Slow query log cleared"}), 200
+
+# GET /api/admin/activity - State of the activity queue: depth, events written, dropped and lost
+@admin_api_bp.route('/admin/activity', methods=['GET'])
+@admin_required
+def activity_status():
+    log = current_app.extensions.get('activity')
+    if log is None:
+        return jsonify({"error": "The activity feed is disabled (ACTIVITY_ENABLED is off)"}), 404
+    return jsonify({**log.snapshot(), 'writer_running': 'activity_writer' in current_app.extensions
+                    and current_app.extensions['activity_writer'].is_alive()}), 200
@@ -0,0 +1,132 @@
+import re
+from flask import Blueprint, current_app, g, jsonify, request
+from werkzeug.test import EnvironBuilder
+from app import db
+
+batch_api_bp = Blueprint('batch_api', __name__)
+
+# Operations may target any endpoint of these blueprints
+BATCH_BLUEPRINTS = {'projects_api', 'stages_api', 'tasks_api', 'subtasks_api'}
+BATCH_METHODS = {'GET', 'POST', 'PUT', 'PATCH', 'DELETE'}
+# ${name.field} or ${index.field}: a field of an earlier operation's response body
+REFERENCE = re.compile(r'\$\{(\w+)\.(\w+)\}')
+
+class BatchError(Exception):
+    pass
+
+def _resolve(value, results):
+    # Substitute references in a path or in any string of a request body
+    if isinstance(value, str):
+        def lookup(match):
+            name, field = match.groups()
+            if name not in results:
+                raise BatchError(f"Unknown reference '{name}' in {match.group(0)}")
+            body = results[name]
+            if not isinstance(body, dict) or field not in body:
+                raise BatchError(f"Operation '{name}' has no field '{field}' for {match.group(0)}")
+            return str(body[field])
+        return REFERENCE.sub(lookup, value)
+    if isinstance(value, list):
+        return [_resolve(item, results) for item in value]
+    if isinstance(value, dict):
+        return {key: _resolve(item, results) for key, item in value.items()}
+    return value
+
+def _validate(operation, index):
+    if not isinstance(operation, dict):
+        raise BatchError(f"Operation {index} must be an object")
+    method = str(operation.get('method', '')).upper()
+    if method not in BATCH_METHODS:
+        raise BatchError(f"Operation {index}: method must be one of {', '.join(sorted(BATCH_METHODS))}")
+    path = operation.get('path')
+    if not isinstance(path, str) or not path.startswith('/api/'):
+        raise BatchError(f"Operation {index}: path must be a string starting with /api/")
+    if 'headers' in operation and not isinstance(operation['headers'], dict):
+        raise BatchError(f"Operation {index}: headers must be an object")
+    return method
+
+def _dispatch(method, path, body, headers):
+    # Run the operation through the normal request pipeline (before/after request
+    # hooks, the view, error handlers) inside the current app context, so it shares
+    # the batch's database session and transaction. Returns the response body and
+    # status, and the shard the operation was routed to.
+    builder = EnvironBuilder(path=path, method=method, json=body, headers=headers,
+                             environ_base={'REMOTE_ADDR': request.remote_addr})
+    try:
+        environ = builder.get_environ()
+    finally:
+        builder.close()
+    with current_app.request_context(environ) as ctx:
+        if ctx.request.blueprint not in BATCH_BLUEPRINTS:
+            return {"error": f"{method} {path} can't be used in a batch"}, 404, None
+        # Each operation runs in a savepoint: a handler that rolls back (e.g. the
+        # Idempotency-Key claim after a duplicate insert) only undoes its own work
+        g.batch_savepoint = db.session.begin_nested()
+        try:
+            response = current_app.full_dispatch_request()
+            shard = g.get('db_shard') # Cleared when this request context is torn down
+        finally:
+            g.pop('batch_savepoint', None)
+        return response.get_json(silent=True), response.status_code, shard
+
+# POST /api/batch - Run an ordered list of operations in one transaction
+@batch_api_bp.route('/batch', methods=['POST'])
+def run_batch():
+    data = request.get_json()
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        return jsonify({"error": "operations must be a non-empty list"}), 400
+    max_operations = current_app.config['BATCH_MAX_OPERATIONS']
+    if len(operations) > max_operations:
+        return jsonify({"error": f"A batch can hold at most {max_operations} operations"}), 400
+
+    actor_header = current_app.config.get('ACTIVITY_ACTOR_HEADER')
+    results = [] # One {"status", "body"} per executed operation, in order
+    bodies = {} # Response bodies by operation index and by 'ref' name
+    g.in_batch = True
+    try:
+        for index, operation in enumerate(operations):
+            try:
+                method = _validate(operation, index)
+                path = _resolve(operation['path'], bodies)
+                body = _resolve(operation.get('body'), bodies)
+            except BatchError as e:
+                db.session.rollback()
+                return jsonify({"error": str(e), "failed_operation": index, "results": results}), 400
+            headers = operation.get('headers') or {}
+            if actor_header and actor_header in request.headers:
+                # Operations are recorded in the activity feed as the batch's caller
+                headers = {actor_header: request.headers[actor_header], **headers}
+            body_out, status, shard = _dispatch(method, path, body, headers)
+            results.append({"status": status, "body": body_out})
+            if shard is not None and status < 400:
+                if g.setdefault('batch_shard', shard) != shard:
+                    # Each shard commits separately, so one batch stays on one shard
+                    db.session.rollback()
+                    return jsonify({
+                        "error": f"Operation {index} is on a different shard than the operations before it; "
+                                 "a batch can only work on one shard",
+                        "failed_operation": index,
+                        "results": results
+                    }), 400
+            if status >= 400:
+                # All or nothing: undo the operations that already ran
+                db.session.rollback()
+                return jsonify({
+                    "error": f"Operation {index} failed with status {status}; no operation was applied",
+                    "failed_operation": index,
+                    "results": results
+                }), status
+            bodies[str(index)] = body_out
+            if operation.get('ref'):
+                bodies[str(operation['ref'])] = body_out
+        g.in_batch = False
+        db.session.commit() # The only commit of the batch
+        return jsonify({"results": results}), 200
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error running batch: {str(e)}")
+        return jsonify({"error": "Failed to run batch due to an internal server error"}), 500
+    finally:
+        g.pop('in_batch', None)
+        g.pop('batch_shard', None)
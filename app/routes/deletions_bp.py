@@ -0,0 +1,18 @@
+from flask import Blueprint, jsonify
+from app import db
+from app.purge import pending_deletions, purge_status_snapshot
+
+deletions_api_bp = Blueprint('deletions_api', __name__)
+
+# GET /api/deletions - Soft-deleted projects/stages awaiting purge, plus purge worker status
+@deletions_api_bp.route('/deletions', methods=['GET'])
+def get_deletions():
+    try:
+        return jsonify({
+            "pending": pending_deletions(),
+            "worker": purge_status_snapshot()
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error fetching deletion status: {str(e)}")
+        return jsonify({"error": "Failed to retrieve deletion status due to an internal server error"}), 500
@@ -0,0 +1,87 @@
+import os
+import time
+from flask import Blueprint, current_app, jsonify
+from sqlalchemy import text
+from app import db
+
+health_bp = Blueprint('health', __name__)
+
+# Load balancer probes, outside /api so admission control and rate limits don't apply.
+# /readyz checks every database (primary, replica, shards) and answers 503 when one
+# fails or a READY_* threshold is exceeded, so a sick instance is taken out of rotation.
+
+def _pool_stats(engine):
+    pool = engine.pool
+    stats = {'class': type(pool).__name__}
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        if hasattr(pool, name):
+            stats[name] = getattr(pool, name)()
+    if hasattr(pool, '_max_overflow'):
+        stats['max_overflow'] = pool._max_overflow
+    return stats
+
+def _sqlite_stats(conn, engine):
+    # Python's sqlite3 doesn't expose sqlite3_db_status(), so the page cache is
+    # described by its configured size and the database's page counts
+    pragma = lambda name: conn.exec_driver_sql(f'PRAGMA {name}').scalar()
+    path = engine.url.database
+    wal_path = f'{path}-wal' if path and path != ':memory:' else None
+    return {
+        'journal_mode': pragma('journal_mode'),
+        'wal_bytes': os.path.getsize(wal_path) if wal_path and os.path.exists(wal_path) else 0,
+        'page_size': pragma('page_size'),
+        'page_count': pragma('page_count'),
+        'freelist_count': pragma('freelist_count'),
+        'cache_size': pragma('cache_size'), # Pages when positive, KiB when negative
+    }
+
+def _check_database(engine, config):
+    check = {'pool': _pool_stats(engine)}
+    failures = []
+    try:
+        started = time.perf_counter()
+        with engine.connect() as conn:
+            conn.execute(text('SELECT 1')).scalar()
+            check['latency_ms'] = round((time.perf_counter() - started) * 1000, 3)
+            if engine.dialect.name == 'sqlite':
+                check['sqlite'] = _sqlite_stats(conn, engine)
+    except Exception as e:
+        print(f"Error probing database {engine.url.render_as_string(hide_password=True)}: {str(e)}")
+        return check, ["database unreachable"]
+
+    if check['latency_ms'] > config['READY_DB_LATENCY_MAX'] * 1000:
+        failures.append(f"query latency {check['latency_ms']} ms")
+    pool = check['pool']
+    if 'max_overflow' in pool and pool['max_overflow'] >= 0 and \
+            pool['checkedout'] >= pool['size'] + pool['max_overflow']:
+        failures.append("connection pool exhausted")
+    if check.get('sqlite', {}).get('wal_bytes', 0) > config['READY_WAL_MAX_BYTES']:
+        failures.append(f"WAL is {check['sqlite']['wal_bytes']} bytes")
+    return check, failures
+
+# GET /healthz - Liveness: the process is up and serving requests
+@health_bp.route('/healthz', methods=['GET'])
+def healthz():
+    return jsonify({"status": "ok"}), 200
+
+# GET /readyz - Readiness: databases answer quickly and recent requests are fast enough
+@health_bp.route('/readyz', methods=['GET'])
+def readyz():
+    config = current_app.config
+    checks, failures = {'databases': {}}, []
+    for bind_key, engine in db.engines.items():
+        name = bind_key or 'primary'
+        checks['databases'][name], database_failures = _check_database(engine, config)
+        failures.extend(f"{name}: {failure}" for failure in database_failures)
+
+    latency = current_app.extensions['latency']
+    p99 = latency.percentile(0.99)
+    checks['requests'] = {'samples': len(latency), 'p99_ms': round(p99 * 1000, 3) if p99 is not None else None}
+    if p99 is not None and p99 > config['READY_P99_MAX']:
+        failures.append(f"p99 latency {checks['requests']['p99_ms']} ms")
+
+    ready = not failures
+    body = {"status": "ready" if ready else "unavailable", "checks": checks}
+    if failures:
+        body["failures"] = failures
+    return jsonify(body), 200 if ready else 503
@@ -0,0 +1,84 @@
+from flask import Blueprint, jsonify, request, url_for
+from sqlalchemy import update
+from app import db
+from app.jobs import JOB_TYPES, JobQueueFull, enqueue
+from app.models import Job
+from app.purge import utcnow
+
+jobs_api_bp = Blueprint('jobs_api', __name__)
+
+def accepted(job):
+    # 202 with the job and where to poll it
+    response = jsonify(job)
+    response.status_code = 202
+    response.headers['Location'] = url_for('jobs_api.get_job', job_id=job['id'])
+    return response
+
+def queue_full():
+    response = jsonify({"error": "Too many jobs are queued; try again later"})
+    response.status_code = 503
+    response.headers['Retry-After'] = '5'
+    return response
+
+# POST /api/jobs - Enqueue a background job; returns 202 immediately
+@jobs_api_bp.route('/jobs', methods=['POST'])
+def create_job():
+    data = request.get_json()
+    if not data or data.get('type') not in JOB_TYPES:
+        return jsonify({"error": f"Job type (type) must be one of: {', '.join(sorted(JOB_TYPES))}"}), 400
+    params = data.get('params') or {}
+    if not isinstance(params, dict):
+        return jsonify({"error": "Job params must be an object"}), 400
+    try:
+        return accepted(enqueue(data['type'], params))
+    except JobQueueFull:
+        return queue_full()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error enqueuing job: {str(e)}")
+        return jsonify({"error": "Failed to enqueue job due to an internal server error"}), 500
+
+# GET /api/jobs/<string:job_id> - Poll a job's status, progress and result
+@jobs_api_bp.route('/jobs/<string:job_id>', methods=['GET'])
+def get_job(job_id):
+    try:
+        job = db.session.get(Job, job_id, populate_existing=True)
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(job.to_dict()), 200
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error fetching job {job_id}: {str(e)}")
+        return jsonify({"error": "Failed to retrieve job due to an internal server error"}), 500
+
+# POST /api/jobs/<string:job_id>/cancel - Cancel a queued job, or ask a running job to stop
+@jobs_api_bp.route('/jobs/<string:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    try:
+        # A queued job is cancelled on the spot; a running job stops at its next progress report
+        job = db.session.execute(
+            update(Job).where(Job.id == job_id, Job.status == 'queued')
+            .values(status='cancelled', cancel_requested=True, finished_at=utcnow())
+            .returning(Job)
+        ).scalar_one_or_none()
+        status_code = 200
+        if job is None:
+            job = db.session.execute(
+                update(Job).where(Job.id == job_id, Job.status == 'running')
+                .values(cancel_requested=True)
+                .returning(Job)
+            ).scalar_one_or_none()
+            status_code = 202
+        if job is None:
+            db.session.rollback()
+            job = db.session.get(Job, job_id)
+            if job is None:
+                return jsonify({"error": "Job not found"}), 404
+            return jsonify({"error": f"Job already {job.status}"}), 409
+        body = job.to_dict()
+        db.session.commit()
+        return jsonify(body), status_code
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error cancelling job {job_id}: {str(e)}")
+        return jsonify({"error": "Failed to cancel job due to an internal server error"}), 500
@@ -1,45 +1,103 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, g, jsonify, request, current_app, stream_with_context
 from app import db
-from app.models import Project # Stage, Task, SubTask are not directly used here but available via Project relationships
+from app.models import Project, visible_projects # Stage, Task, SubTask are not directly used here but available via Project relationships
+from app.activity import record_activity
+from app.idempotency import idempotent
+from app.versioning import etag, if_match_version, precondition_failed, versioned_response
+from app.writes import insert_returning, rejected_update, update_returning
+from app.board import BOARD_DEPTHS, can_stream_board, load_board, load_boards, preview_length, stream_board
+from app.clone import clone_project
+from app.project_names import ProjectNameTaken, claim_project_name, release_project_names
+from app.serialization import wants_msgpack
+from app.sharding import each_shard
+from app.stats import project_stats, project_counts
+from app.purge import restore_window, restorable_until, utcnow
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import desc # For ordering
+from sqlalchemy import desc, update # For ordering and soft deletes
 from datetime import datetime, timezone
 
 projects_api_bp = Blueprint('projects_api', __name__)
 
 # POST /api/projects - Create a new project
 @projects_api_bp.route('/projects', methods=['POST'])
+@idempotent
 def create_project():
     data = request.get_json()
     if not data or not data.get('name'):
         return jsonify({"error": "Project name (name) is required"}), 400
 
-    # Check if project name already exists
-    if Project.query.filter_by(name=data['name']).first():
-        return jsonify({"error": f"Project name \"{data['name']}\" already exists"}), 409
-
-    new_project = Project(
-        name=data['name'],
-        description=data.get('description')
-        # created_at and updated_at are handled by model defaults
-    )
+    # One INSERT ... RETURNING; a taken name is rejected by the unique index
     try:
-        db.session.add(new_project)
+        new_project = insert_returning(Project, {'name': data['name'], 'description': data.get('description')})
+        body = new_project.to_dict() # Serialize before commit expires the RETURNING row
+        claim_project_name(body['name'], body['id'])
+        record_activity('project.created', body['id'], project_id=body['id'], details={'name': body['name']})
         db.session.commit()
-        return jsonify(new_project.to_dict()), 201
+        return versioned_response(body, body['version'], 201)
+    except (IntegrityError, ProjectNameTaken):
+        db.session.rollback()
+        return jsonify({"error": f"Project name \"{data['name']}\" already exists"}), 409
     except Exception as e:
         db.session.rollback()
         # Log the error e for server-side debugging
         print(f"Error creating project: {str(e)}")
         return jsonify({"error": "Failed to create project due to an internal server error"}), 500
 
+# POST /api/projects/<string:project_id>/clone - Copy a project (e.g. a template) with its board
+@projects_api_bp.route('/projects/<string:project_id>/clone', methods=['POST'])
+@idempotent
+def clone_project_route(project_id):
+    data = request.get_json(silent=True) or {}
+    if not data.get('name'):
+        return jsonify({"error": "Project name (name) is required"}), 400
+    options = {}
+    for option in ('include_tasks', 'include_subtasks', 'include_assignees'):
+        if option in data:
+            if not isinstance(data[option], bool):
+                return jsonify({"error": f"{option} must be true or false"}), 400
+            options[option] = data[option]
+    shift_days = data.get('shift_days', 0)
+    if not isinstance(shift_days, int) or isinstance(shift_days, bool):
+        return jsonify({"error": "shift_days must be an integer"}), 400
+
+    # A handful of set-based INSERT ... SELECT statements, whatever the size of the board
+    try:
+        cloned = clone_project(project_id, data['name'], data.get('description'), shift_days=shift_days, **options)
+        if cloned is None:
+            db.session.rollback()
+            return jsonify({"error": "Project not found"}), 404
+        project, counts = cloned
+        body = {**project.to_dict(), 'copied': counts}
+        claim_project_name(body['name'], body['id'])
+        record_activity('project.cloned', body['id'], project_id=body['id'], details={'source_project_id': project_id})
+        db.session.commit()
+        return versioned_response(body, body['version'], 201)
+    except (IntegrityError, ProjectNameTaken):
+        db.session.rollback()
+        return jsonify({"error": f"Project name \"{data['name']}\" already exists"}), 409
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error cloning project {project_id}: {str(e)}")
+        return jsonify({"error": "Failed to clone project due to an internal server error"}), 500
+
 # GET /api/projects - Retrieve all projects
 @projects_api_bp.route('/projects', methods=['GET'])
 def get_projects():
     try:
-        projects = Project.query.order_by(desc(Project.created_at)).all()
+        # Scatter-gather: each shard returns its projects newest first, merged here
+        projects = []
+        for _ in each_shard():
+            projects.extend(visible_projects().order_by(desc(Project.created_at)).all())
+        projects.sort(key=lambda project: project.created_at, reverse=True)
         # Serialize without stages for the list view
-        return jsonify([project.to_dict(include_stages=False) for project in projects]), 200
+        result = [project.to_dict(include_stages=False) for project in projects]
+        # Optional summary counts (?with_counts=1), computed with a single GROUP BY
+        if request.args.get('with_counts') in ('1', 'true'):
+            stats_cache = current_app.extensions['stats_cache']
+            counts = stats_cache.get_or_set('project_counts', project_counts)
+            for item in result:
+                item.update(counts.get(item['id'], {'stage_count': 0, 'task_count': 0}))
+        return jsonify(result), 200
     except Exception as e:
         db.session.rollback()
         print(f"Error fetching projects: {str(e)}")
@@ -49,60 +107,106 @@ def get_projects():
 @projects_api_bp.route('/projects/<string:project_id>', methods=['GET'])
 def get_project(project_id):
     try:
-        project = Project.query.get(project_id)
+        if not can_stream_board() or wants_msgpack() or g.get('in_batch'):
+            project = load_board(project_id)
+            if not project:
+                return jsonify({"error": "Project not found"}), 404
+            # Serialize with stages and their tasks/subtasks (content previews only)
+            return versioned_response(project.to_dict(include_stages=True, preview_length=preview_length()), project.version)
+        # Compact JSON: send the board stage by stage as it is read (see app/board.py)
+        project, chunks = stream_board(project_id)
         if not project:
             return jsonify({"error": "Project not found"}), 404
-        # Serialize with stages and their tasks/subtasks
-        return jsonify(project.to_dict(include_stages=True)), 200
+        response = Response(stream_with_context(chunks), mimetype=current_app.json.mimetype)
+        response.headers['ETag'] = etag(project.version)
+        return response
     except Exception as e:
         db.session.rollback()
         print(f"Error fetching project {project_id}: {str(e)}")
         return jsonify({"error": "Failed to retrieve project due to an internal server error"}), 500
 
+# GET /api/boards?ids=<id>,<id>&depth=tasks - Several boards in one request, keyed by
+# project id; ids that aren't live projects get a 404 marker instead of a board
+@projects_api_bp.route('/boards', methods=['GET'])
+def get_boards():
+    project_ids = list(dict.fromkeys(item.strip() for item in request.args.get('ids', '').split(',') if item.strip()))
+    if not project_ids:
+        return jsonify({"error": "ids must list at least one project id"}), 400
+    max_ids = current_app.config['BOARDS_MAX_IDS']
+    if len(project_ids) > max_ids:
+        return jsonify({"error": f"At most {max_ids} boards can be requested at once"}), 400
+    depth = request.args.get('depth', 'subtasks')
+    if depth not in BOARD_DEPTHS:
+        return jsonify({"error": f"depth must be one of: {', '.join(BOARD_DEPTHS)}"}), 400
+
+    try:
+        # 1 + depth queries per shard holding any of the projects
+        boards = {}
+        for _ in each_shard():
+            boards.update(load_boards(project_ids, depth))
+        missing = {"error": "Project not found", "status": 404}
+        return jsonify({project_id: boards.get(project_id, missing) for project_id in project_ids}), 200
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error fetching boards {', '.join(project_ids)}: {str(e)}")
+        return jsonify({"error": "Failed to retrieve boards due to an internal server error"}), 500
+
+# GET /api/projects/<string:project_id>/stats - Aggregate statistics for a project
+@projects_api_bp.route('/projects/<string:project_id>/stats', methods=['GET'])
+def get_project_stats(project_id):
+    try:
+        stats_cache = current_app.extensions['stats_cache']
+        cache_key = ('project_stats', project_id)
+        stats = stats_cache.get(cache_key)
+        if stats is None:
+            if not visible_projects().filter_by(id=project_id).first():
+                return jsonify({"error": "Project not found"}), 404
+            stats = project_stats(project_id)
+            stats_cache.set(cache_key, stats)
+        return jsonify(stats), 200
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error fetching stats for project {project_id}: {str(e)}")
+        return jsonify({"error": "Failed to retrieve project statistics due to an internal server error"}), 500
+
 # PUT /api/projects/<string:project_id> - Update an existing project
 @projects_api_bp.route('/projects/<string:project_id>', methods=['PUT'])
 def update_project(project_id):
-    project = Project.query.get(project_id)
-    if not project:
-        return jsonify({"error": "Project not found"}), 404
-
     data = request.get_json()
+    error = None
     if not data: # Check if request body is empty
-        return jsonify({"error": "Request body cannot be empty. Please provide 'name' and/or 'description'."}), 400
-
+        error = jsonify({"error": "Request body cannot be empty. Please provide 'name' and/or 'description'."}), 400
     # Validate name: if provided, it cannot be empty string.
-    if 'name' in data and not data['name']:
-        return jsonify({"error": "Project name cannot be an empty string if provided"}), 400
-    
-    # Check for name conflict if name is being changed
-    if 'name' in data and data['name'] != project.name:
-        if Project.query.filter(Project.name == data['name'], Project.id != project_id).first():
-            return jsonify({"error": f"Project name \"{data['name']}\" is already used by another project"}), 409
-        project.name = data['name']
-    
-    # Update description if provided (allows setting it to null or empty)
-    if 'description' in data:
-        project.description = data.get('description')
-    
-    # No specific fields to update means bad request, or could be idempotent 200 OK if nothing changed.
-    # For this implementation, if only 'id' or other non-updatable fields are passed, it's not an error,
-    # but nothing changes other than 'updated_at'.
-    # If 'name' and 'description' are not in data, it means no intended update to these fields.
-    if 'name' not in data and 'description' not in data:
-        # Check if any other keys were provided. If only known keys, it's fine. If unknown keys, could be an error.
-        # For simplicity, if no known fields are to be updated, we can return a message or the current project.
-        # However, the model's onupdate for updated_at will trigger if we commit.
-        # Let's ensure at least one field is intended for update or it's an empty JSON.
-        # The earlier check `if not data:` handles empty JSON. If data exists but doesn't contain 'name' or 'description',
-        # it could be an attempt to update other fields, which is not supported here.
-        # For now, we proceed, and only `updated_at` might change.
-        pass
+    elif 'name' in data and not data['name']:
+        error = jsonify({"error": "Project name cannot be an empty string if provided"}), 400
+    if error:
+        return rejected_update(error, "Project not found", Project, project_id, Project.deleted_at.is_(None))
 
+    # Only name and description are updatable; other keys are ignored and the
+    # update just bumps updated_at and version.
+    values = {field: data[field] for field in ('name', 'description') if field in data}
 
-    # updated_at is handled by the model's onupdate
+    # One UPDATE ... RETURNING, conditional on the version when If-Match is sent.
+    # Name conflicts are rejected by the unique index.
+    expected_version = if_match_version()
     try:
+        project = update_returning(Project, project_id, values, Project.deleted_at.is_(None),
+                                   expected_version=expected_version)
+        if project is None:
+            db.session.rollback()
+            if expected_version is not None:
+                return precondition_failed()
+            return jsonify({"error": "Project not found"}), 404
+        body = project.to_dict() # Serialize before commit expires the RETURNING row
+        if 'name' in values:
+            claim_project_name(body['name'], project_id)
+            release_project_names(project_id, keep=body['name'])
+        record_activity('project.updated', project_id, project_id=project_id, details={'fields': sorted(values)})
         db.session.commit()
-        return jsonify(project.to_dict()), 200
+        return versioned_response(body, body['version'])
+    except (IntegrityError, ProjectNameTaken):
+        db.session.rollback()
+        return jsonify({"error": f"Project name \"{data['name']}\" is already used by another project"}), 409
     except Exception as e:
         db.session.rollback()
         print(f"Error updating project {project_id}: {str(e)}")
@@ -111,14 +215,55 @@ def update_project(project_id):
 # DELETE /api/projects/<string:project_id> - Delete a project
 @projects_api_bp.route('/projects/<string:project_id>', methods=['DELETE'])
 def delete_project(project_id):
-    project = Project.query.get(project_id)
-    if not project:
-        return jsonify({"error": "Project not found"}), 404
     try:
-        db.session.delete(project) # Cascade delete should handle related items
+        # Soft delete: mark the project and return immediately. The project and its
+        # tree disappear from every read path; the purge worker removes the rows in
+        # small batches once the restore window has passed.
+        deleted_at = utcnow()
+        result = db.session.execute(
+            update(Project)
+            .where(Project.id == project_id, Project.deleted_at.is_(None))
+            .values(deleted_at=deleted_at)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            db.session.rollback()
+            return jsonify({"error": "Project not found"}), 404
+        release_project_names(project_id)
+        record_activity('project.deleted', project_id, project_id=project_id)
         db.session.commit()
-        return jsonify({"message": "Project successfully deleted"}), 200 # Or 204 No Content
+        return jsonify({
+            "message": "Project successfully deleted",
+            "restorable_until": restorable_until(deleted_at).isoformat() + 'Z'
+        }), 200 # Or 204 No Content
     except Exception as e:
         db.session.rollback()
         print(f"Error deleting project {project_id}: {str(e)}")
         return jsonify({"error": "Failed to delete project due to an internal server error"}), 500
+
+# POST /api/projects/<string:project_id>/restore - Undo a soft delete within the restore window
+@projects_api_bp.route('/projects/<string:project_id>/restore', methods=['POST'])
+def restore_project(project_id):
+    try:
+        project = db.session.execute(
+            update(Project)
+            .where(Project.id == project_id, Project.deleted_at.isnot(None), Project.deleted_at > restore_window())
+            .values(deleted_at=None)
+            .returning(Project)
+        ).scalar_one_or_none()
+        if project is None:
+            db.session.rollback()
+            return jsonify({"error": "No restorable deleted project found"}), 404
+        body = project.to_dict()
+        claim_project_name(body['name'], project_id)
+        record_activity('project.restored', project_id, project_id=project_id)
+        db.session.commit()
+        return versioned_response(body, body['version'])
+    except (IntegrityError, ProjectNameTaken):
+        # Another live project took the name in the meantime
+        db.session.rollback()
+        return jsonify({"error": "A project with the same name already exists; rename it before restoring"}), 409
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error restoring project {project_id}: {str(e)}")
+        return jsonify({"error": "Failed to restore project due to an internal server error"}), 500
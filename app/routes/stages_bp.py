@@ -1,91 +1,85 @@
 from flask import Blueprint, jsonify, request
 from app import db
-from app.models import Stage, Project # Task model is not directly used here
-from sqlalchemy.exc import IntegrityError
-from sqlalchemy import func # For db.func.max
+from app.models import Stage, visible_project_ids # Task model is not directly used here
+from app.activity import record_activity
+from app.idempotency import idempotent
+from app.versioning import if_match_version, precondition_failed, versioned_response
+from app.writes import insert_last, rejected_update, update_returning
+from app.board import preview_length
+from app.purge import restore_window, restorable_until, utcnow
+from sqlalchemy import update # For soft deletes and restores
 
 stages_api_bp = Blueprint('stages_api', __name__)
 
 # POST /api/projects/<string:project_id>/stages - Create a new stage for a project
 @stages_api_bp.route('/projects/<string:project_id>/stages', methods=['POST'])
+@idempotent
 def create_stage_for_project(project_id):
-    project = Project.query.get(project_id)
-    if not project:
-        return jsonify({"error": "Project not found"}), 404
-
     data = request.get_json()
     if not data or not data.get('name'):
         return jsonify({"error": "Stage name (name) is required"}), 400
 
-    # Determine order: place new stage at the end
-    # Query for the maximum 'order' value among stages for this project.
-    # func.max(Stage.order) returns None if there are no stages, so handle that.
-    current_max_order = db.session.query(func.max(Stage.order)).filter(Stage.project_id == project_id).scalar()
-    
-    new_order = 0
-    if current_max_order is not None: # If there are existing stages
-        new_order = current_max_order + 1
-    
-    new_stage = Stage(
-        name=data['name'],
-        project_id=project_id,
-        order=new_order
-        # created_at and updated_at are handled by model defaults
-    )
+    # One INSERT ... SELECT: checks the project is live and places the new stage
+    # at the end (max(order) + 1) in the same statement
     try:
-        db.session.add(new_stage)
-        db.session.commit()
+        new_stage = insert_last(Stage, 'project_id', project_id, visible_project_ids(), {'name': data['name']})
+        if new_stage is None:
+            db.session.rollback()
+            return jsonify({"error": "Project not found"}), 404
         # Serialize without tasks for this specific response as per common practice for creation
-        return jsonify(new_stage.to_dict(include_tasks=False)), 201 
+        body = new_stage.to_dict(include_tasks=False)
+        record_activity('stage.created', body['id'], project_id=project_id, details={'name': body['name']})
+        db.session.commit()
+        return versioned_response(body, body['version'], 201)
     except Exception as e:
         db.session.rollback()
         # Log the error e for server-side debugging
         print(f"Error creating stage for project {project_id}: {str(e)}")
         return jsonify({"error": "Failed to create stage due to an internal server error"}), 500
 
-# PUT /api/stages/<string:stage_id> - Update an existing stage
-@stages_api_bp.route('/stages/<string:stage_id>', methods=['PUT'])
-def update_stage(stage_id):
-    stage = Stage.query.get(stage_id)
-    if not stage:
-        return jsonify({"error": "Stage not found"}), 404
-
-    data = request.get_json()
-    if not data: # Check if request body is empty
-        return jsonify({"error": "Request body cannot be empty. Please provide 'name' and/or 'order'."}), 400
-
-    updated = False
+# Fields a PUT may change, validated: (values, None) or (None, error response)
+def stage_update_values(data):
+    values = {}
     if 'name' in data:
         if not data['name']: # Name cannot be set to an empty string
-             return jsonify({"error": "Stage name cannot be an empty string if provided"}), 400
-        stage.name = data['name']
-        updated = True
-    
+             return None, (jsonify({"error": "Stage name cannot be an empty string if provided"}), 400)
+        values['name'] = data['name']
+
     if 'order' in data:
         try:
-            new_order = int(data['order'])
-            # Add validation for negative order if necessary, e.g. if new_order < 0: return error
-            stage.order = new_order
-            updated = True
+            values['order'] = int(data['order'])
             # Note: This simple order update doesn't automatically re-order other stages.
-            # If a full re-ordering (maintaining contiguous, unique order) is needed,
-            # that logic would be significantly more complex and involve querying other stages
-            # for the same project and potentially shifting them.
         except ValueError:
-            return jsonify({"error": "Order must be an integer"}), 400
-    
-    if not updated:
-        # If data was provided, but 'name' or 'order' were not present or not valid for update.
-        # Or, we could return 200 OK with current representation if no valid fields for update were passed.
-        # For now, let's assume if data is present, it must contain at least one updatable field.
-        # If 'name' and 'order' are not in data, it means no intended update to these fields.
-        # It's not strictly an error if the state doesn't change, updated_at will still change.
-        pass # Proceed to commit, updated_at will be handled by model
+            return None, (jsonify({"error": "Order must be an integer"}), 400)
+    return values, None
 
-    # updated_at is handled by the model's onupdate
+# PUT /api/stages/<string:stage_id> - Update an existing stage
+@stages_api_bp.route('/stages/<string:stage_id>', methods=['PUT'])
+def update_stage(stage_id):
+    data = request.get_json()
+    if not data: # Check if request body is empty
+        values, error = None, (jsonify({"error": "Request body cannot be empty. Please provide 'name' and/or 'order'."}), 400)
+    else:
+        values, error = stage_update_values(data)
+    if error:
+        return rejected_update(error, "Stage not found", Stage, stage_id,
+                               Stage.deleted_at.is_(None), Stage.project_id.in_(visible_project_ids()))
+
+    # One UPDATE ... RETURNING, conditional on the version when If-Match is sent
+    expected_version = if_match_version()
     try:
+        stage = update_returning(Stage, stage_id, values,
+                                 Stage.deleted_at.is_(None), Stage.project_id.in_(visible_project_ids()),
+                                 expected_version=expected_version)
+        if stage is None:
+            db.session.rollback()
+            if expected_version is not None:
+                return precondition_failed()
+            return jsonify({"error": "Stage not found"}), 404
+        body = stage.to_dict(include_tasks=True, preview_length=preview_length()) # Show tasks after update
+        record_activity('stage.updated', stage_id, project_id=stage.project_id, details={'fields': sorted(values)})
         db.session.commit()
-        return jsonify(stage.to_dict(include_tasks=True)), 200 # Show tasks after update
+        return versioned_response(body, body['version'])
     except Exception as e:
         db.session.rollback()
         print(f"Error updating stage {stage_id}: {str(e)}")
@@ -94,14 +88,53 @@ def update_stage(stage_id):
 # DELETE /api/stages/<string:stage_id> - Delete a stage
 @stages_api_bp.route('/stages/<string:stage_id>', methods=['DELETE'])
 def delete_stage(stage_id):
-    stage = Stage.query.get(stage_id)
-    if not stage:
-        return jsonify({"error": "Stage not found"}), 404
     try:
-        db.session.delete(stage) # Cascade delete should handle related tasks
+        # Soft delete: the stage and its tasks are hidden at once and purged later
+        deleted_at = utcnow()
+        project_id = db.session.execute(
+            update(Stage)
+            .where(Stage.id == stage_id, Stage.deleted_at.is_(None), Stage.project_id.in_(visible_project_ids()))
+            .values(deleted_at=deleted_at)
+            .returning(Stage.project_id)
+            .execution_options(synchronize_session=False)
+        ).scalar()
+        if project_id is None:
+            db.session.rollback()
+            return jsonify({"error": "Stage not found"}), 404
+        record_activity('stage.deleted', stage_id, project_id=project_id)
         db.session.commit()
-        return jsonify({"message": "Stage successfully deleted"}), 200 # Or 204 No Content
+        return jsonify({
+            "message": "Stage successfully deleted",
+            "restorable_until": restorable_until(deleted_at).isoformat() + 'Z'
+        }), 200 # Or 204 No Content
     except Exception as e:
         db.session.rollback()
         print(f"Error deleting stage {stage_id}: {str(e)}")
         return jsonify({"error": "Failed to delete stage due to an internal server error"}), 500
+
+# POST /api/stages/<string:stage_id>/restore - Undo a soft delete within the restore window
+@stages_api_bp.route('/stages/<string:stage_id>/restore', methods=['POST'])
+def restore_stage(stage_id):
+    try:
+        stage = db.session.execute(
+            update(Stage)
+            .where(
+                Stage.id == stage_id,
+                Stage.deleted_at.isnot(None),
+                Stage.deleted_at > restore_window(),
+                Stage.project_id.in_(visible_project_ids()) # Restore the project first if it is deleted too
+            )
+            .values(deleted_at=None)
+            .returning(Stage)
+        ).scalar_one_or_none()
+        if stage is None:
+            db.session.rollback()
+            return jsonify({"error": "No restorable deleted stage found"}), 404
+        body = stage.to_dict(include_tasks=True, preview_length=preview_length())
+        record_activity('stage.restored', stage_id, project_id=stage.project_id)
+        db.session.commit()
+        return versioned_response(body, body['version'])
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error restoring stage {stage_id}: {str(e)}")
+        return jsonify({"error": "Failed to restore stage due to an internal server error"}), 500
@@ -1,98 +1,198 @@
 from flask import Blueprint, jsonify, request
 from app import db
-from app.models import SubTask, Task # Task needed for parent task validation
-from sqlalchemy.exc import IntegrityError # Though not explicitly used for custom checks here, good to have for db errors
-from sqlalchemy import func # For db.func.max
+from app.models import SubTask, Task, visible_task_ids # Task needed for the counter updates
+from app.activity import record_activity
+from app.idempotency import idempotent
+from app.versioning import if_match_version, patched_response, precondition_failed, versioned_response
+from app.writes import insert_last, patch_returning, rejected_update, update_returning
+from sqlalchemy import delete, func, select, update # For set-based deletes and counter updates
 
 subtasks_api_bp = Blueprint('subtasks_api', __name__)
 
+# Helper to keep Task.subtask_count / Task.completed_subtask_count exact.
+# Issues a single relative UPDATE in the caller's transaction, so the counters
+# commit (or roll back) together with the subtask change itself.
+def adjust_subtask_counters(task_id, total_delta=0, completed_delta=0):
+    if not total_delta and not completed_delta:
+        return
+    db.session.execute(
+        update(Task)
+        .where(Task.id == task_id)
+        .values(
+            subtask_count=Task.subtask_count + total_delta,
+            completed_subtask_count=Task.completed_subtask_count + completed_delta
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+# Recount Task.completed_subtask_count from the subtasks table in one UPDATE, for
+# writes that change `completed` without knowing its previous value
+def recount_completed_subtasks(task_id):
+    completed = select(func.count(SubTask.id)).where(
+        SubTask.parent_task_id == task_id, SubTask.completed.is_(True)).scalar_subquery()
+    db.session.execute(
+        update(Task)
+        .where(Task.id == task_id)
+        .values(completed_subtask_count=completed)
+        .execution_options(synchronize_session=False)
+    )
+
 # POST /api/tasks/<string:parent_task_id>/subtasks - Create a new subtask for a parent task
 @subtasks_api_bp.route('/tasks/<string:parent_task_id>/subtasks', methods=['POST'])
+@idempotent
 def create_subtask_for_task(parent_task_id):
-    parent_task = Task.query.get(parent_task_id)
-    if not parent_task:
-        return jsonify({"error": "Parent task not found"}), 404
-
     data = request.get_json()
     if not data or not data.get('content'):
         return jsonify({"error": "Subtask content (content) is required"}), 400
 
-    # Determine order: place new subtask at the end
-    current_max_order = db.session.query(func.max(SubTask.order)).filter(SubTask.parent_task_id == parent_task_id).scalar()
-    # Illustrative code uses filter_by, which is fine. My current is filter(). Sticking to current.
-    
-    new_order = 0
-    if current_max_order is not None: # If there are existing subtasks
-        new_order = current_max_order + 1
-    
     # Validate 'completed' field if present - keeping my robust check
     completed_status = data.get('completed', False) # Default to False
     if not isinstance(completed_status, bool):
         return jsonify({"error": "Completed status must be a boolean"}), 400
 
-    new_subtask = SubTask(
-        content=data['content'],
-        parent_task_id=parent_task_id,
-        completed=completed_status, # Using validated status
-        order=new_order
-        # created_at and updated_at are handled by model defaults
-    )
+    # One INSERT ... SELECT (parent check and order allocation included) plus the counter UPDATE
     try:
-        db.session.add(new_subtask)
+        new_subtask = insert_last(SubTask, 'parent_task_id', parent_task_id, visible_task_ids(), {
+            'content': data['content'],
+            'completed': completed_status
+        })
+        if new_subtask is None:
+            db.session.rollback()
+            return jsonify({"error": "Parent task not found"}), 404
+        body = new_subtask.to_dict()
+        adjust_subtask_counters(parent_task_id, total_delta=1, completed_delta=1 if completed_status else 0)
+        record_activity('subtask.created', body['id'], task_id=new_subtask.parent_task_id)
         db.session.commit()
-        return jsonify(new_subtask.to_dict()), 201
+        return versioned_response(body, body['version'], 201)
     except Exception as e:
         db.session.rollback()
         # Log the error e for server-side debugging
         print(f"Error creating subtask for task {parent_task_id}: {str(e)}")
         return jsonify({"error": f"Failed to create subtask: {str(e)}"}), 500
 
-# PUT /api/subtasks/<string:subtask_id> - Update an existing subtask
-@subtasks_api_bp.route('/subtasks/<string:subtask_id>', methods=['PUT'])
-def update_subtask(subtask_id):
-    subtask = SubTask.query.get(subtask_id)
-    if not subtask:
-        return jsonify({"error": "Subtask not found"}), 404
-
-    data = request.get_json()
-    if not data: # Check if request body is empty
-        return jsonify({"error": "Request body cannot be empty"}), 400 # Aligned with illustrative
-
+# Fields a PUT or PATCH may change, validated: (values, None) or (None, error response)
+def subtask_update_values(data):
+    values = {}
     if 'content' in data:
         if not data['content']: # Content cannot be set to an empty string
-             return jsonify({"error": "Subtask content cannot be empty"}), 400 # Aligned
-        subtask.content = data['content']
-    
+             return None, (jsonify({"error": "Subtask content cannot be empty"}), 400) # Aligned
+        values['content'] = data['content']
+
     if 'completed' in data:
         if not isinstance(data['completed'], bool): # Keeping robust check
-            return jsonify({"error": "Completed status must be a boolean"}), 400
-        subtask.completed = data['completed']
-        
+            return None, (jsonify({"error": "Completed status must be a boolean"}), 400)
+        values['completed'] = data['completed']
+
     if 'order' in data:
         try:
-            new_order = int(data['order']) # Illustrative sets subtask.order directly, I'll use new_order then set
-            subtask.order = new_order
-        except ValueError:
-            return jsonify({"error": "Order must be an integer"}), 400
-    
-    # Removed 'updated' flag logic, direct assignment is fine as per illustrative.
-    # updated_at is handled by the model's onupdate
+            values['order'] = int(data['order'])
+        except (ValueError, TypeError):
+            return None, (jsonify({"error": "Order must be an integer"}), 400)
+    return values, None
+
+def record_subtask_update(subtask_id, parent_task_id, values):
+    if values.keys() == {'completed'}:
+        record_activity('subtask.completed' if values['completed'] else 'subtask.reopened', subtask_id, task_id=parent_task_id)
+    else:
+        record_activity('subtask.updated', subtask_id, task_id=parent_task_id, details={'fields': sorted(values)})
+
+# PUT /api/subtasks/<string:subtask_id> - Update an existing subtask
+@subtasks_api_bp.route('/subtasks/<string:subtask_id>', methods=['PUT'])
+def update_subtask(subtask_id):
+    data = request.get_json()
+    if not data: # Check if request body is empty
+        values, error = None, (jsonify({"error": "Request body cannot be empty"}), 400)
+    else:
+        values, error = subtask_update_values(data)
+    if error:
+        return rejected_update(error, "Subtask not found", SubTask, subtask_id,
+                               SubTask.parent_task_id.in_(visible_task_ids()))
+
+    # One UPDATE ... RETURNING (conditional on the version when If-Match is sent),
+    # plus a counter recount when `completed` was written
+    expected_version = if_match_version()
     try:
+        subtask = update_returning(SubTask, subtask_id, values, SubTask.parent_task_id.in_(visible_task_ids()),
+                                   expected_version=expected_version)
+        if subtask is None:
+            db.session.rollback()
+            if expected_version is not None:
+                return precondition_failed()
+            return jsonify({"error": "Subtask not found"}), 404
+        body = subtask.to_dict()
+        if 'completed' in values:
+            recount_completed_subtasks(subtask.parent_task_id)
+        record_subtask_update(subtask_id, subtask.parent_task_id, values)
         db.session.commit()
-        return jsonify(subtask.to_dict()), 200
+        return versioned_response(body, body['version'])
     except Exception as e:
         db.session.rollback()
         print(f"Error updating subtask {subtask_id}: {str(e)}")
         return jsonify({"error": f"Failed to update subtask: {str(e)}"}), 500
 
+# PATCH /api/subtasks/<string:subtask_id> - Update a subtask without sending it back.
+# Built for the completion toggle, the most frequent write.
+@subtasks_api_bp.route('/subtasks/<string:subtask_id>', methods=['PATCH'])
+def patch_subtask(subtask_id):
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data, dict):
+        values, error = None, (jsonify({"error": "Request body cannot be empty"}), 400)
+    else:
+        values, error = subtask_update_values(data)
+    if error:
+        return rejected_update(error, "Subtask not found", SubTask, subtask_id,
+                               SubTask.parent_task_id.in_(visible_task_ids()))
+
+    visible = SubTask.parent_task_id.in_(visible_task_ids())
+    expected_version = if_match_version()
+    try:
+        if values.keys() == {'completed'}:
+            # A toggle only writes when the value flips, so the new value alone gives
+            # the counter delta: one UPDATE, plus the relative counter UPDATE if it flipped
+            row = patch_returning(SubTask, subtask_id, values, visible, SubTask.completed.is_not(values['completed']),
+                                  expected_version=expected_version, returning=(SubTask.parent_task_id,))
+            if row is not None:
+                adjust_subtask_counters(row.parent_task_id, completed_delta=1 if values['completed'] else -1)
+        else:
+            # Other fields are written as sent; recount when `completed` is among them
+            row = patch_returning(SubTask, subtask_id, values, visible,
+                                  expected_version=expected_version, returning=(SubTask.parent_task_id,))
+            if row is not None and 'completed' in values:
+                recount_completed_subtasks(row.parent_task_id)
+        if row is None:
+            # Failure path only: a missing subtask, a stale If-Match, or a toggle
+            # to the value it already has (answered with the unchanged version).
+            # The UPDATE matched no row, so there is nothing to roll back; doing so
+            # would also discard the earlier operations of a batch.
+            version = db.session.execute(select(SubTask.version).where(SubTask.id == subtask_id, visible)).scalar()
+            if version is None:
+                return jsonify({"error": "Subtask not found"}), 404
+            if values.keys() != {'completed'} or (expected_version is not None and expected_version != version):
+                return precondition_failed()
+            return patched_response(subtask_id, version)
+        record_subtask_update(subtask_id, row.parent_task_id, values)
+        db.session.commit()
+        return patched_response(subtask_id, row.version)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error patching subtask {subtask_id}: {str(e)}")
+        return jsonify({"error": f"Failed to update subtask: {str(e)}"}), 500
+
 # DELETE /api/subtasks/<string:subtask_id> - Delete a subtask
 @subtasks_api_bp.route('/subtasks/<string:subtask_id>', methods=['DELETE'])
 def delete_subtask(subtask_id):
-    subtask = SubTask.query.get(subtask_id)
-    if not subtask:
-        return jsonify({"error": "Subtask not found"}), 404
     try:
-        db.session.delete(subtask)
+        # DELETE ... RETURNING gives what the counter update needs without a lookup
+        deleted = db.session.execute(
+            delete(SubTask)
+            .where(SubTask.id == subtask_id, SubTask.parent_task_id.in_(visible_task_ids()))
+            .returning(SubTask.parent_task_id, SubTask.completed)
+        ).first()
+        if deleted is None:
+            db.session.rollback()
+            return jsonify({"error": "Subtask not found"}), 404
+        adjust_subtask_counters(deleted.parent_task_id, total_delta=-1, completed_delta=-1 if deleted.completed else 0)
+        record_activity('subtask.deleted', subtask_id, task_id=deleted.parent_task_id)
         db.session.commit()
         return jsonify({"message": "SubTask successfully deleted"}), 200 # Or 204 No Content
     except Exception as e:
@@ -1,8 +1,13 @@
 from flask import Blueprint, jsonify, request
 from app import db
-from app.models import Task, Stage # SubTask model is not directly used here but its instances are handled by Task's to_dict
-from sqlalchemy.exc import IntegrityError
-from sqlalchemy import func # For db.func.max
+from app.models import Task, Stage, visible_stages, visible_tasks, visible_stage_ids # SubTask model is not directly used here but its instances are handled by Task's to_dict
+from app.activity import record_activity
+from app.idempotency import idempotent
+from app.sharding import id_bucket, sharding_enabled
+from app.versioning import if_match_version, patched_response, precondition_failed, versioned_response
+from app.writes import insert_last, patch_returning, rejected_update, update_returning
+from sqlalchemy import delete, literal # For set-based deletes and the move check
+from sqlalchemy.orm.attributes import set_committed_value
 from datetime import datetime # For date parsing
 
 tasks_api_bp = Blueprint('tasks_api', __name__)
@@ -18,11 +23,8 @@ def parse_date_string(date_str):
 
 # POST /api/stages/<string:stage_id>/tasks - Create a new task for a stage
 @tasks_api_bp.route('/stages/<string:stage_id>/tasks', methods=['POST'])
+@idempotent
 def create_task_for_stage(stage_id):
-    stage = Stage.query.get(stage_id)
-    if not stage:
-        return jsonify({"error": "Stage not found"}), 404
-
     data = request.get_json()
     if not data or not data.get('content'):
         return jsonify({"error": "Task content (content) is required"}), 400
@@ -35,114 +37,167 @@ def create_task_for_stage(stage_id):
     if end_date_obj == 'error':
         return jsonify({"error": "Invalid end_date format. Use YYYY-MM-DD."}), 400
 
-    # Determine order: place new task at the end of the stage
-    current_max_order = db.session.query(func.max(Task.order)).filter(Task.stage_id == stage_id).scalar()
-    
-    new_order = 0
-    if current_max_order is not None: # If there are existing tasks in this stage
-        new_order = current_max_order + 1
-    
-    new_task = Task(
-        content=data['content'],
-        stage_id=stage_id,
-        assignee=data.get('assignee'),
-        start_date=start_date_obj,
-        end_date=end_date_obj,
-        order=new_order
-        # created_at and updated_at are handled by model defaults
-    )
+    # One INSERT ... SELECT: checks the stage is visible and places the new task
+    # at the end of the stage (max(order) + 1) in the same statement
     try:
-        db.session.add(new_task)
+        new_task = insert_last(Task, 'stage_id', stage_id, visible_stage_ids(), {
+            'content': data['content'],
+            'assignee': data.get('assignee'),
+            'start_date': start_date_obj,
+            'end_date': end_date_obj
+        })
+        if new_task is None:
+            db.session.rollback()
+            return jsonify({"error": "Stage not found"}), 404
+        # A new task has no subtasks; don't lazy load them to find out
+        set_committed_value(new_task, 'subtasks', [])
+        body = new_task.to_dict(include_subtasks=True)
+        record_activity('task.created', body['id'], stage_id=new_task.stage_id)
         db.session.commit()
-        # Serialize with subtasks (will be empty list for new task)
-        return jsonify(new_task.to_dict(include_subtasks=True)), 201 
+        return versioned_response(body, body['version'], 201)
     except Exception as e:
         db.session.rollback()
         # Log the error e for server-side debugging
         print(f"Error creating task for stage {stage_id}: {str(e)}")
         return jsonify({"error": f"Failed to create task: {str(e)}"}), 500
 
-# PUT /api/tasks/<string:task_id> - Update an existing task
-@tasks_api_bp.route('/tasks/<string:task_id>', methods=['PUT'])
-def update_task(task_id):
-    task = Task.query.get(task_id)
-    if not task:
-        return jsonify({"error": "Task not found"}), 404
-
-    data = request.get_json()
-    if not data: # Check if request body is empty
-        return jsonify({"error": "Request body cannot be empty. Please provide fields to update."}), 400
-
-    updated = False # Track if any attribute was actually changed
+# GET /api/tasks/<string:task_id> - Retrieve a single task with its full content
+@tasks_api_bp.route('/tasks/<string:task_id>', methods=['GET'])
+def get_task(task_id):
+    try:
+        task = visible_tasks().filter(Task.id == task_id).first()
+        if not task:
+            return jsonify({"error": "Task not found"}), 404
+        # Board views only carry content previews; this is where the full text is served
+        return versioned_response(task.to_dict(include_subtasks=True), task.version)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error fetching task {task_id}: {str(e)}")
+        return jsonify({"error": "Failed to retrieve task due to an internal server error"}), 500
 
+# Fields a PUT or PATCH may change, validated: (values, extra UPDATE conditions, None)
+# or (None, None, error response)
+def task_update_values(data, task_id):
+    values = {}
     if 'content' in data:
         if not data['content']: # Content cannot be set to an empty string
-             return jsonify({"error": "Task content cannot be an empty string if provided"}), 400
-        task.content = data['content']
-        updated = True
+             return None, None, (jsonify({"error": "Task content cannot be an empty string if provided"}), 400)
+        values['content'] = data['content']
     
     if 'assignee' in data: # Allows setting assignee to null or a new string
-        task.assignee = data.get('assignee')
-        updated = True
+        values['assignee'] = data.get('assignee')
 
     if 'start_date' in data:
         start_date_obj = parse_date_string(data.get('start_date'))
         if start_date_obj == 'error':
-            return jsonify({"error": "Invalid start_date format. Use YYYY-MM-DD."}), 400
-        task.start_date = start_date_obj
-        updated = True
+            return None, None, (jsonify({"error": "Invalid start_date format. Use YYYY-MM-DD."}), 400)
+        values['start_date'] = start_date_obj
 
     if 'end_date' in data:
         end_date_obj = parse_date_string(data.get('end_date'))
         if end_date_obj == 'error':
-            return jsonify({"error": "Invalid end_date format. Use YYYY-MM-DD."}), 400
-        task.end_date = end_date_obj
-        updated = True
+            return None, None, (jsonify({"error": "Invalid end_date format. Use YYYY-MM-DD."}), 400)
+        values['end_date'] = end_date_obj
         
     if 'order' in data:
         try:
-            new_order = int(data['order'])
-            # Add validation for negative order if necessary
-            # if new_order < 0: return jsonify({"error": "Order cannot be negative"}), 400
-            task.order = new_order
-            updated = True
-        except ValueError:
-            return jsonify({"error": "Order must be an integer"}), 400
-
-    if 'stage_id' in data and data['stage_id'] != task.stage_id:
-        target_stage_id = data['stage_id']
-        target_stage = Stage.query.get(target_stage_id)
-        if not target_stage:
-            return jsonify({"error": f"Target stage with id {target_stage_id} not found"}), 404
-        task.stage_id = target_stage_id
-        updated = True
-        # If 'order' is not also part of this request when moving stages, its current 'order' value
-        # is maintained, which might lead to order conflicts or non-sequential order in the new stage.
-        # The subtask description implies 'order' would be part of the request if re-ordering is desired.
-        # A more robust solution might re-calculate order (e.g., append to end) if not specified.
-
-    if not updated and data: # Data was provided but no recognized fields were changed
-        # This could return the current task representation or a specific message.
-        # For now, we proceed, only 'updated_at' will change.
-        pass
-
-    # updated_at is handled by the model's onupdate
+            values['order'] = int(data['order'])
+        except (ValueError, TypeError):
+            return None, None, (jsonify({"error": "Order must be an integer"}), 400)
+
+    conditions = [Task.stage_id.in_(visible_stage_ids())]
+    if 'stage_id' in data:
+        if sharding_enabled() and id_bucket(data['stage_id']) != id_bucket(task_id):
+            # The task's id (and its subtasks') carry its project's bucket, which routes them
+            return None, None, (jsonify({"error": "A task can't be moved to a stage of another project"}), 400)
+        # Moving: the target stage must be visible too, checked inside the UPDATE.
+        # The task keeps its 'order' unless the request also sets it.
+        values['stage_id'] = data['stage_id']
+        conditions.append(literal(data['stage_id'], Task.stage_id.type).in_(visible_stage_ids()))
+    return values, conditions, None
+
+# Failure path only, after an UPDATE matched no row: tell a missing target stage
+# apart from a stale If-Match and from a missing task
+def task_update_failed(data, expected_version):
+    if 'stage_id' in data and not visible_stages().filter(Stage.id == data['stage_id']).first():
+        return jsonify({"error": f"Target stage with id {data['stage_id']} not found"}), 404
+    if expected_version is not None:
+        return precondition_failed()
+    return jsonify({"error": "Task not found"}), 404
+
+def record_task_update(task_id, stage_id, values):
+    if 'stage_id' in values:
+        record_activity('task.moved', task_id, stage_id=stage_id, details={'stage_id': stage_id, 'fields': sorted(values)})
+    else:
+        record_activity('task.updated', task_id, stage_id=stage_id, details={'fields': sorted(values)})
+
+# PUT /api/tasks/<string:task_id> - Update an existing task
+@tasks_api_bp.route('/tasks/<string:task_id>', methods=['PUT'])
+def update_task(task_id):
+    data = request.get_json()
+    if not data: # Check if request body is empty
+        values, conditions, error = None, None, (jsonify({"error": "Request body cannot be empty. Please provide fields to update."}), 400)
+    else:
+        values, conditions, error = task_update_values(data, task_id)
+    if error:
+        return rejected_update(error, "Task not found", Task, task_id, Task.stage_id.in_(visible_stage_ids()))
+
+    # One UPDATE ... RETURNING, conditional on the version when If-Match is sent
+    expected_version = if_match_version()
     try:
+        task = update_returning(Task, task_id, values, *conditions, expected_version=expected_version)
+        if task is None:
+            db.session.rollback()
+            return task_update_failed(data, expected_version)
+        body = task.to_dict(include_subtasks=True)
+        record_task_update(task_id, task.stage_id, values)
         db.session.commit()
-        return jsonify(task.to_dict(include_subtasks=True)), 200
+        return versioned_response(body, body['version'])
     except Exception as e:
         db.session.rollback()
         print(f"Error updating task {task_id}: {str(e)}")
         return jsonify({"error": f"Failed to update task: {str(e)}"}), 500
 
+# PATCH /api/tasks/<string:task_id> - Update or move a task without sending it back
+@tasks_api_bp.route('/tasks/<string:task_id>', methods=['PATCH'])
+def patch_task(task_id):
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data, dict):
+        values, conditions, error = None, None, (jsonify({"error": "Request body cannot be empty. Please provide fields to update."}), 400)
+    else:
+        values, conditions, error = task_update_values(data, task_id)
+    if error:
+        return rejected_update(error, "Task not found", Task, task_id, Task.stage_id.in_(visible_stage_ids()))
+
+    # The same single UPDATE as PUT, but only the new version comes back: no
+    # subtasks are loaded and nothing is serialized
+    expected_version = if_match_version()
+    try:
+        row = patch_returning(Task, task_id, values, *conditions, expected_version=expected_version,
+                              returning=(Task.stage_id,))
+        if row is None:
+            db.session.rollback()
+            return task_update_failed(data, expected_version)
+        record_task_update(task_id, row.stage_id, values)
+        db.session.commit()
+        return patched_response(task_id, row.version)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error patching task {task_id}: {str(e)}")
+        return jsonify({"error": f"Failed to update task: {str(e)}"}), 500
+
 # DELETE /api/tasks/<string:task_id> - Delete a task
 @tasks_api_bp.route('/tasks/<string:task_id>', methods=['DELETE'])
 def delete_task(task_id):
-    task = Task.query.get(task_id)
-    if not task:
-        return jsonify({"error": "Task not found"}), 404
     try:
-        db.session.delete(task) # Cascade delete should handle related subtasks
+        # Single DELETE; subtasks are removed by ON DELETE CASCADE
+        stage_id = db.session.execute(
+            delete(Task).where(Task.id == task_id, Task.stage_id.in_(visible_stage_ids())).returning(Task.stage_id)
+        ).scalar()
+        if stage_id is None:
+            db.session.rollback()
+            return jsonify({"error": "Task not found"}), 404
+        record_activity('task.deleted', task_id, stage_id=stage_id)
         db.session.commit()
         return jsonify({"message": "Task successfully deleted"}), 200 # Or 204 No Content
     except Exception as e:
@@ -0,0 +1,76 @@
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import inspect
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.util import find_tables
+
+# db.session class that can send statements somewhere other than the default bind.
+# Request hooks decide where a request goes by setting values on flask.g:
+#   - g.db_route: 'replica' sends reads to the replica bind (app/replicas.py);
+#     flushes and INSERT/UPDATE/DELETE statements always use the primary.
+#   - g.db_shard: the shard bind key for the project tree tables (app/sharding.py).
+#     Other tables (e.g. idempotency_keys) stay on the default bind.
+#   - g.in_batch: set while POST /api/batch runs its operations (app/routes/batch_bp.py);
+#     commit() only flushes so the whole batch is committed once at the end.
+#   - g.defer_commit: set while an Idempotency-Key request runs its handler
+#     (app/idempotency.py); commit() only flushes so the handler's writes and the
+#     stored response are committed together.
+#   - g.batch_savepoint: the savepoint of the batch operation being run; rollback()
+#     only undoes that operation so a handler can't discard the ones before it.
+
+SHARDED_TABLES = {'projects', 'stages', 'tasks', 'subtasks'}
+
+def current_route():
+    return g.get('db_route', 'primary') if has_app_context() else 'primary'
+
+# Bucket of the project tree the current request works on; new ids carry it (see generate_uuid)
+def current_shard_bucket():
+    return g.get('shard_bucket') if has_app_context() else None
+
+# The request's routing decisions. A streamed response body is produced after the
+# request's teardown hooks have cleared them, so the stream puts them back first.
+ROUTING_KEYS = ('db_route', 'db_shard', 'shard_bucket')
+
+def routing_state():
+    return {key: g.get(key) for key in ROUTING_KEYS if key in g}
+
+def restore_routing(state):
+    for key, value in state.items():
+        setattr(g, key, value)
+
+# Id pre-minted for a project being created in this request (its hash picked the shard)
+def pop_new_project_id():
+    return g.pop('new_project_id', None) if has_app_context() else None
+
+def _touches_sharded_tables(mapper, clause):
+    if mapper is not None:
+        return inspect(mapper).local_table.name in SHARDED_TABLES
+    if clause is not None:
+        return any(getattr(table, 'name', None) in SHARDED_TABLES for table in find_tables(clause, include_crud=True))
+    return False
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            if current_app.config.get('SHARD_DATABASE_URLS') and _touches_sharded_tables(mapper, clause):
+                shard = g.get('db_shard')
+                if shard is None:
+                    raise RuntimeError("No shard selected for this query; wrap it in app.sharding.each_shard()")
+                return self._db.engines[shard]
+            if not self._flushing and not isinstance(clause, UpdateBase) and current_route() == 'replica':
+                return self._db.engines['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def commit(self):
+        if has_app_context() and (g.get('in_batch') or g.get('defer_commit')):
+            self.flush()
+            return
+        super().commit()
+
+    def rollback(self):
+        savepoint = g.get('batch_savepoint') if has_app_context() else None
+        if savepoint is not None and self.get_nested_transaction() is savepoint:
+            savepoint.rollback()
+            g.batch_savepoint = self.begin_nested() # The operation may go on writing
+            return
+        super().rollback()
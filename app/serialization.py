@@ -0,0 +1,90 @@
+from datetime import date, datetime, timezone
+from flask import Request, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.exceptions import BadRequest
+from app.tracing import span
+
+# Response and request body formats for /api. Handlers build plain dicts (the
+# models' to_dict, with native datetime/date values) and return them through
+# jsonify, which goes through app.json.response() below:
+#   - JSON (the default): datetimes as ISO 8601 UTC with a 'Z' suffix, dates as
+#     YYYY-MM-DD.
+#   - MessagePack, when the client sends `Accept: application/msgpack` and the
+#     `msgpack` package is installed: datetimes become MessagePack timestamps
+#     (extension type -1), dates stay YYYY-MM-DD strings.
+# Request bodies sent with `Content-Type: application/msgpack` are decoded by
+# request.get_json() like JSON bodies, so handlers don't see the difference.
+
+try:
+    import msgpack
+except ImportError: # Optional dependency; without it every response is JSON
+    msgpack = None
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+MSGPACK_MIMETYPES = {MSGPACK_MIMETYPE, 'application/x-msgpack'}
+
+def _utc(value):
+    # Stored datetimes are naive UTC
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return _utc(value).isoformat() + 'Z'
+    if isinstance(value, date):
+        return value.isoformat()
+    return DefaultJSONProvider.default(value)
+
+def _msgpack_default(value):
+    if isinstance(value, datetime):
+        return msgpack.Timestamp.from_datetime(_utc(value).replace(tzinfo=timezone.utc))
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not MessagePack serializable")
+
+def packb(obj):
+    return msgpack.packb(obj, default=_msgpack_default)
+
+def wants_msgpack():
+    if msgpack is None or not has_request_context() or not request.path.startswith('/api/'):
+        return False
+    # Without an Accept header (or with */*) JSON wins, being listed first
+    return request.accept_mimetypes.best_match(['application/json', *sorted(MSGPACK_MIMETYPES)]) in MSGPACK_MIMETYPES
+
+class ApiJSONProvider(DefaultJSONProvider):
+    default = staticmethod(_json_default)
+
+    def response(self, *args, **kwargs):
+        if not wants_msgpack():
+            with span('serialize.json') as encoding:
+                response = super().response(*args, **kwargs)
+                if encoding is not None:
+                    encoding.attributes['bytes'] = response.content_length
+            if msgpack is not None and has_request_context() and request.path.startswith('/api/'):
+                response.vary.add('Accept')
+            return response
+        if args and kwargs:
+            raise TypeError("jsonify() behavior undefined when passed both args and kwargs")
+        obj = (args[0] if len(args) == 1 else list(args)) if args else (kwargs or None)
+        with span('serialize.msgpack') as encoding:
+            body = packb(obj)
+            if encoding is not None:
+                encoding.attributes['bytes'] = len(body)
+        response = self._app.response_class(body, mimetype=MSGPACK_MIMETYPE)
+        response.vary.add('Accept')
+        return response
+
+class ApiRequest(Request):
+    def get_json(self, force=False, silent=False, cache=True):
+        if msgpack is None or self.mimetype not in MSGPACK_MIMETYPES:
+            return super().get_json(force=force, silent=silent, cache=cache)
+        try:
+            return msgpack.unpackb(self.get_data(cache=cache))
+        except Exception as e:
+            if silent:
+                return None
+            raise BadRequest(f"Failed to decode MessagePack object: {e}")
+
+def init_serialization(app):
+    app.json_provider_class = ApiJSONProvider
+    app.json = ApiJSONProvider(app)
+    app.request_class = ApiRequest
@@ -0,0 +1,157 @@
+import uuid
+import zlib
+from flask import current_app, g, request
+from sqlalchemy import create_engine, select
+from app import db
+from app.models import Project, Stage, Task, SubTask
+
+# Project sharding. With SHARD_DATABASE_URLS set, every project tree (the project
+# and its stages, tasks and subtasks) lives in one of N shard databases, bound as
+# 'shard0' .. 'shardN-1'; other tables stay in the default database.
+#
+# A project's bucket is a 16-bit hash of its id and its shard is bucket % N. Every
+# id created inside the tree starts with the same 4 hex digit bucket (see
+# app.models.generate_uuid), so a request for any stage, task or subtask is routed
+# from its id alone. Changing N only changes bucket % N: `flask rebalance-shards`
+# then moves each misplaced tree and no id changes.
+
+TREE_MODELS = [Project, Stage, Task, SubTask] # Parents before children
+# URL arguments that identify a project tree, and how to read the bucket from them
+PROJECT_ARG = 'project_id'
+CHILD_ARGS = ('stage_id', 'task_id', 'parent_task_id', 'subtask_id')
+CREATE_PROJECT_ENDPOINT = 'projects_api.create_project'
+
+def sharding_enabled(app=None):
+    return bool((app or current_app).config.get('SHARD_DATABASE_URLS'))
+
+def shard_keys(app=None):
+    return [f'shard{index}' for index in range(len((app or current_app).config['SHARD_DATABASE_URLS']))]
+
+def project_bucket(project_id):
+    return zlib.crc32(str(project_id).lower().encode()) & 0xFFFF
+
+def id_bucket(object_id):
+    try:
+        return int(str(object_id)[:4], 16)
+    except ValueError:
+        return 0 # Not one of our ids; it won't be found on any shard
+
+def shard_for_bucket(bucket, count=None):
+    count = count or len(current_app.config['SHARD_DATABASE_URLS'])
+    return f'shard{bucket % count}'
+
+def use_bucket(bucket):
+    g.shard_bucket = bucket
+    g.db_shard = shard_for_bucket(bucket)
+
+# before_request: route the request to the shard of the project tree in its URL.
+# Requests without one (e.g. GET /api/projects) gather from every shard explicitly.
+def choose_shard():
+    g.db_shard = g.shard_bucket = None
+    view_args = request.view_args or {}
+    if request.endpoint == CREATE_PROJECT_ENDPOINT:
+        # Inside a batch the new project joins the shard the batch already works on
+        batch_shard = g.get('batch_shard')
+        g.new_project_id = _project_id_on_shard(batch_shard) if batch_shard else str(uuid.uuid4())
+        use_bucket(project_bucket(g.new_project_id))
+    elif PROJECT_ARG in view_args:
+        use_bucket(project_bucket(view_args[PROJECT_ARG]))
+    else:
+        for arg in CHILD_ARGS:
+            if arg in view_args:
+                use_bucket(id_bucket(view_args[arg]))
+                break
+
+# Id for a project created from another project in this request (a clone): the
+# copy is made with INSERT ... SELECT, so it has to stay on the current shard.
+# Draws ids until one hashes to this shard (about N draws) and switches the
+# bucket so the new children's ids carry the new project's bucket.
+def project_id_on_current_shard():
+    if not sharding_enabled():
+        return str(uuid.uuid4())
+    new_id = _project_id_on_shard(g.db_shard)
+    g.shard_bucket = project_bucket(new_id)
+    return new_id
+
+def _project_id_on_shard(shard):
+    while True:
+        new_id = str(uuid.uuid4())
+        if shard_for_bucket(project_bucket(new_id)) == shard:
+            return new_id
+
+def reset_shard(exc):
+    for name in ('db_shard', 'shard_bucket', 'new_project_id'):
+        g.pop(name, None)
+
+# Run the body of a loop once per shard (once in total when not sharded):
+#     for _ in each_shard(): results.extend(query.all())
+def each_shard():
+    if not sharding_enabled():
+        yield None
+        return
+    previous = (g.get('db_shard'), g.get('shard_bucket'))
+    try:
+        for key in shard_keys():
+            g.db_shard, g.shard_bucket = key, None
+            yield key
+    finally:
+        g.db_shard, g.shard_bucket = previous
+
+def _tree_rows(conn, project_id):
+    # Every row of one project tree, per model, read with plain Core statements
+    stage_ids = select(Stage.id).where(Stage.project_id == project_id)
+    task_ids = select(Task.id).where(Task.stage_id.in_(stage_ids))
+    conditions = {
+        Project: Project.id == project_id,
+        Stage: Stage.project_id == project_id,
+        Task: Task.stage_id.in_(stage_ids),
+        SubTask: SubTask.parent_task_id.in_(task_ids),
+    }
+    return [
+        (model, [dict(row._mapping) for row in conn.execute(select(model.__table__).where(conditions[model]))])
+        for model in TREE_MODELS
+    ]
+
+# Move every project tree that is not on shard_for_bucket(project_bucket(id)) to
+# that shard. extra_sources are database URLs outside the current configuration
+# (e.g. a shard being retired) that are drained as well. A tree is copied and
+# committed on the target before it is deleted from the source, so an interrupted
+# run can simply be repeated. Nothing stops writes to a tree while it is copied, so
+# this may only run while the app is stopped. Returns {(source, target): projects moved}.
+def rebalance_shards(extra_sources=(), dry_run=False, log=print):
+    engines = {key: db.engines[key] for key in shard_keys()}
+    sources = dict(engines)
+    for url in extra_sources:
+        sources[url] = create_engine(url)
+    moved = {}
+    for source_key, source in sources.items():
+        with source.connect() as source_conn:
+            project_ids = source_conn.execute(select(Project.id)).scalars().all()
+        for project_id in project_ids:
+            target_key = shard_for_bucket(project_bucket(project_id))
+            if target_key == source_key:
+                continue
+            moved[(source_key, target_key)] = moved.get((source_key, target_key), 0) + 1
+            if dry_run:
+                continue
+            with source.connect() as source_conn:
+                tree = _tree_rows(source_conn, project_id)
+            with engines[target_key].begin() as target_conn:
+                already_copied = target_conn.execute(select(Project.id).where(Project.id == project_id)).first()
+                if not already_copied:
+                    for model, rows in tree:
+                        if rows:
+                            target_conn.execute(model.__table__.insert(), rows)
+            with source.begin() as source_conn:
+                # Stages, tasks and subtasks follow via ON DELETE CASCADE
+                source_conn.execute(Project.__table__.delete().where(Project.id == project_id))
+            log(f"Moved project {project_id} from {source_key} to {target_key}")
+    return moved
+
+def init_sharding(app):
+    if not sharding_enabled(app):
+        return
+    if 'replica' in (app.config.get('SQLALCHEMY_BINDS') or {}):
+        raise RuntimeError("READ_DATABASE_URL and SHARD_DATABASE_URLS can't be combined")
+    app.before_request(choose_shard)
+    app.teardown_request(reset_shard)
@@ -0,0 +1,119 @@
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from flask import current_app, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Slow query log. Every SQL statement is timed through engine events; one that takes
+# longer than SLOW_QUERY_THRESHOLD seconds is recorded in an in-memory ring of the
+# last SLOW_QUERY_LOG_SIZE entries (GET /api/admin/slow-queries) with
+#   - its parameters, redacted: strings and bytes are replaced by their type and length
+#   - the call site: the endpoint and blueprint of the request that ran it
+#   - on SQLite, the EXPLAIN QUERY PLAN output and the tables it scans in full
+# The plan is taken right after the statement, on the same DBAPI connection, so it
+# sees the same schema and statistics.
+
+TIMERS_KEY = 'slow_query_started' # Connection.info stack of statement start times
+FULL_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW)(\S+)') # Every row, through the table or an index
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+class SlowQueryLog:
+    def __init__(self, size):
+        self._entries = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, entry):
+        with self._lock:
+            self._entries.append(entry)
+
+    def entries(self):
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+def redact(parameters):
+    if isinstance(parameters, dict):
+        return {key: redact(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact(value) for value in parameters]
+    if isinstance(parameters, str):
+        return f'<str len={len(parameters)}>'
+    if isinstance(parameters, (bytes, bytearray, memoryview)):
+        return f'<bytes len={len(parameters)}>'
+    if parameters is None or isinstance(parameters, (bool, int, float)):
+        return parameters
+    return f'<{type(parameters).__name__}>'
+
+def explain_query_plan(dbapi_connection, statement, parameters):
+    # Plan lines indented by depth, as the sqlite3 shell prints them
+    cursor = dbapi_connection.cursor()
+    try:
+        rows = cursor.execute(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+    finally:
+        cursor.close()
+    depths, plan = {0: -1}, []
+    for node_id, parent_id, _, detail in rows:
+        depths[node_id] = depths.get(parent_id, -1) + 1
+        plan.append('  ' * depths[node_id] + detail)
+    return plan
+
+def full_scans(plan):
+    return sorted({match.group(1) for match in (FULL_SCAN.match(line.strip()) for line in plan or []) if match})
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(TIMERS_KEY, []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timers = conn.info.get(TIMERS_KEY)
+    if not timers:
+        return
+    duration = time.perf_counter() - timers.pop()
+    if not has_app_context() or 'slow_queries' not in current_app.extensions:
+        return
+    if duration < current_app.config['SLOW_QUERY_THRESHOLD']:
+        return
+    first_parameters = parameters[0] if executemany and parameters else parameters
+    entry = {
+        'statement': statement,
+        'parameters': redact(first_parameters),
+        'executemany': executemany,
+        'duration_ms': round(duration * 1000, 3),
+        'database': conn.engine.url.render_as_string(hide_password=True),
+        'endpoint': None,
+        'blueprint': None,
+        'request': None,
+        'plan': None,
+        'full_scans': [],
+        'recorded_at': datetime.now(timezone.utc),
+    }
+    if has_request_context():
+        entry.update(endpoint=request.endpoint, blueprint=request.blueprint, request=f'{request.method} {request.path}')
+    if conn.dialect.name == 'sqlite' and statement.lstrip().upper().startswith(EXPLAINABLE):
+        try:
+            entry['plan'] = explain_query_plan(conn.connection.dbapi_connection, statement, first_parameters or ())
+            entry['full_scans'] = full_scans(entry['plan'])
+        except Exception as e:
+            print(f"Error explaining slow query: {str(e)}")
+    current_app.extensions['slow_queries'].add(entry)
+
+def _handle_error(exception_context):
+    if exception_context.connection is not None:
+        timers = exception_context.connection.info.get(TIMERS_KEY)
+        if timers:
+            timers.pop()
+
+def init_slow_queries(app):
+    if app.config['SLOW_QUERY_THRESHOLD'] < 0:
+        return
+    app.extensions['slow_queries'] = SlowQueryLog(app.config['SLOW_QUERY_LOG_SIZE'])
+    for event_name, listener in (('before_cursor_execute', _before_cursor_execute),
+                                 ('after_cursor_execute', _after_cursor_execute),
+                                 ('handle_error', _handle_error)):
+        if not event.contains(Engine, event_name, listener):
+            event.listen(Engine, event_name, listener)
@@ -0,0 +1,90 @@
+from datetime import date, datetime, timezone
+from sqlalchemy import and_, case, func, or_, select
+from app import db
+from app.models import Project, Stage, Task
+from app.sharding import each_shard
+
+# Aggregate queries for the reporting endpoints. Everything here is computed with
+# GROUP BY queries over the indexed foreign keys (stages.project_id, tasks.stage_id)
+# so a dashboard never has to load the board tree.
+
+# A task is overdue when its end_date has passed and it is not finished, where
+# "finished" means it has subtasks and all of them are completed.
+def _overdue_case(today):
+    is_overdue = and_(
+        Task.end_date.isnot(None),
+        Task.end_date < today,
+        or_(Task.subtask_count == 0, Task.completed_subtask_count < Task.subtask_count)
+    )
+    return func.coalesce(func.sum(case((is_overdue, 1), else_=0)), 0)
+
+def project_stats(project_id, today=None):
+    today = today or date.today()
+
+    # Per-stage counts (LEFT JOIN keeps stages without tasks)
+    stage_rows = db.session.execute(
+        select(
+            Stage.id, Stage.name, Stage.order,
+            func.count(Task.id),
+            _overdue_case(today),
+            func.coalesce(func.sum(Task.subtask_count), 0),
+            func.coalesce(func.sum(Task.completed_subtask_count), 0)
+        )
+        .outerjoin(Task, Task.stage_id == Stage.id)
+        .where(Stage.project_id == project_id, Stage.deleted_at.is_(None))
+        .group_by(Stage.id, Stage.name, Stage.order)
+        .order_by(Stage.order)
+    ).all()
+
+    # Per-assignee load across the whole project
+    assignee_rows = db.session.execute(
+        select(Task.assignee, func.count(Task.id), _overdue_case(today))
+        .join(Stage, Task.stage_id == Stage.id)
+        .where(Stage.project_id == project_id, Stage.deleted_at.is_(None))
+        .group_by(Task.assignee)
+        .order_by(func.count(Task.id).desc(), Task.assignee)
+    ).all()
+
+    stages = [
+        {
+            'stage_id': stage_id,
+            'name': name,
+            'order': order,
+            'task_count': task_count,
+            'overdue_task_count': overdue,
+            'subtask_count': subtasks,
+            'completed_subtask_count': completed
+        }
+        for stage_id, name, order, task_count, overdue, subtasks, completed in stage_rows
+    ]
+    return {
+        'project_id': project_id,
+        'stage_count': len(stages),
+        'task_count': sum(s['task_count'] for s in stages),
+        'overdue_task_count': sum(s['overdue_task_count'] for s in stages),
+        'subtask_count': sum(s['subtask_count'] for s in stages),
+        'completed_subtask_count': sum(s['completed_subtask_count'] for s in stages),
+        'stages': stages,
+        'assignees': [
+            {'assignee': assignee, 'task_count': task_count, 'overdue_task_count': overdue}
+            for assignee, task_count, overdue in assignee_rows
+        ],
+        'generated_at': datetime.now(timezone.utc).replace(tzinfo=None).isoformat() + 'Z'
+    }
+
+# Stage and task counts for every live project, keyed by project id, in one GROUP BY
+# per shard. Projects without stages are absent from the result.
+def project_counts():
+    rows = []
+    for _ in each_shard():
+        rows.extend(db.session.execute(
+            select(Stage.project_id, func.count(func.distinct(Stage.id)), func.count(Task.id))
+            .join(Project, Stage.project_id == Project.id)
+            .outerjoin(Task, Task.stage_id == Stage.id)
+            .where(Stage.deleted_at.is_(None), Project.deleted_at.is_(None))
+            .group_by(Stage.project_id)
+        ).all())
+    return {
+        project_id: {'stage_count': stage_count, 'task_count': task_count}
+        for project_id, stage_count, task_count in rows
+    }
@@ -0,0 +1,244 @@
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Lightweight request tracing. With TRACING_ENABLED, a sampled request gets a root
+# span, every SQL statement it runs becomes a child span (engine events), and code
+# can add its own spans with `with span('name'):` (board loading, to_dict of a board,
+# JSON/MessagePack encoding). An incoming W3C `traceparent` header continues the
+# caller's trace and its sampled flag wins; otherwise TRACING_SAMPLE_RATE decides.
+# When the root span ends the whole trace goes to the configured exporter, in the
+# OTLP/JSON shape (ExportTraceServiceRequest):
+#   - jsonl: one trace per line appended to TRACING_EXPORT_PATH (like the collector's file exporter)
+#   - otlp: POSTed to TRACING_OTLP_ENDPOINT from a background thread
+# Unsampled requests and work outside requests (jobs, CLI) cost one ContextVar lookup.
+
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+SPAN_TOKEN_KEY = 'kanban.trace_token'
+SQL_SPANS_KEY = 'tracing_spans' # Connection.info stack of open SQL spans
+
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+
+_current = ContextVar('kanban_current_span', default=None)
+
+class Span:
+    def __init__(self, name, trace_id, parent_id=None, kind=KIND_INTERNAL, trace=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.trace = trace if trace is not None else [] # Finished spans of the whole trace
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def child(self, name, kind=KIND_INTERNAL, **attributes):
+        return Span(name, self.trace_id, self.span_id, kind, self.trace, attributes)
+
+    def end(self, error=None):
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        self.trace.append(self)
+
+    def to_otlp(self):
+        data = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in self.attributes.items()],
+            'status': {'code': 2, 'message': self.error} if self.error else {'code': 0},
+        }
+        if self.parent_id:
+            data['parentSpanId'] = self.parent_id
+        return data
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)} # OTLP/JSON encodes 64-bit integers as strings
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+def export_request(spans, service_name):
+    # OTLP/JSON ExportTraceServiceRequest for one trace
+    return {'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': service_name}}]},
+        'scopeSpans': [{'scope': {'name': 'kanban.tracing'}, 'spans': [s.to_otlp() for s in spans]}],
+    }]}
+
+def current_span():
+    return _current.get()
+
+# A child span of the current span (or of `parent`, for code running outside the
+# request's context, such as a streamed response body); a no-op when not tracing
+@contextmanager
+def span(name, parent=None, **attributes):
+    parent = parent or _current.get()
+    if parent is None:
+        yield None
+        return
+    child = parent.child(name, **attributes)
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.end(error=e)
+        raise
+    else:
+        child.end()
+    finally:
+        _current.reset(token)
+
+# Exporters: name -> factory(app) returning a callable taking a finished trace's spans
+EXPORTERS = {}
+
+def exporter(name):
+    def register(factory):
+        EXPORTERS[name] = factory
+        return factory
+    return register
+
+@exporter('jsonl')
+class JsonLinesExporter:
+    def __init__(self, app):
+        self.path = app.config.get('TRACING_EXPORT_PATH') or os.path.join(app.instance_path, 'traces.jsonl')
+        self.service_name = app.config['TRACING_SERVICE_NAME']
+        self._lock = threading.Lock()
+
+    def __call__(self, spans):
+        line = json.dumps(export_request(spans, self.service_name), separators=(',', ':'))
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+@exporter('otlp')
+class OtlpHttpExporter:
+    # Traces wait in a bounded queue and are dropped when the collector can't keep up
+    def __init__(self, app):
+        self.endpoint = app.config['TRACING_OTLP_ENDPOINT']
+        self.service_name = app.config['TRACING_SERVICE_NAME']
+        self._queue = queue.Queue(maxsize=1000)
+        threading.Thread(target=self._send_forever, name='trace-exporter', daemon=True).start()
+
+    def __call__(self, spans):
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            pass
+
+    def _send_forever(self):
+        while True:
+            body = json.dumps(export_request(self._queue.get(), self.service_name)).encode()
+            try:
+                post = urllib.request.Request(self.endpoint, data=body, headers={'Content-Type': 'application/json'})
+                urllib.request.urlopen(post, timeout=5).close()
+            except Exception as e:
+                print(f"Error exporting trace to {self.endpoint}: {str(e)}")
+
+def _sampled(traceparent):
+    rate = current_app.config['TRACING_SAMPLE_RATE']
+    match = TRACEPARENT.match(traceparent or '')
+    if match and match.group(1) != '0' * 32 and match.group(2) != '0' * 16:
+        return match.group(1), match.group(2), bool(int(match.group(3), 16) & 1)
+    return os.urandom(16).hex(), None, rate >= 1 or random.random() < rate
+
+def start_request_span():
+    parent = _current.get()
+    if parent is not None:
+        # A request dispatched inside another one (a batch operation)
+        request_span = parent.child(f'{request.method} {request.url_rule or request.path}')
+    else:
+        trace_id, parent_id, sampled = _sampled(request.headers.get('traceparent'))
+        if not sampled:
+            return
+        request_span = Span(f'{request.method} {request.url_rule or request.path}', trace_id, parent_id, KIND_SERVER)
+    request_span.attributes.update({'http.method': request.method, 'http.target': request.path})
+    if request.url_rule is not None:
+        request_span.attributes['http.route'] = request.url_rule.rule
+    request.environ[SPAN_TOKEN_KEY] = (request_span, _current.set(request_span))
+
+def _finish(request_span, export, error=None):
+    request_span.end(error=error)
+    if request_span.kind == KIND_SERVER:
+        try:
+            export(request_span.trace)
+        except Exception as e:
+            print(f"Error exporting trace {request_span.trace_id}: {str(e)}")
+
+def record_status(response):
+    started = request.environ.get(SPAN_TOKEN_KEY)
+    if started:
+        request_span = started[0]
+        request_span.attributes['http.status_code'] = response.status_code
+        if response.is_streamed:
+            # The body is produced after teardown; the span ends when the server closes it
+            request_span.attributes['http.streamed'] = True
+            response.call_on_close(partial(_finish, request_span, current_app.extensions['trace_exporter']))
+    return response
+
+def end_request_span(exc):
+    started = request.environ.pop(SPAN_TOKEN_KEY, None)
+    if not started:
+        return
+    request_span, token = started
+    _current.reset(token)
+    if not request_span.attributes.get('http.streamed'):
+        _finish(request_span, current_app.extensions['trace_exporter'], exc)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = _current.get()
+    if parent is None:
+        return
+    limit = current_app.config['TRACING_MAX_STATEMENT_LENGTH']
+    sql_span = parent.child(f'db {statement.split(None, 1)[0].upper() if statement.strip() else "SQL"}', KIND_CLIENT,
+                            **{'db.system': conn.dialect.name, 'db.statement': statement[:limit]})
+    if executemany:
+        sql_span.attributes['db.executemany'] = True
+    conn.info.setdefault(SQL_SPANS_KEY, []).append(sql_span)
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get(SQL_SPANS_KEY)
+    if spans:
+        sql_span = spans.pop()
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            sql_span.attributes['db.rowcount'] = cursor.rowcount
+        sql_span.end()
+
+def _handle_error(exception_context):
+    spans = exception_context.connection.info.get(SQL_SPANS_KEY) if exception_context.connection is not None else None
+    if spans:
+        spans.pop().end(error=exception_context.original_exception)
+
+def init_tracing(app):
+    if not app.config.get('TRACING_ENABLED'):
+        return
+    name = app.config['TRACING_EXPORTER']
+    if name not in EXPORTERS:
+        raise RuntimeError(f"Unknown TRACING_EXPORTER {name!r}; expected one of {', '.join(sorted(EXPORTERS))}")
+    app.extensions['trace_exporter'] = EXPORTERS[name](app)
+    for event_name, listener in (('before_cursor_execute', _before_cursor_execute),
+                                 ('after_cursor_execute', _after_cursor_execute),
+                                 ('handle_error', _handle_error)):
+        if not event.contains(Engine, event_name, listener):
+            event.listen(Engine, event_name, listener)
+    app.before_request(start_request_span)
+    app.after_request(record_status)
+    app.teardown_request(end_request_span)
@@ -0,0 +1,45 @@
+from flask import current_app, jsonify, request
+
+# Optimistic concurrency. Every model carries a `version` that goes up by one on
+# each update and is sent as the ETag. A PUT with If-Match runs as a single
+# UPDATE ... WHERE id = ? AND version = ? RETURNING (app.writes.update_returning);
+# when no row comes back the precondition failed (stale version, or the row is
+# gone) and the caller answers 412 without reading the row again.
+
+def etag(version):
+    return f'"{version}"'
+
+def versioned_response(body, version, status=200):
+    response = jsonify(body)
+    response.status_code = status
+    response.headers['ETag'] = etag(version)
+    return response
+
+# The version the client expects from If-Match: None when the header is absent
+# (or `*`, which any existing row satisfies), False when it can't match any version
+def if_match_version():
+    header = request.headers.get('If-Match')
+    if header is None or header.strip() == '*':
+        return None
+    value = header.strip()
+    if value.startswith('W/'):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        return False
+
+# Answer to a PATCH: the new version only, as {"id", "version"} and the ETag, or
+# an empty 204 when the client sends `Prefer: return=minimal` (RFC 7240)
+def patched_response(object_id, version):
+    preferences = {p.split(';')[0].replace(' ', '') for p in request.headers.get('Prefer', '').split(',')}
+    if 'return=minimal' in preferences:
+        response = current_app.response_class(status=204)
+        response.headers['Preference-Applied'] = 'return=minimal'
+    else:
+        response = jsonify({"id": object_id, "version": version})
+    response.headers['ETag'] = etag(version)
+    return response
+
+def precondition_failed():
+    return jsonify({"error": "Resource was modified by another request (If-Match did not match the current version)"}), 412
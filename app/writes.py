@@ -0,0 +1,64 @@
+from datetime import datetime, timezone
+from flask import jsonify
+from sqlalchemy import exists, func, insert, literal, select, update
+from app import db
+
+# Single-round-trip write helpers. Creates and updates are one statement each:
+# existence/visibility checks go into the statement's WHERE clause, uniqueness is
+# left to the database constraints (callers map IntegrityError), and the written
+# row comes back with RETURNING, so nothing is read before or after the write.
+
+# INSERT ... SELECT ... RETURNING for a child placed after its siblings. The row is
+# only inserted when parent_id is in visible_parent_ids, and its order is
+# max(order) + 1 computed by the same statement (SQLite runs it under the database
+# write lock, so concurrent creates can't be handed the same order). Returns the
+# new object, or None when the parent doesn't exist or isn't visible.
+def insert_last(model, parent_key, parent_id, visible_parent_ids, values):
+    parent_column = getattr(model, parent_key)
+    parent = literal(parent_id, parent_column.type)
+    next_order = select(func.coalesce(func.max(model.order) + 1, 0)).where(parent_column == parent_id).scalar_subquery()
+    row = select(
+        parent, next_order,
+        *(literal(value, getattr(model, key).type) for key, value in values.items())
+    ).where(parent.in_(visible_parent_ids))
+    return db.session.execute(
+        insert(model).from_select([parent_key, 'order', *values], row).returning(model)
+    ).scalar_one_or_none()
+
+def insert_returning(model, values):
+    return db.session.execute(insert(model).values(**values).returning(model)).scalar_one()
+
+def _update_one(model, object_id, values, conditions, expected_version):
+    if expected_version is not None:
+        conditions = (*conditions, model.version == expected_version)
+    return (update(model)
+            .where(model.id == object_id, *conditions)
+            .values(**values, version=model.version + 1, updated_at=datetime.now(timezone.utc)))
+
+# UPDATE ... RETURNING for one row that satisfies `conditions` (soft delete
+# visibility), bumping its version. With expected_version the update only applies
+# to that version (If-Match). Returns the updated object, or None when no row matched.
+def update_returning(model, object_id, values, *conditions, expected_version=None):
+    if expected_version is False:
+        return None
+    return db.session.execute(
+        _update_one(model, object_id, values, conditions, expected_version).returning(model)
+    ).scalar_one_or_none()
+
+# The same UPDATE for writes that don't send the object back (PATCH): only the new
+# version and the `returning` columns come back, so no object is built or loaded.
+# Returns that row, or None when no row matched.
+def patch_returning(model, object_id, values, *conditions, expected_version=None, returning=()):
+    if expected_version is False:
+        return None
+    return db.session.execute(
+        _update_one(model, object_id, values, conditions, expected_version).returning(model.version, *returning)
+    ).first()
+
+# The failure path of an update whose body didn't validate: the object is looked up
+# only now, so a missing or hidden one still answers 404 (as when existence was
+# checked before the body) and an existing one gets the validation `error`.
+def rejected_update(error, not_found, model, object_id, *conditions):
+    if db.session.execute(select(exists().where(model.id == object_id, *conditions))).scalar():
+        return error
+    return jsonify({"error": not_found}), 404
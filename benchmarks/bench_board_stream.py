@@ -0,0 +1,80 @@
+"""Benchmark the streamed board response against building it in one piece.
+
+Seeds one project of increasing size into a temporary SQLite file and fetches
+GET /api/projects/<id> through the test client, once streamed (the default) and
+once materialized (load_board + to_dict + jsonify, what the endpoint did before
+and still does for MessagePack). Reports time to first byte, total time and peak
+Python memory (tracemalloc) of each, and checks that both bodies are identical.
+
+Usage: python benchmarks/bench_board_stream.py [--sizes 1000,10000,50000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db
+from app.board import load_board, preview_length
+from config import Config
+from bench_serialization import seed_project
+
+
+def measure(produce):
+    db.session.remove()
+    tracemalloc.start()
+    started = time.perf_counter()
+    chunks = produce()
+    first = next(chunks)
+    first_byte = time.perf_counter() - started
+    body = first + b''.join(chunks)
+    total = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return first_byte, total, peak, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,50000', help='comma separated task counts')
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+            PURGE_WORKER_ENABLED = False
+            JOBS_WORKERS = 0
+
+        app = create_app(BenchConfig)
+        client = app.test_client()
+        with app.app_context():
+            db.create_all(bind_key=None)
+            print(f"{'mode':<12} {'tasks':>7} {'first byte ms':>14} {'total ms':>9} {'peak MB':>8} {'bytes':>10}")
+            for size in sizes:
+                project_id = seed_project(f'board-{size}', size)
+
+                def streamed():
+                    response = client.get(f'/api/projects/{project_id}')
+                    return iter(response.iter_encoded())
+
+                def materialized():
+                    with app.test_request_context(f'/api/projects/{project_id}'):
+                        board = load_board(project_id).to_dict(include_stages=True, preview_length=preview_length())
+                        yield app.json.response(board).get_data()
+
+                results = {}
+                for name, produce in (('materialized', materialized), ('streamed', streamed)):
+                    first_byte, total, peak, body = measure(produce)
+                    results[name] = body
+                    print(f"{name:<12} {size:>7} {first_byte * 1000:>14.2f} {total * 1000:>9.2f} "
+                          f"{peak / 1024 / 1024:>8.1f} {len(body):>10}")
+                assert results['streamed'] == results['materialized'], "streamed body differs"
+                db.session.remove()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Benchmark deleting large projects.
+
+Seeds projects of increasing size into a temporary SQLite file and measures
+wall time and peak Python memory (tracemalloc) of DELETE /api/projects/<id>
+(a soft delete) followed by the batched purge of the project's rows. The peak
+should stay flat as the project grows; pass --legacy to compare against loading
+the tree and deleting it through the ORM.
+
+Usage: python benchmarks/bench_cascade_delete.py [--sizes 1000,10000,100000] [--legacy]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db
+from app.models import Project, Stage, Task, SubTask, generate_uuid
+from app.purge import purge_deleted, utcnow
+from config import Config
+
+SUBTASKS_PER_TASK = 2
+TASKS_PER_STAGE = 1000
+
+
+def seed_project(name, task_count):
+    now = datetime.now(timezone.utc)
+    project_id = generate_uuid()
+    db.session.execute(db.insert(Project), [{'id': project_id, 'name': name, 'created_at': now, 'updated_at': now}])
+    stage_rows, task_rows, subtask_rows = [], [], []
+    for i in range(task_count):
+        if i % TASKS_PER_STAGE == 0:
+            stage_id = generate_uuid()
+            stage_rows.append({'id': stage_id, 'name': f'Stage {len(stage_rows)}', 'project_id': project_id,
+                               'order': len(stage_rows), 'created_at': now, 'updated_at': now})
+        task_id = generate_uuid()
+        task_rows.append({'id': task_id, 'content': f'Task {i}', 'stage_id': stage_id, 'order': i,
+                          'subtask_count': SUBTASKS_PER_TASK, 'created_at': now, 'updated_at': now})
+        for j in range(SUBTASKS_PER_TASK):
+            subtask_rows.append({'id': generate_uuid(), 'content': f'Subtask {j}', 'parent_task_id': task_id,
+                                 'completed': False, 'order': j, 'created_at': now, 'updated_at': now})
+    db.session.execute(db.insert(Stage), stage_rows)
+    db.session.execute(db.insert(Task), task_rows)
+    db.session.execute(db.insert(SubTask), subtask_rows)
+    db.session.commit()
+    return project_id
+
+
+def legacy_delete(project_id):
+    # What the ORM cascade used to do: load every row, then delete them one by one
+    project = db.session.get(Project, project_id)
+    for stage in project.stages:
+        for task in stage.tasks:
+            for subtask in task.subtasks:
+                db.session.delete(subtask)
+            db.session.delete(task)
+        db.session.delete(stage)
+    db.session.delete(project)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000', help='comma separated task counts')
+    parser.add_argument('--legacy', action='store_true', help='also measure the ORM-loaded cascade')
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+            PURGE_WORKER_ENABLED = False
+            PURGE_PAUSE = 0
+
+        app = create_app(BenchConfig)
+        with app.app_context():
+            db.create_all()
+            client = app.test_client()
+            modes = ['cascade'] + (['legacy'] if args.legacy else [])
+            print(f"{'mode':<8} {'tasks':>8} {'rows':>9} {'seconds':>9} {'peak MiB':>9}")
+            for mode in modes:
+                for size in sizes:
+                    project_id = seed_project(f'{mode}-{size}', size)
+                    db.session.remove()
+                    tracemalloc.start()
+                    started = time.perf_counter()
+                    if mode == 'cascade':
+                        assert client.delete(f'/api/projects/{project_id}').status_code == 200
+                        purge_deleted(cutoff=utcnow() + timedelta(seconds=1))
+                    else:
+                        legacy_delete(project_id)
+                    elapsed = time.perf_counter() - started
+                    _, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                    db.session.remove()
+                    rows = size * (1 + SUBTASKS_PER_TASK) + size // TASKS_PER_STAGE + 1
+                    print(f"{mode:<8} {size:>8} {rows:>9} {elapsed:>9.3f} {peak / 2**20:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Benchmark text vs. 16-byte binary UUID keys.
+
+Builds the same project/stage/task dataset twice in temporary SQLite files,
+once with VARCHAR(36) keys (the old schema) and once with 16-byte BLOB keys
+(app.models.UUIDBinary), then reports database size and the latency of the
+joins the board and statistics endpoints run.
+
+Usage: python benchmarks/bench_key_storage.py [--tasks 1000000] [--repeat 200]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+import uuid
+
+STAGES_PER_PROJECT = 10
+TASKS_PER_STAGE = 1000
+CHUNK = 50000
+
+SCHEMA = """
+CREATE TABLE projects (id {key} NOT NULL PRIMARY KEY, name VARCHAR(100) NOT NULL, created_at DATETIME NOT NULL);
+CREATE TABLE stages (id {key} NOT NULL PRIMARY KEY, name VARCHAR(100) NOT NULL,
+    project_id {key} NOT NULL REFERENCES projects (id) ON DELETE CASCADE, "order" INTEGER NOT NULL);
+CREATE TABLE tasks (id {key} NOT NULL PRIMARY KEY, content TEXT NOT NULL,
+    stage_id {key} NOT NULL REFERENCES stages (id) ON DELETE CASCADE, assignee VARCHAR(100), "order" INTEGER NOT NULL);
+CREATE INDEX ix_stages_project_id ON stages (project_id);
+CREATE INDEX ix_tasks_stage_id ON tasks (stage_id);
+"""
+
+QUERIES = {
+    # Board load: every task of one project
+    'board join': 'SELECT tasks.id, tasks.stage_id, tasks."order" FROM tasks '
+                  'JOIN stages ON tasks.stage_id = stages.id WHERE stages.project_id = ?',
+    # Statistics: per-stage counts for one project
+    'stats group by': 'SELECT stages.id, count(tasks.id) FROM stages LEFT JOIN tasks ON tasks.stage_id = stages.id '
+                      'WHERE stages.project_id = ? GROUP BY stages.id',
+}
+
+
+def build(path, key_type, encode, task_count):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA.format(key=key_type))
+    project_ids = []
+    stage_count = max(1, task_count // TASKS_PER_STAGE)
+    tasks = []
+    for stage_index in range(stage_count):
+        if stage_index % STAGES_PER_PROJECT == 0:
+            project_id = uuid.uuid4()
+            project_ids.append(project_id)
+            conn.execute('INSERT INTO projects VALUES (?, ?, ?)',
+                         (encode(project_id), f'Project {len(project_ids)}', '2024-01-01 00:00:00'))
+        stage_id = uuid.uuid4()
+        conn.execute('INSERT INTO stages VALUES (?, ?, ?, ?)',
+                     (encode(stage_id), f'Stage {stage_index}', encode(project_id), stage_index))
+        for order in range(TASKS_PER_STAGE):
+            tasks.append((encode(uuid.uuid4()), f'Task {order}', encode(stage_id), f'user{order % 25}', order))
+            if len(tasks) >= CHUNK:
+                conn.executemany('INSERT INTO tasks VALUES (?, ?, ?, ?, ?)', tasks)
+                tasks = []
+    if tasks:
+        conn.executemany('INSERT INTO tasks VALUES (?, ?, ?, ?, ?)', tasks)
+    conn.commit()
+    conn.execute('VACUUM')
+    return conn, [encode(project_id) for project_id in project_ids]
+
+
+def index_sizes(conn):
+    # dbstat is optional in SQLite builds; report nothing when it's missing
+    try:
+        rows = conn.execute('SELECT name, sum(pgsize) FROM dbstat GROUP BY name ORDER BY name').fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    return dict(rows)
+
+
+def time_query(conn, sql, project_ids, repeat):
+    samples = []
+    for _ in range(repeat):
+        project_id = random.choice(project_ids)
+        started = time.perf_counter()
+        conn.execute(sql, (project_id,)).fetchall()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=1000000, help='number of tasks to generate')
+    parser.add_argument('--repeat', type=int, default=200, help='query repetitions per measurement')
+    args = parser.parse_args()
+
+    variants = [
+        ('text', 'VARCHAR(36)', str),
+        ('binary', 'BLOB', lambda value: value.bytes),
+    ]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, key_type, encode in variants:
+            path = os.path.join(tmp, f'{name}.db')
+            started = time.perf_counter()
+            conn, project_ids = build(path, key_type, encode, args.tasks)
+            build_seconds = time.perf_counter() - started
+            results[name] = {
+                'size': os.path.getsize(path),
+                'objects': index_sizes(conn),
+                'build': build_seconds,
+                'latency': {label: time_query(conn, sql, project_ids, args.repeat) for label, sql in QUERIES.items()},
+            }
+            conn.close()
+
+    print(f"{args.tasks} tasks, {args.tasks // TASKS_PER_STAGE} stages")
+    print(f"{'':<34} {'text':>12} {'binary':>12} {'ratio':>7}")
+    text, binary = results['text'], results['binary']
+    print(f"{'database size (MiB)':<34} {text['size'] / 2**20:>12.1f} {binary['size'] / 2**20:>12.1f} "
+          f"{text['size'] / binary['size']:>7.2f}")
+    for obj in sorted(set(text['objects']) & set(binary['objects'])):
+        print(f"{obj + ' (MiB)':<34} {text['objects'][obj] / 2**20:>12.1f} {binary['objects'][obj] / 2**20:>12.1f} "
+              f"{text['objects'][obj] / binary['objects'][obj]:>7.2f}")
+    for label in QUERIES:
+        print(f"{label + ' (ms, median)':<34} {text['latency'][label]:>12.2f} {binary['latency'][label]:>12.2f} "
+              f"{text['latency'][label] / binary['latency'][label]:>7.2f}")
+
+
+if __name__ == '__main__':
+    main()
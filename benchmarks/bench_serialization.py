@@ -0,0 +1,100 @@
+"""Benchmark JSON vs. MessagePack encoding of large boards.
+
+Seeds one project of increasing size into a temporary SQLite file, loads its
+board the way GET /api/projects/<id> does and encodes the same to_dict output
+as JSON (the app's JSON provider) and as MessagePack (app.serialization.packb).
+Reports encode and decode time and the payload size, raw and gzipped.
+MessagePack needs the `msgpack` package.
+
+Usage: python benchmarks/bench_serialization.py [--sizes 1000,10000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import zlib
+from datetime import date, datetime, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app, db
+from app.board import load_board, preview_length
+from app.models import Project, Stage, Task, SubTask, generate_uuid
+from app.serialization import msgpack, packb
+from config import Config
+
+SUBTASKS_PER_TASK = 2
+TASKS_PER_STAGE = 100
+
+
+def seed_project(name, task_count):
+    now = datetime.now(timezone.utc)
+    project_id = generate_uuid()
+    db.session.execute(db.insert(Project), [{'id': project_id, 'name': name, 'created_at': now, 'updated_at': now}])
+    stage_rows, task_rows, subtask_rows = [], [], []
+    for i in range(task_count):
+        if i % TASKS_PER_STAGE == 0:
+            stage_id = generate_uuid()
+            stage_rows.append({'id': stage_id, 'name': f'Stage {len(stage_rows)}', 'project_id': project_id,
+                               'order': len(stage_rows), 'created_at': now, 'updated_at': now})
+        task_id = generate_uuid()
+        task_rows.append({'id': task_id, 'content': f'Task {i} ' + 'details ' * 20, 'stage_id': stage_id,
+                          'assignee': f'user{i % 7}', 'start_date': date(2024, 1, 1 + i % 28), 'order': i,
+                          'subtask_count': SUBTASKS_PER_TASK, 'created_at': now, 'updated_at': now})
+        for j in range(SUBTASKS_PER_TASK):
+            subtask_rows.append({'id': generate_uuid(), 'content': f'Subtask {j}', 'parent_task_id': task_id,
+                                 'completed': j == 0, 'order': j, 'created_at': now, 'updated_at': now})
+    db.session.execute(db.insert(Stage), stage_rows)
+    db.session.execute(db.insert(Task), task_rows)
+    db.session.execute(db.insert(SubTask), subtask_rows)
+    db.session.commit()
+    return project_id
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000', help='comma separated task counts')
+    parser.add_argument('--repeat', type=int, default=5, help='encodings per measurement (best is reported)')
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+    if msgpack is None:
+        print("msgpack is not installed; only JSON is measured (pip install msgpack)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+            PURGE_WORKER_ENABLED = False
+
+        app = create_app(BenchConfig)
+        with app.app_context():
+            db.create_all()
+            print(f"{'format':<8} {'tasks':>7} {'encode ms':>10} {'decode ms':>10} {'bytes':>10} {'gzip bytes':>11}")
+            for size in sizes:
+                project_id = seed_project(f'board-{size}', size)
+                db.session.remove()
+                with app.test_request_context(f'/api/projects/{project_id}'):
+                    board = load_board(project_id).to_dict(include_stages=True, preview_length=preview_length())
+                formats = [('json', lambda: app.json.dumps(board).encode(), json.loads)]
+                if msgpack is not None:
+                    formats.append(('msgpack', lambda: packb(board), msgpack.unpackb))
+                for name, encode, decode in formats:
+                    encode_time, payload = best_of(args.repeat, encode)
+                    decode_time, _ = best_of(args.repeat, lambda: decode(payload))
+                    print(f"{name:<8} {size:>7} {encode_time * 1000:>10.2f} {decode_time * 1000:>10.2f} "
+                          f"{len(payload):>10} {len(zlib.compress(payload, 6, wbits=31)):>11}")
+                db.session.remove()
+
+
+if __name__ == '__main__':
+    main()
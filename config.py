@@ -17,4 +17,140 @@ class Config:
 
     SQLALCHEMY_DATABASE_URI = get_database_uri()
 
+    # Seconds to cache /api/projects/<id>/stats and ?with_counts=1 results (0 disables)
+    STATS_CACHE_TTL = int(os.environ.get('STATS_CACHE_TTL', 0))
+
+    # Soft delete: deleted projects/stages can be restored for this many seconds,
+    # after which the background purge worker removes them in batches
+    SOFT_DELETE_RESTORE_WINDOW = int(os.environ.get('SOFT_DELETE_RESTORE_WINDOW', 24 * 60 * 60))
+    PURGE_WORKER_ENABLED = os.environ.get('PURGE_WORKER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    PURGE_INTERVAL = int(os.environ.get('PURGE_INTERVAL', 60)) # Seconds between purge runs
+    PURGE_BATCH_SIZE = int(os.environ.get('PURGE_BATCH_SIZE', 500)) # Tasks (with their subtasks) deleted per transaction
+    PURGE_PAUSE = float(os.environ.get('PURGE_PAUSE', 0.05)) # Seconds to yield the write lock between batches
+
+    # Idempotency-Key support on create endpoints: how long stored responses are
+    # replayed, and when an unfinished first request is considered abandoned
+    IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+    IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', 60))
+    IDEMPOTENCY_EVICT_EVERY = 100 # Delete expired keys on every Nth claim
+
+    # Read replica: GET requests on the API read from READ_DATABASE_URL (the write
+    # bind stays SQLALCHEMY_DATABASE_URI). Reads fall back to the primary when the
+    # replica lags more than REPLICA_MAX_LAG seconds, and for REPLICA_READ_YOUR_WRITES
+    # seconds after a client's own write. For two SQLite files, the primary is copied
+    # to the replica every REPLICA_SYNC_INTERVAL seconds (0 disables; see `flask sync-replica`).
+    READ_DATABASE_URL = os.environ.get('READ_DATABASE_URL')
+    SQLALCHEMY_BINDS = {'replica': READ_DATABASE_URL} if READ_DATABASE_URL else {}
+    REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', 5))
+    REPLICA_READ_YOUR_WRITES = float(os.environ.get('REPLICA_READ_YOUR_WRITES', REPLICA_MAX_LAG))
+    REPLICA_SYNC_INTERVAL = float(os.environ.get('REPLICA_SYNC_INTERVAL', 1))
+
+    # Sharding: comma-separated database URLs; each project tree is stored on the
+    # shard picked by hashing its id (see app/sharding.py and `flask rebalance-shards`)
+    SHARD_DATABASE_URLS = [url for url in os.environ.get('SHARD_DATABASE_URLS', '').split(',') if url]
+
+    # Compression of /api responses: the client's best Accept-Encoding among
+    # COMPRESS_ALGORITHMS (br and zstd need the brotli / zstandard packages);
+    # bodies under COMPRESS_MIN_SIZE bytes are sent uncompressed
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    COMPRESS_ALGORITHMS = [coding for coding in os.environ.get('COMPRESS_ALGORITHMS', 'br,zstd,gzip').split(',') if coding]
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6)) # 1-9
+    COMPRESS_BROTLI_LEVEL = int(os.environ.get('COMPRESS_BROTLI_LEVEL', 4)) # 0-11
+    COMPRESS_ZSTD_LEVEL = int(os.environ.get('COMPRESS_ZSTD_LEVEL', 3)) # 1-22
+
+    # Largest number of boards GET /api/boards returns in one request
+    BOARDS_MAX_IDS = int(os.environ.get('BOARDS_MAX_IDS', 50))
+
+    # Largest number of operations accepted by POST /api/batch
+    BATCH_MAX_OPERATIONS = int(os.environ.get('BATCH_MAX_OPERATIONS', 100))
+
+    # Background jobs: JOBS_WORKERS threads run them (0 = only run_pending_jobs()
+    # runs them), at most JOBS_MAX_QUEUED wait, and finished jobs are kept for
+    # JOBS_RESULT_TTL seconds. Progress is written at most every JOBS_PROGRESS_INTERVAL seconds.
+    JOBS_WORKERS = int(os.environ.get('JOBS_WORKERS', 2))
+    JOBS_MAX_QUEUED = int(os.environ.get('JOBS_MAX_QUEUED', 100))
+    JOBS_RESULT_TTL = int(os.environ.get('JOBS_RESULT_TTL', 7 * 24 * 60 * 60))
+    JOBS_PROGRESS_INTERVAL = float(os.environ.get('JOBS_PROGRESS_INTERVAL', 1.0))
+
+    # Latency percentiles (load shedding, readiness) cover the last METRICS_WINDOW requests
+    # of the last METRICS_MAX_AGE seconds
+    METRICS_WINDOW = int(os.environ.get('METRICS_WINDOW', 1000))
+    METRICS_MAX_AGE = float(os.environ.get('METRICS_MAX_AGE', 60))
+
+    # Admission control for /api (see app/admission.py). Each client (the
+    # ADMISSION_CLIENT_HEADER header, else its address) may make ADMISSION_RATE
+    # requests per second in bursts of ADMISSION_BURST (0 = no limit), with a
+    # separate budget for ADMISSION_EXPENSIVE_ENDPOINTS. At most
+    # ADMISSION_MAX_CONCURRENT requests run at once and ADMISSION_MAX_WAITING wait,
+    # none while p99 latency exceeds ADMISSION_LATENCY_TARGET seconds.
+    # ADMISSION_REDIS_URL shares the buckets between processes (needs redis).
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    ADMISSION_CLIENT_HEADER = os.environ.get('ADMISSION_CLIENT_HEADER') # e.g. X-Client-Id
+    ADMISSION_RATE = float(os.environ.get('ADMISSION_RATE', 20))
+    ADMISSION_BURST = float(os.environ.get('ADMISSION_BURST', 40))
+    ADMISSION_EXPENSIVE_ENDPOINTS = [endpoint for endpoint in os.environ.get(
+        'ADMISSION_EXPENSIVE_ENDPOINTS', 'projects_api.get_project,projects_api.get_boards').split(',') if endpoint]
+    ADMISSION_EXPENSIVE_RATE = float(os.environ.get('ADMISSION_EXPENSIVE_RATE', 2))
+    ADMISSION_EXPENSIVE_BURST = float(os.environ.get('ADMISSION_EXPENSIVE_BURST', 5))
+    ADMISSION_MAX_CONCURRENT = int(os.environ.get('ADMISSION_MAX_CONCURRENT', 16))
+    ADMISSION_MAX_WAITING = int(os.environ.get('ADMISSION_MAX_WAITING', 64))
+    ADMISSION_LATENCY_TARGET = float(os.environ.get('ADMISSION_LATENCY_TARGET', 0.5))
+    ADMISSION_REDIS_URL = os.environ.get('ADMISSION_REDIS_URL')
+
+    # /readyz fails when a database takes longer than READY_DB_LATENCY_MAX seconds
+    # to answer SELECT 1, a SQLite WAL grows past READY_WAL_MAX_BYTES, or the p99
+    # latency of recent /api requests exceeds READY_P99_MAX seconds
+    READY_DB_LATENCY_MAX = float(os.environ.get('READY_DB_LATENCY_MAX', 0.25))
+    READY_WAL_MAX_BYTES = int(os.environ.get('READY_WAL_MAX_BYTES', 64 * 1024 * 1024))
+    READY_P99_MAX = float(os.environ.get('READY_P99_MAX', 2.0))
+
+    # Tracing (see app/tracing.py): TRACING_SAMPLE_RATE of requests without a
+    # traceparent header are traced. TRACING_EXPORTER is 'jsonl' (one OTLP/JSON trace
+    # per line in TRACING_EXPORT_PATH, default instance/traces.jsonl) or 'otlp'
+    # (POSTed to TRACING_OTLP_ENDPOINT)
+    TRACING_ENABLED = os.environ.get('TRACING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    TRACING_SAMPLE_RATE = float(os.environ.get('TRACING_SAMPLE_RATE', 0.1))
+    TRACING_EXPORTER = os.environ.get('TRACING_EXPORTER', 'jsonl')
+    TRACING_EXPORT_PATH = os.environ.get('TRACING_EXPORT_PATH')
+    TRACING_OTLP_ENDPOINT = os.environ.get('TRACING_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces')
+    TRACING_SERVICE_NAME = os.environ.get('TRACING_SERVICE_NAME', 'kanban-backend')
+    TRACING_MAX_STATEMENT_LENGTH = int(os.environ.get('TRACING_MAX_STATEMENT_LENGTH', 2000))
+
+    # Operator endpoints and request profiling need `X-Admin-Token: <ADMIN_TOKEN>`;
+    # unset, they are disabled
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+    # Request profiling (?__profile=cpu|alloc, see app/profiling.py): one request at
+    # a time, at most one every PROFILE_MIN_INTERVAL seconds; the last PROFILE_KEEP
+    # reports are kept, each with its PROFILE_TOP hottest functions / allocating lines
+    PROFILE_MIN_INTERVAL = float(os.environ.get('PROFILE_MIN_INTERVAL', 10))
+    PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 20))
+    PROFILE_TOP = int(os.environ.get('PROFILE_TOP', 30))
+    PROFILE_TRACEMALLOC_FRAMES = int(os.environ.get('PROFILE_TRACEMALLOC_FRAMES', 25))
+
+    # SQL statements slower than SLOW_QUERY_THRESHOLD seconds (negative disables) are
+    # kept, with their query plan, in a ring of the last SLOW_QUERY_LOG_SIZE entries
+    SLOW_QUERY_THRESHOLD = float(os.environ.get('SLOW_QUERY_THRESHOLD', 0.1))
+    SLOW_QUERY_LOG_SIZE = int(os.environ.get('SLOW_QUERY_LOG_SIZE', 200))
+
+    # Activity feed (see app/activity.py). Committed changes wait in a queue of
+    # ACTIVITY_QUEUE_SIZE events that a background writer inserts in batches of up
+    # to ACTIVITY_BATCH_SIZE, at least every ACTIVITY_FLUSH_INTERVAL seconds. When
+    # the queue is full ACTIVITY_OVERFLOW decides: 'drop' the new event, 'drop-oldest',
+    # or 'block' the request for up to ACTIVITY_BLOCK_TIMEOUT seconds, then drop.
+    ACTIVITY_ENABLED = os.environ.get('ACTIVITY_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    ACTIVITY_WRITER_ENABLED = os.environ.get('ACTIVITY_WRITER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    ACTIVITY_QUEUE_SIZE = int(os.environ.get('ACTIVITY_QUEUE_SIZE', 10000))
+    ACTIVITY_BATCH_SIZE = int(os.environ.get('ACTIVITY_BATCH_SIZE', 500))
+    ACTIVITY_FLUSH_INTERVAL = float(os.environ.get('ACTIVITY_FLUSH_INTERVAL', 1.0))
+    ACTIVITY_OVERFLOW = os.environ.get('ACTIVITY_OVERFLOW', 'drop')
+    ACTIVITY_BLOCK_TIMEOUT = float(os.environ.get('ACTIVITY_BLOCK_TIMEOUT', 0.1))
+    ACTIVITY_ACTOR_HEADER = os.environ.get('ACTIVITY_ACTOR_HEADER', 'X-User') # Who made the change
+    ACTIVITY_PAGE_SIZE = int(os.environ.get('ACTIVITY_PAGE_SIZE', 50))
+    ACTIVITY_MAX_PAGE_SIZE = int(os.environ.get('ACTIVITY_MAX_PAGE_SIZE', 200))
+
+    # Board views return this many characters of task/subtask content plus content_length
+    CONTENT_PREVIEW_LENGTH = int(os.environ.get('CONTENT_PREVIEW_LENGTH', 200))
+
 # You can add other configurations like mail, etc.
@@ -97,6 +97,13 @@ def run_migrations_online():
     connectable = get_engine()
 
     with connectable.connect() as connection:
+        if connection.dialect.name == 'sqlite':
+            # The app enables foreign keys on every SQLite connection. Batch
+            # migrations rebuild tables by dropping the old copy, which would
+            # cascade into child tables, so keep enforcement off here.
+            connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
+            connection.commit()
+
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
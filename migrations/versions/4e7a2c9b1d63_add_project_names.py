@@ -0,0 +1,39 @@
+"""Add project_names table for globally unique names across shards
+
+Revision ID: 4e7a2c9b1d63
+Revises: f3b9d4e7a152
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e7a2c9b1d63'
+down_revision = 'f3b9d4e7a152'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('project_names',
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('project_id', sa.LargeBinary(length=16), nullable=False),
+    sa.Column('claimed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    with op.batch_alter_table('project_names', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_project_names_project_id'), ['project_id'], unique=False)
+
+    # Claim the names of the live projects in this database, e.g. before they are
+    # moved out to the shards with `flask rebalance-shards`
+    op.execute('INSERT INTO project_names (name, project_id, claimed_at) '
+               'SELECT name, id, CURRENT_TIMESTAMP FROM projects WHERE deleted_at IS NULL')
+
+
+def downgrade():
+    with op.batch_alter_table('project_names', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_project_names_project_id'))
+
+    op.drop_table('project_names')
@@ -0,0 +1,35 @@
+"""Add subtask progress counters to tasks
+
+Revision ID: 5f828a89d693
+Revises: 64f0107a5ade
+Create Date: 2026-10-19 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f828a89d693'
+down_revision = '64f0107a5ade'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('tasks', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('subtask_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('completed_subtask_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill existing rows from the subtasks table
+    op.execute("""
+        UPDATE tasks SET
+            subtask_count = (SELECT COUNT(*) FROM subtasks WHERE subtasks.parent_task_id = tasks.id),
+            completed_subtask_count = (SELECT COUNT(*) FROM subtasks WHERE subtasks.parent_task_id = tasks.id AND subtasks.completed = TRUE)
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('tasks', schema=None) as batch_op:
+        batch_op.drop_column('completed_subtask_count')
+        batch_op.drop_column('subtask_count')
@@ -0,0 +1,66 @@
+"""Soft delete columns for projects and stages
+
+Revision ID: 7c2e9a1f4b86
+Revises: d81f5b2c6e47
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2e9a1f4b86'
+down_revision = 'd81f5b2c6e47'
+branch_labels = None
+depends_on = None
+
+# Names the unnamed UNIQUE(name) constraint from the initial migration on SQLite
+naming_convention = {
+    "uq": "uq_%(table_name)s_%(column_0_name)s",
+}
+
+
+def _name_constraint():
+    if op.get_bind().dialect.name == 'sqlite':
+        return 'uq_projects_name'
+    return 'projects_name_key'
+
+
+def upgrade():
+    with op.batch_alter_table('projects', schema=None, naming_convention=naming_convention) as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_projects_deleted_at'), ['deleted_at'], unique=False)
+        # Project names only need to be unique among live projects
+        batch_op.drop_constraint(_name_constraint(), type_='unique')
+
+    op.create_index('uq_projects_name_live', 'projects', ['name'], unique=True,
+                    sqlite_where=sa.text('deleted_at IS NULL'), postgresql_where=sa.text('deleted_at IS NULL'))
+
+    with op.batch_alter_table('stages', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_stages_deleted_at'), ['deleted_at'], unique=False)
+
+
+def downgrade():
+    # Soft-deleted rows would be resurrected by dropping the markers; remove them
+    # first. env.py turns foreign keys off on SQLite, so ON DELETE CASCADE doesn't
+    # fire: delete the tasks and subtasks under them explicitly, children first.
+    deleted_stages = ('SELECT id FROM stages WHERE deleted_at IS NOT NULL '
+                      'OR project_id IN (SELECT id FROM projects WHERE deleted_at IS NOT NULL)')
+    deleted_tasks = f'SELECT id FROM tasks WHERE stage_id IN ({deleted_stages})'
+    op.execute(f'DELETE FROM subtasks WHERE parent_task_id IN ({deleted_tasks})')
+    op.execute(f'DELETE FROM tasks WHERE stage_id IN ({deleted_stages})')
+    op.execute(f'DELETE FROM stages WHERE id IN ({deleted_stages})')
+    op.execute('DELETE FROM projects WHERE deleted_at IS NOT NULL')
+
+    with op.batch_alter_table('stages', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_stages_deleted_at'))
+        batch_op.drop_column('deleted_at')
+
+    op.drop_index('uq_projects_name_live', table_name='projects')
+
+    with op.batch_alter_table('projects', schema=None, naming_convention=naming_convention) as batch_op:
+        batch_op.create_unique_constraint(_name_constraint(), ['name'])
+        batch_op.drop_index(batch_op.f('ix_projects_deleted_at'))
+        batch_op.drop_column('deleted_at')
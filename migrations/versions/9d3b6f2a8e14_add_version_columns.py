@@ -0,0 +1,31 @@
+"""Add version columns for optimistic concurrency
+
+Revision ID: 9d3b6f2a8e14
+Revises: e5a8c3f1d290
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3b6f2a8e14'
+down_revision = 'e5a8c3f1d290'
+branch_labels = None
+depends_on = None
+
+TABLES = ['projects', 'stages', 'tasks', 'subtasks']
+
+
+def upgrade():
+    # Existing rows start at version 1, the same as new rows
+    for table in TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('version')
@@ -0,0 +1,38 @@
+"""Index foreign key columns used by the aggregate queries
+
+Revision ID: a3c91e4d7b20
+Revises: 5f828a89d693
+Create Date: 2026-10-19 10:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c91e4d7b20'
+down_revision = '5f828a89d693'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('stages', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_stages_project_id'), ['project_id'], unique=False)
+
+    with op.batch_alter_table('tasks', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_tasks_stage_id'), ['stage_id'], unique=False)
+
+    with op.batch_alter_table('subtasks', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_subtasks_parent_task_id'), ['parent_task_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('subtasks', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_subtasks_parent_task_id'))
+
+    with op.batch_alter_table('tasks', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_tasks_stage_id'))
+
+    with op.batch_alter_table('stages', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_stages_project_id'))
@@ -0,0 +1,101 @@
+"""Store UUID primary and foreign keys as 16-byte binary
+
+Revision ID: b47d0e3a9c15
+Revises: 7c2e9a1f4b86
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b47d0e3a9c15'
+down_revision = '7c2e9a1f4b86'
+branch_labels = None
+depends_on = None
+
+# Key columns per table, parents before children
+KEY_COLUMNS = [
+    ('projects', ['id']),
+    ('stages', ['id', 'project_id']),
+    ('tasks', ['id', 'stage_id']),
+    ('subtasks', ['id', 'parent_task_id']),
+]
+
+# (table, column, referred table) for the cascading foreign keys
+FOREIGN_KEYS = [
+    ('stages', 'project_id', 'projects'),
+    ('tasks', 'stage_id', 'stages'),
+    ('subtasks', 'parent_task_id', 'tasks'),
+]
+
+
+# Same conversion rules as app.models.UUIDBinary: canonical UUID text becomes
+# its 16 raw bytes, anything else (other spellings included) is kept as UTF-8
+# bytes (and back again).
+def _text_to_blob(value):
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+    try:
+        parsed = uuid.UUID(value)
+    except ValueError:
+        return value.encode('utf-8')
+    return parsed.bytes if str(parsed) == value else value.encode('utf-8')
+
+
+def _blob_to_text(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value
+    if len(value) != 16:
+        return bytes(value).decode('utf-8', errors='replace')
+    return str(uuid.UUID(bytes=bytes(value)))
+
+
+def _sqlite_convert(column_type, function_name, function):
+    # Register the converter on the migration connection so the data is
+    # rewritten in place with one UPDATE per table, on any SQLite version.
+    # The values are converted before the column types change: the batch
+    # table rebuild CASTs to the new type, which is a no-op once the stored
+    # values already have that type.
+    op.get_bind().connection.driver_connection.create_function(function_name, 1, function, deterministic=True)
+    for table, columns in KEY_COLUMNS:
+        assignments = ', '.join(f'{column} = {function_name}({column})' for column in columns)
+        op.execute(f'UPDATE {table} SET {assignments}')
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for column in columns:
+                batch_op.alter_column(column, type_=column_type, existing_nullable=False)
+
+
+def _postgresql_convert(column_type, using):
+    for table, column, referred in FOREIGN_KEYS:
+        op.drop_constraint(f'{table}_{column}_fkey', table, type_='foreignkey')
+    for table, columns in KEY_COLUMNS:
+        for column in columns:
+            op.alter_column(table, column, type_=column_type, existing_nullable=False,
+                            postgresql_using=using.format(column=column))
+    for table, column, referred in FOREIGN_KEYS:
+        op.create_foreign_key(f'{table}_{column}_fkey', table, referred, [column], ['id'], ondelete='CASCADE')
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        _postgresql_convert(sa.LargeBinary(length=16), "decode(replace({column}, '-', ''), 'hex')")
+    else:
+        _sqlite_convert(sa.LargeBinary(length=16), 'uuid_text_to_blob', _text_to_blob)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        _postgresql_convert(
+            sa.String(length=36),
+            "regexp_replace(encode({column}, 'hex'), '(.{{8}})(.{{4}})(.{{4}})(.{{4}})(.{{12}})', '\\1-\\2-\\3-\\4-\\5')"
+        )
+    else:
+        _sqlite_convert(sa.String(length=36), 'uuid_blob_to_text', _blob_to_text)
@@ -0,0 +1,60 @@
+"""Add ON DELETE CASCADE to the project tree foreign keys
+
+Revision ID: d81f5b2c6e47
+Revises: a3c91e4d7b20
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81f5b2c6e47'
+down_revision = 'a3c91e4d7b20'
+branch_labels = None
+depends_on = None
+
+# (table, column, referred table)
+FOREIGN_KEYS = [
+    ('stages', 'project_id', 'projects'),
+    ('tasks', 'stage_id', 'stages'),
+    ('subtasks', 'parent_task_id', 'tasks'),
+]
+
+# The initial migration created unnamed foreign keys. On SQLite the batch
+# (copy-and-move) mode names them through this convention so they can be
+# replaced; PostgreSQL uses its own default "<table>_<column>_fkey" names.
+naming_convention = {
+    "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
+}
+
+
+def _fk_name(table, column, referred):
+    if op.get_bind().dialect.name == 'sqlite':
+        return f'fk_{table}_{column}_{referred}'
+    return f'{table}_{column}_fkey'
+
+
+def _replace_foreign_keys(ondelete):
+    is_sqlite = op.get_bind().dialect.name == 'sqlite'
+    if is_sqlite:
+        # Rebuilding the tables drops the old copies; keep SQLite from
+        # enforcing (or cascading) foreign keys while that happens.
+        op.execute('PRAGMA foreign_keys=OFF')
+    for table, column, referred in FOREIGN_KEYS:
+        with op.batch_alter_table(table, schema=None, naming_convention=naming_convention) as batch_op:
+            batch_op.drop_constraint(_fk_name(table, column, referred), type_='foreignkey')
+            batch_op.create_foreign_key(
+                _fk_name(table, column, referred), referred, [column], ['id'], ondelete=ondelete
+            )
+    if is_sqlite:
+        op.execute('PRAGMA foreign_keys=ON')
+
+
+def upgrade():
+    _replace_foreign_keys('CASCADE')
+
+
+def downgrade():
+    _replace_foreign_keys(None)
@@ -0,0 +1,39 @@
+"""Add activity_events table for the project activity feed
+
+Revision ID: f3b9d4e7a152
+Revises: c6e1f07b2a93
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b9d4e7a152'
+down_revision = 'c6e1f07b2a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('activity_events',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('project_id', sa.LargeBinary(length=16), nullable=False),
+    sa.Column('action', sa.String(length=50), nullable=False),
+    sa.Column('entity_type', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.LargeBinary(length=16), nullable=False),
+    sa.Column('actor', sa.String(length=255), nullable=True),
+    sa.Column('details', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('activity_events', schema=None) as batch_op:
+        batch_op.create_index('ix_activity_events_project_id_created_at', ['project_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('activity_events', schema=None) as batch_op:
+        batch_op.drop_index('ix_activity_events_project_id_created_at')
+
+    op.drop_table('activity_events')
@@ -1,4 +1,5 @@
 import pytest
+from sqlalchemy import event
 from app import create_app, db
 from config import Config
 import os
@@ -9,6 +10,9 @@ class TestConfig(Config):
     # Or, to use a file:
     # SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(__file__)), 'test_app.db')
     WTF_CSRF_ENABLED = False # Disable CSRF for testing forms if you have them (not relevant here but good practice)
+    PURGE_WORKER_ENABLED = False # Tests call purge_deleted() directly
+    JOBS_WORKERS = 0 # Jobs stay queued until a test calls run_pending_jobs()
+    ACTIVITY_WRITER_ENABLED = False # Tests write queued activity with flush()
 
 @pytest.fixture(scope='session')
 def app():
@@ -23,13 +27,24 @@ def app():
         db.create_all() # Create tables for the in-memory database
         yield app # Provide the app object to tests
         db.session.remove() # Clean up session
-        db.drop_all() # Drop all tables after tests are done
+        db.drop_all(bind_key=None) # Drop all tables after tests are done (the default bind is the only one here)
         # Optional: if using a file-based test DB, remove it after session
         # if TestConfig.SQLALCHEMY_DATABASE_URI.startswith('sqlite:///'):
         #     if os.path.exists(db_path):
         #         os.remove(db_path)
 
 
+@pytest.fixture(autouse=True)
+def clean_tables(app):
+    # The in-memory database lives for the whole session; empty it after each test
+    # so fixtures that create fixed project names don't collide across tests.
+    yield
+    db.session.rollback()
+    for table in reversed(db.metadata.sorted_tables):
+        db.session.execute(table.delete())
+    db.session.commit()
+    db.session.remove()
+
 @pytest.fixture()
 def client(app):
     return app.test_client()
@@ -38,6 +53,16 @@ def client(app):
 def runner(app):
     return app.test_cli_runner()
 
+# Records the SQL statements sent to the database while the fixture is active
+@pytest.fixture()
+def sql_statements(app):
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(db.engine, 'before_cursor_execute', record)
+
 # Fixture to provide a clean database for each test function (if needed, otherwise use app context above)
 # @pytest.fixture(scope='function')
 # def init_database(app):
@@ -0,0 +1,96 @@
+import pytest
+from app import create_app, db
+from app.activity import ActivityWriter
+from app.models import ActivityEvent
+from tests.conftest import TestConfig
+
+@pytest.fixture()
+def activity(app):
+    log = app.extensions['activity']
+    log.flush() # Events queued by earlier tests
+    return log
+
+def test_mutations_are_recorded_after_commit(client, activity, sql_statements):
+    user = {'X-User': 'ana'}
+    project_id = client.post('/api/projects', json={'name': 'Audited'}, headers=user).json['id']
+    todo = client.post(f'/api/projects/{project_id}/stages', json={'name': 'To Do'}, headers=user).json['id']
+    done = client.post(f'/api/projects/{project_id}/stages', json={'name': 'Done'}).json['id']
+    task_id = client.post(f'/api/stages/{todo}/tasks', json={'content': 'Ship it'}, headers=user).json['id']
+    subtask_id = client.post(f'/api/tasks/{task_id}/subtasks', json={'content': 'Test'}).json['id']
+    sql_statements.clear()
+    client.patch(f'/api/subtasks/{subtask_id}', json={'completed': True}, headers=user)
+    assert len(sql_statements) == 2 # Recording adds nothing to the request's SQL
+    client.patch(f'/api/tasks/{task_id}', json={'stage_id': done}, headers=user)
+    client.delete(f'/api/stages/{todo}')
+    assert ActivityEvent.query.count() == 0 # Nothing is written until the writer runs
+
+    assert activity.flush() == 8
+    events = client.get(f'/api/projects/{project_id}/activity').json['events']
+    assert [e['action'] for e in events] == [
+        'stage.deleted', 'task.moved', 'subtask.completed', 'subtask.created',
+        'task.created', 'stage.created', 'stage.created', 'project.created']
+    moved = events[1]
+    assert (moved['entity_type'], moved['entity_id'], moved['actor']) == ('task', task_id, 'ana')
+    assert moved['details'] == {'stage_id': done, 'fields': ['stage_id']}
+    assert events[0]['actor'] is None
+    assert events[-1]['details'] == {'name': 'Audited'}
+
+def test_rolled_back_changes_are_not_recorded(client, activity):
+    project_id = client.post('/api/projects', json={'name': 'Batch'}).json['id']
+    response = client.post('/api/batch', json={'operations': [
+        {'method': 'POST', 'path': f'/api/projects/{project_id}/stages', 'body': {'name': 'Kept?'}},
+        {'method': 'DELETE', 'path': '/api/tasks/non-existent-id'},
+    ]})
+    assert response.status_code == 404
+    client.post('/api/batch', json={'operations': [
+        {'method': 'PUT', 'path': f'/api/projects/{project_id}', 'body': {'description': 'Batched'}},
+    ]}, headers={'X-User': 'sam'})
+    activity.flush()
+    events = client.get(f'/api/projects/{project_id}/activity').json['events']
+    assert [(e['action'], e['actor'], e['details']) for e in events] == [
+        ('project.updated', 'sam', {'fields': ['description']}), ('project.created', None, {'name': 'Batch'})]
+
+def test_activity_pages(client, activity):
+    project_id = client.post('/api/projects', json={'name': 'Busy'}).json['id']
+    for name in ('v1', 'v2', 'v3', 'v4'):
+        client.put(f'/api/projects/{project_id}', json={'description': name})
+    activity.flush()
+    first = client.get(f'/api/projects/{project_id}/activity?limit=2').json
+    assert len(first['events']) == 2 and first['next_before'] == first['events'][-1]['id']
+    second = client.get(f"/api/projects/{project_id}/activity?limit=2&before={first['next_before']}").json
+    last = client.get(f"/api/projects/{project_id}/activity?limit=2&before={second['next_before']}").json
+    ids = [e['id'] for page in (first, second, last) for e in page['events']]
+    assert len(ids) == len(set(ids)) == 5
+    assert last['next_before'] is None and last['events'][0]['action'] == 'project.created'
+    assert client.get(f'/api/projects/{project_id}/activity?limit=x').status_code == 400
+    assert client.get('/api/projects/non-existent-id/activity').status_code == 404
+
+def test_overflow_policies_and_writer_flushes_on_stop(tmp_path):
+    class ActivityConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'activity.db')
+        ACTIVITY_QUEUE_SIZE = 2
+        ADMIN_TOKEN = 'secret'
+    activity_app = create_app(ActivityConfig)
+    with activity_app.app_context():
+        db.create_all(bind_key=None)
+        client = activity_app.test_client()
+        project_id = client.post('/api/projects', json={'name': 'Small queue'}).json['id']
+        for name in ('a', 'b'):
+            client.put(f'/api/projects/{project_id}', json={'description': name})
+        log = activity_app.extensions['activity']
+        status = client.get('/api/admin/activity', headers={'X-Admin-Token': 'secret'}).json
+        assert (status['queued'], status['dropped'], status['writer_running']) == (2, 1, False)
+        assert [e['action'] for e in list(log.queue.queue)] == ['project.created', 'project.updated'] # The newest was dropped
+
+        log.overflow = 'drop-oldest'
+        client.delete(f'/api/projects/{project_id}')
+        assert [e['action'] for e in list(log.queue.queue)] == ['project.updated', 'project.deleted']
+
+        writer = ActivityWriter(log)
+        writer.start()
+        writer.stop()
+        assert [a for (a,) in db.session.query(ActivityEvent.action).order_by(ActivityEvent.id)] == [
+            'project.updated', 'project.deleted']
+        assert log.snapshot()['written'] == 2 and log.snapshot()['dropped'] == 2
+        db.session.remove()
+        db.engine.dispose()
@@ -0,0 +1,77 @@
+import threading
+import pytest
+from app import create_app, db
+from app.admission import ConcurrencyLimit, MemoryBuckets
+from tests.conftest import TestConfig
+
+class AdmissionConfig(TestConfig):
+    ADMISSION_ENABLED = True
+    ADMISSION_CLIENT_HEADER = 'X-Client-Id'
+    ADMISSION_RATE = 1
+    ADMISSION_BURST = 3
+    ADMISSION_EXPENSIVE_RATE = 1
+    ADMISSION_EXPENSIVE_BURST = 1
+
+@pytest.fixture()
+def admission_app(tmp_path):
+    class Config(AdmissionConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'admission.db')
+    admission_app = create_app(Config)
+    with admission_app.app_context():
+        db.create_all(bind_key=None)
+        yield admission_app
+        db.session.remove()
+        db.engine.dispose()
+
+def test_token_bucket_refills_over_time(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('app.admission.time.monotonic', lambda: now[0])
+    buckets = MemoryBuckets(max_clients=2)
+    assert [buckets.take('a', 2, 2)[0] for _ in range(3)] == [True, True, False]
+    assert buckets.take('a', 2, 2) == (False, 0.5)
+    now[0] += 0.5
+    assert buckets.take('a', 2, 2) == (True, 0.0)
+    buckets.take('b', 2, 2)
+    buckets.take('c', 2, 2) # Evicts 'a', the least recently seen client
+    assert buckets.take('a', 2, 2) == (True, 0.0)
+
+def test_rate_limits_per_client_with_separate_expensive_budget(admission_app):
+    client = admission_app.test_client()
+    alice = {'X-Client-Id': 'alice'}
+    project_id = client.post('/api/projects', json={'name': 'Busy'}, headers=alice).json['id']
+    assert client.get('/api/projects', headers=alice).status_code == 200
+    assert client.get(f'/api/projects/{project_id}', headers=alice).status_code == 200 # Expensive budget
+    assert client.get('/api/projects', headers=alice).status_code == 200
+
+    limited = client.get('/api/projects', headers=alice)
+    assert (limited.status_code, limited.headers['Retry-After']) == (429, '1')
+    assert client.get(f'/api/projects/{project_id}', headers=alice).status_code == 429
+    assert client.get('/api/projects', headers={'X-Client-Id': 'bob'}).status_code == 200
+    assert client.get('/hello').status_code == 200 # Only /api is limited
+
+def test_sheds_load_when_full_or_slow(admission_app):
+    client = admission_app.test_client()
+    limit = admission_app.extensions['admission_limit']
+    admission_app.extensions['admission_limit'] = ConcurrencyLimit(1, 0)
+    admission_app.extensions['admission_limit'].acquire(0) # Someone else holds the only slot
+    response = client.get('/api/projects', headers={'X-Client-Id': 'carol'})
+    assert (response.status_code, response.headers['Retry-After']) == (503, '1')
+
+    admission_app.extensions['admission_limit'] = limit
+    latency = admission_app.extensions['latency']
+    for _ in range(10):
+        latency.record(admission_app.config['ADMISSION_LATENCY_TARGET'] * 2)
+    assert client.get('/api/projects', headers={'X-Client-Id': 'dave'}).status_code == 200 # Free slots still serve
+
+def test_waiters_are_bounded():
+    limit = ConcurrencyLimit(1, 1)
+    assert limit.acquire(0)
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(limit.acquire(5)))
+    waiter.start()
+    while limit.waiting == 0:
+        pass
+    assert not limit.acquire(5) # The wait queue is full
+    limit.release()
+    waiter.join()
+    assert results == [True]
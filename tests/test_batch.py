@@ -0,0 +1,80 @@
+import pytest
+from sqlalchemy import event
+from app.models import Project, Task, SubTask, db
+
+@pytest.fixture
+def stage(client):
+    project_id = client.post('/api/projects', json={'name': 'Batch Project'}).json['id']
+    return client.post(f'/api/projects/{project_id}/stages', json={'name': 'Todo'}).json
+
+@pytest.fixture
+def commits(app):
+    count = []
+    def record(conn):
+        count.append(1)
+    event.listen(db.engine, 'commit', record)
+    yield count
+    event.remove(db.engine, 'commit', record)
+
+def test_batch_creates_with_references_in_one_commit(client, stage, commits):
+    response = client.post('/api/batch', json={'operations': [
+        {'method': 'POST', 'path': f"/api/stages/{stage['id']}/tasks", 'body': {'content': 'Write docs'}, 'ref': 'task'},
+        {'method': 'POST', 'path': '/api/tasks/${task.id}/subtasks', 'body': {'content': 'Outline'}, 'ref': 'first'},
+        {'method': 'POST', 'path': '/api/tasks/${task.id}/subtasks', 'body': {'content': 'Draft'}},
+        {'method': 'PUT', 'path': '/api/subtasks/${first.id}', 'body': {'completed': True}},
+        {'method': 'GET', 'path': '/api/tasks/${0.id}'},
+    ]})
+    assert response.status_code == 200
+    results = response.json['results']
+    assert [result['status'] for result in results] == [201, 201, 201, 200, 200]
+    assert results[2]['body']['order'] == 1
+    task = results[4]['body']
+    assert (task['subtask_count'], task['completed_subtask_count']) == (2, 1)
+    assert len(commits) == 1
+    assert SubTask.query.filter_by(parent_task_id=results[0]['body']['id']).count() == 2
+
+def test_failed_operation_rolls_back_the_batch(client, stage):
+    response = client.post('/api/batch', json={'operations': [
+        {'method': 'POST', 'path': f"/api/stages/{stage['id']}/tasks", 'body': {'content': 'Kept?'}, 'ref': 'task'},
+        {'method': 'POST', 'path': '/api/tasks/${task.id}/subtasks', 'body': {}},
+    ]})
+    assert response.status_code == 400
+    assert response.json['failed_operation'] == 1
+    assert response.json['results'][1]['body']['error']
+    assert Task.query.count() == 0
+
+def test_no_op_toggle_keeps_earlier_operations(client, stage):
+    task = client.post(f"/api/stages/{stage['id']}/tasks", json={'content': 'Task'}).json
+    subtask = client.post(f"/api/tasks/{task['id']}/subtasks", json={'content': 'Already open'}).json
+    response = client.post('/api/batch', json={'operations': [
+        {'method': 'POST', 'path': '/api/projects', 'body': {'name': 'First'}},
+        {'method': 'PATCH', 'path': f"/api/subtasks/{subtask['id']}", 'body': {'completed': False}},
+    ]})
+    assert response.status_code == 200
+    assert [result['status'] for result in response.json['results']] == [201, 200]
+    assert Project.query.filter_by(name='First').count() == 1
+
+def test_handler_rollback_only_undoes_its_operation(app, client):
+    activity = app.extensions['activity']
+    activity.flush() # Events queued by earlier tests
+    key = {'Idempotency-Key': 'batch-key'}
+    assert client.post('/api/projects', json={'name': 'Second'}, headers=key).status_code == 201
+    response = client.post('/api/batch', json={'operations': [
+        {'method': 'POST', 'path': '/api/projects', 'body': {'name': 'First'}},
+        # The key's claim fails on the duplicate insert and rolls back; the stored response is replayed
+        {'method': 'POST', 'path': '/api/projects', 'body': {'name': 'Second'}, 'headers': key},
+        {'method': 'POST', 'path': '/api/projects', 'body': {'name': 'Third'}},
+    ]})
+    assert response.status_code == 200
+    assert [result['status'] for result in response.json['results']] == [201, 201, 201]
+    assert sorted(project.name for project in Project.query) == ['First', 'Second', 'Third']
+    assert activity.flush() == 3 # project.created for Second, then First and Third from the batch
+
+def test_batch_validation(client, stage):
+    assert client.post('/api/batch', json={'operations': []}).status_code == 400
+    unknown = client.post('/api/batch', json={'operations': [{'method': 'GET', 'path': '/api/tasks/${nope.id}'}]})
+    assert unknown.status_code == 400
+    assert 'nope' in unknown.json['error']
+    nested = client.post('/api/batch', json={'operations': [{'method': 'POST', 'path': '/api/batch', 'body': {}}]})
+    assert nested.status_code == 404
+    assert Project.query.count() == 1
@@ -0,0 +1,45 @@
+import gzip
+import json
+from flask import Response
+from app.compression import compress_response, negotiate
+
+def create_big_project(client):
+    project_id = client.post('/api/projects', json={'name': 'Big board'}).json['id']
+    stage_id = client.post(f'/api/projects/{project_id}/stages', json={'name': 'Todo'}).json['id']
+    for index in range(20):
+        client.post(f'/api/stages/{stage_id}/tasks', json={'content': f'Task {index}', 'assignee': 'someone'})
+    return project_id
+
+def test_large_board_is_gzipped(client):
+    project_id = create_big_project(client)
+    plain = client.get(f'/api/projects/{project_id}')
+    response = client.get(f'/api/projects/{project_id}', headers={'Accept-Encoding': 'gzip, deflate'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert response.headers['ETag'] == 'W/' + plain.headers['ETag']
+    assert len(response.data) < len(plain.data) / 4 # Streamed: no Content-Length
+    assert json.loads(gzip.decompress(response.data)) == plain.json
+
+def test_small_and_unaccepted_responses_are_not_compressed(client):
+    project_id = create_big_project(client)
+    small = client.get('/api/tasks/missing', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in small.headers
+    refused = client.get(f'/api/projects/{project_id}', headers={'Accept-Encoding': 'gzip;q=0, identity'})
+    assert 'Content-Encoding' not in refused.headers
+    assert refused.json['name'] == 'Big board'
+
+def test_negotiation_prefers_highest_quality(app):
+    with app.app_context():
+        assert negotiate('br;q=0.5, gzip', ['br', 'gzip']) == 'gzip'
+        assert negotiate('*', ['gzip']) == 'gzip'
+        assert negotiate('deflate', ['gzip']) is None
+        assert negotiate('', ['gzip']) is None
+
+def test_streamed_responses_are_compressed_per_chunk(app):
+    chunks = [b'[', b'{"a": 1}', b',', b'{"a": 2}', b']']
+    with app.test_request_context('/api/projects', headers={'Accept-Encoding': 'gzip'}):
+        response = compress_response(Response(iter(chunks), mimetype='application/json'))
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Content-Length' not in response.headers
+        body = b''.join(response.response)
+    assert gzip.decompress(body) == b''.join(chunks)
@@ -0,0 +1,59 @@
+import time
+from app import create_app, db, metrics
+from tests.conftest import TestConfig
+
+def test_healthz(client):
+    assert client.get('/healthz').json == {'status': 'ok'}
+
+def test_readyz_reports_database_and_latency(client):
+    client.get('/api/projects')
+    response = client.get('/readyz')
+    assert response.status_code == 200
+    assert response.json['status'] == 'ready'
+    primary = response.json['checks']['databases']['primary']
+    assert primary['latency_ms'] >= 0
+    assert primary['pool']['class']
+    assert {'journal_mode', 'wal_bytes', 'page_count', 'cache_size'} <= set(primary['sqlite'])
+    assert response.json['checks']['requests']['samples'] >= 1
+
+def test_readyz_fails_past_thresholds(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, 'READY_P99_MAX', 0.5)
+    latency = app.extensions['latency']
+    monkeypatch.setattr(latency, 'percentile', lambda fraction: 0.75)
+    response = client.get('/readyz')
+    assert (response.status_code, response.json['status']) == (503, 'unavailable')
+    assert response.json['failures'] == ['p99 latency 750.0 ms']
+
+def test_readyz_recovers_once_slow_requests_age_out(app, client, monkeypatch):
+    latency = app.extensions['latency']
+    now = time.monotonic()
+    monkeypatch.setattr(metrics.time, 'monotonic', lambda: now)
+    for _ in range(10):
+        latency.record(app.config['READY_P99_MAX'] * 2)
+    assert client.get('/readyz').status_code == 503
+    # Drained: no new requests arrive, the slow ones expire
+    now += app.config['METRICS_MAX_AGE'] + 1
+    response = client.get('/readyz')
+    assert response.status_code == 200
+    assert response.json['checks']['requests'] == {'samples': 0, 'p99_ms': None}
+
+def test_readyz_reports_wal_and_pool_of_file_database(tmp_path):
+    class FileConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'ready.db')
+        READY_WAL_MAX_BYTES = 0
+    file_app = create_app(FileConfig)
+    with file_app.app_context():
+        db.create_all(bind_key=None)
+        with db.engine.connect() as conn:
+            conn.exec_driver_sql('PRAGMA journal_mode=WAL')
+        client = file_app.test_client()
+        client.post('/api/projects', json={'name': 'Writes to the WAL'})
+        response = client.get('/readyz')
+        primary = response.json['checks']['databases']['primary']
+        assert primary['sqlite']['journal_mode'] == 'wal'
+        assert primary['sqlite']['wal_bytes'] > 0
+        assert {'checkedin', 'checkedout', 'overflow'} <= set(primary['pool'])
+        assert response.status_code == 503
+        assert response.json['failures'] == [f"primary: WAL is {primary['sqlite']['wal_bytes']} bytes"]
+        db.session.remove()
+        db.engine.dispose()
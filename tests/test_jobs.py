@@ -0,0 +1,109 @@
+import threading
+import time
+from datetime import timedelta
+from sqlalchemy import update
+from app import create_app
+from app.jobs import JOB_TYPES, run_pending_jobs
+from app.models import Job, Project, db
+from app.purge import utcnow
+from tests.conftest import TestConfig
+
+def test_job_lifecycle(client, app):
+    project_id = client.post('/api/projects', json={'name': 'Doomed'}).json['id']
+    client.delete(f'/api/projects/{project_id}')
+    db.session.execute(update(Project).values(deleted_at=utcnow() - timedelta(days=2)))
+    db.session.commit()
+
+    response = client.post('/api/jobs', json={'type': 'purge-deleted'})
+    assert response.status_code == 202
+    job_url = response.headers['Location']
+    assert job_url == f"/api/jobs/{response.json['id']}"
+    assert client.get(job_url).json['status'] == 'queued'
+
+    assert run_pending_jobs(app) == 1
+    job = client.get(job_url).json
+    assert job['status'] == 'succeeded'
+    assert job['result']['projects'] == 1
+    assert job['finished_at'].endswith('Z')
+    assert client.post(f'{job_url}/cancel').status_code == 409
+
+def test_cancel_queued_and_running_jobs(client, app, monkeypatch):
+    queued = client.post('/api/jobs', json={'type': 'recount-subtasks'}).json
+    response = client.post(f"/api/jobs/{queued['id']}/cancel")
+    assert (response.status_code, response.json['status']) == (200, 'cancelled')
+
+    def cancelled_while_running(context):
+        # What POST /api/jobs/<id>/cancel does while the job runs
+        db.session.execute(update(Job).where(Job.id == context.job_id).values(cancel_requested=True))
+        db.session.commit()
+        context.progress(force=True, step=1)
+        return 'not reached'
+    monkeypatch.setitem(JOB_TYPES, 'stoppable', cancelled_while_running)
+    running = client.post('/api/jobs', json={'type': 'stoppable'}).json
+    assert run_pending_jobs(app) == 1 # The cancelled job is not run
+    job = client.get(f"/api/jobs/{running['id']}").json
+    assert (job['status'], job['progress'], job['result']) == ('cancelled', {'step': 1}, None)
+
+def test_failed_job_and_validation(client, app, monkeypatch):
+    def broken(context, **params):
+        raise ValueError(f"bad params {params}")
+    monkeypatch.setitem(JOB_TYPES, 'broken', broken)
+    job_id = client.post('/api/jobs', json={'type': 'broken', 'params': {'x': 1}}).json['id']
+    run_pending_jobs(app)
+    job = client.get(f'/api/jobs/{job_id}').json
+    assert (job['status'], job['error']) == ('failed', "bad params {'x': 1}")
+    assert client.post('/api/jobs', json={'type': 'nope'}).status_code == 400
+    assert client.get('/api/jobs/missing').status_code == 404
+
+def test_queue_limit_and_retention(client, app, monkeypatch):
+    executor = app.extensions['job_executor']
+    monkeypatch.setattr(executor, '_slots', threading.BoundedSemaphore(1))
+    first = client.post('/api/jobs', json={'type': 'recount-subtasks'})
+    assert first.status_code == 202
+    full = client.post('/api/jobs', json={'type': 'recount-subtasks'})
+    assert (full.status_code, full.headers['Retry-After']) == (503, '5')
+
+    executor.release()
+    run_pending_jobs(app)
+    db.session.execute(update(Job).values(finished_at=utcnow() - timedelta(seconds=app.config['JOBS_RESULT_TTL'] + 1)))
+    db.session.commit()
+    client.post('/api/jobs', json={'type': 'recount-subtasks'}) # Enqueueing also drops expired jobs
+    assert client.get(f"/api/jobs/{first.json['id']}").status_code == 404
+
+def test_jobs_run_on_the_thread_pool(tmp_path):
+    class PoolConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'jobs.db')
+        JOBS_WORKERS = 1
+    pool_app = create_app(PoolConfig)
+    with pool_app.app_context():
+        db.create_all(bind_key=None)
+        client = pool_app.test_client()
+        job_url = client.post('/api/jobs', json={'type': 'recount-subtasks'}).headers['Location']
+        deadline = time.monotonic() + 5
+        while client.get(job_url).json['status'] != 'succeeded' and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert client.get(job_url).json['result'] == {'tasks_updated': 0}
+        db.session.remove()
+        db.engine.dispose()
+
+def test_queued_jobs_resume_after_a_restart(tmp_path):
+    class StoppedConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'jobs.db')
+    class RestartedConfig(StoppedConfig):
+        JOBS_WORKERS = 2
+    stopped_app = create_app(StoppedConfig) # JOBS_WORKERS = 0: the job is only queued
+    with stopped_app.app_context():
+        db.create_all(bind_key=None)
+        job_url = stopped_app.test_client().post('/api/jobs', json={'type': 'recount-subtasks'}).headers['Location']
+        db.session.remove()
+        db.engine.dispose()
+
+    restarted_app = create_app(RestartedConfig)
+    with restarted_app.app_context():
+        client = restarted_app.test_client()
+        deadline = time.monotonic() + 5
+        while client.get(job_url).json['status'] != 'succeeded' and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert client.get(job_url).json['result'] == {'tasks_updated': 0}
+        db.session.remove()
+        db.engine.dispose()
@@ -0,0 +1,75 @@
+import pytest
+from app import create_app, db
+from app.profiling import collapsed_stacks
+from tests.conftest import TestConfig
+
+ADMIN = {'X-Admin-Token': 'secret'}
+
+@pytest.fixture()
+def admin_app(tmp_path):
+    class AdminConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'admin.db')
+        ADMIN_TOKEN = 'secret'
+        PROFILE_MIN_INTERVAL = 0
+    admin_app = create_app(AdminConfig)
+    with admin_app.app_context():
+        db.create_all(bind_key=None)
+        yield admin_app
+        db.session.remove()
+        db.engine.dispose()
+
+def test_cpu_profile_of_a_board_fetch(admin_app):
+    client = admin_app.test_client()
+    project_id = client.post('/api/projects', json={'name': 'Profiled'}).json['id']
+    response = client.get(f'/api/projects/{project_id}?__profile=cpu', headers=ADMIN)
+    assert response.status_code == 200
+    assert response.json['name'] == 'Profiled'
+    response.close() # The streamed board is profiled until the server closes it
+    profile_id = response.headers['X-Profile-Id']
+
+    report = client.get(f'/api/admin/profiles/{profile_id}', headers=ADMIN).json
+    assert (report['kind'], report['endpoint'], report['status']) == ('cpu', 'projects_api.get_project', 200)
+    assert any('_board_chunks' in entry['function'] for entry in report['cpu']['top']) # Includes the streamed body
+    collapsed = client.get(f'/api/admin/profiles/{profile_id}?format=collapsed', headers=ADMIN)
+    assert collapsed.mimetype == 'text/plain'
+    stack, micros = collapsed.text.splitlines()[0].rsplit(' ', 1)
+    assert stack and int(micros) >= 1
+    assert [p['id'] for p in client.get('/api/admin/profiles', headers=ADMIN).json] == [profile_id]
+
+def test_alloc_profile_via_header(admin_app):
+    client = admin_app.test_client()
+    response = client.post('/api/projects', json={'name': 'Allocating'}, headers={**ADMIN, 'X-Profile': 'alloc'})
+    assert response.status_code == 201
+    report = client.get(f"/api/admin/profiles/{response.headers['X-Profile-Id']}", headers=ADMIN).json
+    assert report['alloc']['peak_bytes'] > 0
+    assert report['alloc']['top'][0]['bytes'] > 0
+
+def test_profiling_is_gated_and_rate_limited(admin_app, monkeypatch):
+    client = admin_app.test_client()
+    assert client.get('/api/projects?__profile=cpu').status_code == 403
+    assert client.get('/api/projects?__profile=wall', headers=ADMIN).status_code == 400
+    assert client.get('/api/admin/profiles').status_code == 403
+
+    monkeypatch.setattr(admin_app.extensions['profiles'], 'min_interval', 60)
+    assert client.get('/api/projects?__profile=cpu', headers=ADMIN).status_code == 200
+    limited = client.get('/api/projects?__profile=cpu', headers=ADMIN)
+    assert limited.status_code == 429 and int(limited.headers['Retry-After']) > 0
+    assert client.get('/api/projects', headers=ADMIN).status_code == 200 # Unprofiled requests are unaffected
+
+def test_admin_endpoints_disabled_without_token(client):
+    assert client.get('/api/admin/profiles').status_code == 404
+    assert 'X-Profile-Id' not in client.get('/api/projects?__profile=cpu').headers
+
+def test_collapsed_stacks_split_time_between_callers():
+    # func -> (primitive calls, calls, own time, cumulative time, callers)
+    root, a, b, leaf = ('app.py', 1, 'root'), ('app.py', 2, 'a'), ('app.py', 3, 'b'), ('app.py', 4, 'leaf')
+    stats = {
+        root: (1, 1, 0.0, 0.004, {}),
+        a: (1, 1, 0.0, 0.001, {root: (1, 1, 0.0, 0.001)}),
+        b: (1, 1, 0.0, 0.003, {root: (1, 1, 0.0, 0.003)}),
+        leaf: (2, 2, 0.004, 0.004, {a: (1, 1, 0.001, 0.001), b: (1, 1, 0.003, 0.003)}),
+    }
+    assert collapsed_stacks(stats) == (
+        'root (app.py:1);a (app.py:2);leaf (app.py:4) 1000\n'
+        'root (app.py:1);b (app.py:3);leaf (app.py:4) 3000'
+    )
@@ -1,6 +1,12 @@
 import json
+import threading
 import pytest # Pytest is implicitly available but good for clarity
-from app.models import Project, Stage, Task # For verifying deletions
+from datetime import timedelta
+from sqlalchemy import delete
+from app.models import Project, Stage, Task, SubTask, IdempotencyKey, db # For verifying deletions
+from app import create_app, idempotency
+from app.purge import purge_deleted, utcnow
+from tests.conftest import TestConfig
 
 # POST /api/projects
 def test_create_project_success(client):
@@ -154,14 +160,17 @@ def test_delete_project_success(client):
     data = json.loads(delete_response.data)
     assert data['message'] == 'Project successfully deleted'
 
-    # Verify it's gone from DB
-    assert Project.query.get(project_id) is None
-    assert Stage.query.get(stage_id) is None
-    assert Task.query.get(task_id) is None
-    
     # Verify it's not returned by GET
     get_response = client.get(f'/api/projects/{project_id}')
     assert get_response.status_code == 404
+    assert project_id not in [p['id'] for p in client.get('/api/projects').json]
+
+    # Soft deleted: the rows stay until the purge worker removes them
+    assert db.session.get(Project, project_id, populate_existing=True).deleted_at is not None
+    purge_deleted(cutoff=utcnow() + timedelta(seconds=1))
+    assert db.session.get(Project, project_id) is None
+    assert db.session.get(Stage, stage_id) is None
+    assert db.session.get(Task, task_id) is None
 
 def test_delete_project_not_found(client):
     response = client.delete('/api/projects/non_existent_uuid')
@@ -226,6 +235,13 @@ def test_update_project_empty_json(client):
     assert 'error' in data
     assert data['error'] == "Request body cannot be empty. Please provide 'name' and/or 'description'."
 
+def test_update_missing_project_with_invalid_body(client):
+    # A missing project is reported before the body is validated
+    for body in ({}, {'name': ''}):
+        response = client.put('/api/projects/non_existent_uuid', json=body)
+        assert response.status_code == 404
+        assert response.json['error'] == 'Project not found'
+
 def test_get_project_with_empty_stages_and_tasks(client):
     # Create a project
     create_response = client.post('/api/projects', json={'name': 'Empty Project', 'description': 'No stages yet'})
@@ -263,3 +279,455 @@ def test_get_project_with_stages_but_empty_tasks(client):
     assert 'tasks' in stage_data
     assert isinstance(stage_data['tasks'], list)
     assert len(stage_data['tasks']) == 0 # Tasks list should be empty
+
+# GET /api/projects/<project_id>/stats
+def test_get_project_stats(client):
+    project_id = client.post('/api/projects', json={'name': 'Stats Project'}).json['id']
+    todo_id = client.post(f'/api/projects/{project_id}/stages', json={'name': 'To Do'}).json['id']
+    done_id = client.post(f'/api/projects/{project_id}/stages', json={'name': 'Done'}).json['id']
+    client.post(f'/api/stages/{todo_id}/tasks', json={'content': 'Late', 'assignee': 'alice', 'end_date': '2000-01-01'})
+    client.post(f'/api/stages/{todo_id}/tasks', json={'content': 'Future', 'assignee': 'alice', 'end_date': '2999-01-01'})
+    finished = client.post(f'/api/stages/{done_id}/tasks', json={'content': 'Late but done', 'assignee': 'bob', 'end_date': '2000-01-01'}).json
+    client.post(f"/api/tasks/{finished['id']}/subtasks", json={'content': 'Only step', 'completed': True})
+
+    response = client.get(f'/api/projects/{project_id}/stats')
+    assert response.status_code == 200
+    data = response.json
+    assert data['project_id'] == project_id
+    assert data['stage_count'] == 2
+    assert data['task_count'] == 3
+    assert data['overdue_task_count'] == 1 # The finished task is not overdue
+    assert (data['subtask_count'], data['completed_subtask_count']) == (1, 1)
+    assert [(s['name'], s['task_count'], s['overdue_task_count']) for s in data['stages']] == [('To Do', 2, 1), ('Done', 1, 0)]
+    assert data['assignees'] == [
+        {'assignee': 'alice', 'task_count': 2, 'overdue_task_count': 1},
+        {'assignee': 'bob', 'task_count': 1, 'overdue_task_count': 0}
+    ]
+
+def test_get_project_stats_not_found(client):
+    response = client.get('/api/projects/non_existent_id/stats')
+    assert response.status_code == 404
+    assert response.json['error'] == 'Project not found'
+
+def test_get_projects_with_counts(client):
+    busy_id = client.post('/api/projects', json={'name': 'Busy'}).json['id']
+    client.post('/api/projects', json={'name': 'Idle'})
+    stage_id = client.post(f'/api/projects/{busy_id}/stages', json={'name': 'S1'}).json['id']
+    client.post(f'/api/projects/{busy_id}/stages', json={'name': 'S2'})
+    client.post(f'/api/stages/{stage_id}/tasks', json={'content': 'T1'})
+
+    data = client.get('/api/projects?with_counts=1').json
+    counts = {p['name']: (p['stage_count'], p['task_count']) for p in data}
+    assert counts == {'Busy': (2, 1), 'Idle': (0, 0)}
+
+    # Counts are opt-in
+    assert 'stage_count' not in client.get('/api/projects').json[0]
+
+def test_project_stats_cache(client, app):
+    project_id = client.post('/api/projects', json={'name': 'Cached Stats'}).json['id']
+    stats_cache = app.extensions['stats_cache']
+    original_ttl = stats_cache.ttl
+    stats_cache.ttl = 60
+    try:
+        assert client.get(f'/api/projects/{project_id}/stats').json['stage_count'] == 0
+        client.post(f'/api/projects/{project_id}/stages', json={'name': 'New Stage'})
+        # Served from cache until the TTL expires
+        assert client.get(f'/api/projects/{project_id}/stats').json['stage_count'] == 0
+        stats_cache.clear()
+        assert client.get(f'/api/projects/{project_id}/stats').json['stage_count'] == 1
+    finally:
+        stats_cache.ttl = original_ttl
+        stats_cache.clear()
+
+def test_delete_project_cascades_in_database(client, app, sql_statements):
+    project_id = client.post('/api/projects', json={'name': 'Cascade Project'}).json['id']
+    stage_id = client.post(f'/api/projects/{project_id}/stages', json={'name': 'Stage'}).json['id']
+    task_id = client.post(f'/api/stages/{stage_id}/tasks', json={'content': 'Task'}).json['id']
+    subtask_id = client.post(f'/api/tasks/{task_id}/subtasks', json={'content': 'Subtask'}).json['id']
+    db.session.expunge_all() # Nothing from the setup requests stays in the identity map
+
+    del sql_statements[:]
+    response = client.delete(f'/api/projects/{project_id}')
+    assert response.status_code == 200
+    # One UPDATE marking the project deleted; the tree is never loaded into the session
+    assert len(sql_statements) == 1
+    assert sql_statements[0].startswith('UPDATE projects')
+
+    # Purging deletes the project row and the database cascades to the children
+    with app.app_context():
+        db.session.execute(delete(Project).where(Project.id == project_id))
+        db.session.commit()
+        assert db.session.get(SubTask, subtask_id) is None
+        assert db.session.get(Task, task_id) is None
+        assert db.session.get(Stage, stage_id) is None
+
+# Soft delete, restore and purge
+def test_soft_deleted_project_hidden_from_every_path(client):
+    project_id = client.post('/api/projects', json={'name': 'Hidden Project'}).json['id']
+    stage_id = client.post(f'/api/projects/{project_id}/stages', json={'name': 'Stage'}).json['id']
+    task_id = client.post(f'/api/stages/{stage_id}/tasks', json={'content': 'Task'}).json['id']
+    subtask_id = client.post(f'/api/tasks/{task_id}/subtasks', json={'content': 'Subtask'}).json['id']
+
+    assert client.delete(f'/api/projects/{project_id}').status_code == 200
+    assert client.delete(f'/api/projects/{project_id}').status_code == 404 # Already deleted
+    assert client.get(f'/api/projects/{project_id}/stats').status_code == 404
+    assert client.put(f'/api/projects/{project_id}', json={'name': 'Renamed'}).status_code == 404
+    assert client.post(f'/api/projects/{project_id}/stages', json={'name': 'New'}).status_code == 404
+    assert client.put(f'/api/stages/{stage_id}', json={'name': 'New'}).status_code == 404
+    assert client.post(f'/api/stages/{stage_id}/tasks', json={'content': 'New'}).status_code == 404
+    assert client.put(f'/api/tasks/{task_id}', json={'content': 'New'}).status_code == 404
+    assert client.delete(f'/api/tasks/{task_id}').status_code == 404
+    assert client.post(f'/api/tasks/{task_id}/subtasks', json={'content': 'New'}).status_code == 404
+    assert client.put(f'/api/subtasks/{subtask_id}', json={'completed': True}).status_code == 404
+
+    # The name is free again for a new project
+    assert client.post('/api/projects', json={'name': 'Hidden Project'}).status_code == 201
+
+def test_restore_project(client):
+    project_id = client.post('/api/projects', json={'name': 'Restorable'}).json['id']
+    delete_response = client.delete(f'/api/projects/{project_id}')
+    assert 'restorable_until' in delete_response.json
+
+    response = client.post(f'/api/projects/{project_id}/restore')
+    assert response.status_code == 200
+    assert response.json['name'] == 'Restorable'
+    assert client.get(f'/api/projects/{project_id}').status_code == 200
+    # Nothing left to restore
+    assert client.post(f'/api/projects/{project_id}/restore').status_code == 404
+
+def test_restore_project_name_taken(client):
+    project_id = client.post('/api/projects', json={'name': 'Taken Name'}).json['id']
+    client.delete(f'/api/projects/{project_id}')
+    client.post('/api/projects', json={'name': 'Taken Name'})
+    response = client.post(f'/api/projects/{project_id}/restore')
+    assert response.status_code == 409
+
+def test_restore_window_expired(client, app, monkeypatch):
+    project_id = client.post('/api/projects', json={'name': 'Expired'}).json['id']
+    client.delete(f'/api/projects/{project_id}')
+    monkeypatch.setitem(app.config, 'SOFT_DELETE_RESTORE_WINDOW', 0)
+    assert client.post(f'/api/projects/{project_id}/restore').status_code == 404
+
+def test_purge_deleted_in_batches(client, app):
+    project_id = client.post('/api/projects', json={'name': 'Big Project'}).json['id']
+    keep_id = client.post('/api/projects', json={'name': 'Kept Project'}).json['id']
+    stage_id = client.post(f'/api/projects/{project_id}/stages', json={'name': 'Stage'}).json['id']
+    kept_stage_id = client.post(f'/api/projects/{keep_id}/stages', json={'name': 'Kept Stage'}).json['id']
+    for i in range(5):
+        task_id = client.post(f'/api/stages/{stage_id}/tasks', json={'content': f'Task {i}'}).json['id']
+        client.post(f'/api/tasks/{task_id}/subtasks', json={'content': 'Subtask'})
+    client.post(f'/api/stages/{kept_stage_id}/tasks', json={'content': 'Kept Task'})
+    client.delete(f'/api/projects/{project_id}')
+
+    # Still inside the restore window: nothing is purged
+    assert purge_deleted(batch_size=2, pause=0) == {'subtasks': 0, 'tasks': 0, 'stages': 0, 'projects': 0}
+
+    purged = purge_deleted(cutoff=utcnow() + timedelta(seconds=1), batch_size=2, pause=0)
+    assert purged == {'subtasks': 5, 'tasks': 5, 'stages': 1, 'projects': 1}
+    assert Task.query.count() == 1
+    assert client.get(f'/api/projects/{keep_id}').json['stages'][0]['tasks'][0]['content'] == 'Kept Task'
+
+    status = client.get('/api/deletions').json
+    assert status['pending'] == []
+    assert status['worker']['rows_purged']['tasks'] >= 5
+
+def test_purge_worker_starts_with_the_first_request(tmp_path):
+    class WorkerConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'worker.db')
+        PURGE_WORKER_ENABLED = True
+        PURGE_INTERVAL = 3600
+    worker_app = create_app(WorkerConfig)
+    worker = worker_app.extensions['purge_worker']
+    assert not worker.is_alive() # Building the app (CLI commands, scripts) starts nothing
+    with worker_app.app_context():
+        db.create_all(bind_key=None)
+        worker_app.test_client().get('/api/projects')
+        worker_app.test_client().get('/api/projects')
+        assert worker.is_alive()
+        worker.stop()
+        worker.join(5)
+        db.session.remove()
+        db.engine.dispose()
+
+# Idempotency-Key on POST /api/projects
+def test_create_project_idempotency_key_replays_response(client):
+    headers = {'Idempotency-Key': 'create-project-1'}
+    first = client.post('/api/projects', json={'name': 'Idempotent Project'}, headers=headers)
+    assert first.status_code == 201
+    retry = client.post('/api/projects', json={'name': 'Idempotent Project'}, headers=headers)
+    assert retry.status_code == 201
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.data == first.data
+    assert Project.query.filter_by(name='Idempotent Project').count() == 1
+
+def test_create_project_idempotency_key_different_body(client):
+    headers = {'Idempotency-Key': 'create-project-2'}
+    client.post('/api/projects', json={'name': 'First Body'}, headers=headers)
+    response = client.post('/api/projects', json={'name': 'Second Body'}, headers=headers)
+    assert response.status_code == 422
+    assert Project.query.filter_by(name='Second Body').count() == 0
+
+def test_stale_idempotency_key_reclaimed_once(tmp_path, monkeypatch):
+    # Two retries find the same abandoned claim. The second one to act must not
+    # delete the first one's fresh claim and run the create again.
+    class RaceConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'race.db')
+    race_app = create_app(RaceConfig)
+    with race_app.app_context():
+        db.create_all(bind_key=None)
+        client = race_app.test_client()
+        project_id = client.post('/api/projects', json={'name': 'Race'}).json['id']
+        path = f'/api/projects/{project_id}/stages'
+        headers = {'Idempotency-Key': 'abandoned'}
+        client.post(path, json={'name': 'Todo'}, headers={'Idempotency-Key': 'template'})
+        template = db.session.get(IdempotencyKey, ('template', f'POST {path}'))
+        stale = utcnow() - timedelta(seconds=race_app.config['IDEMPOTENCY_LOCK_TIMEOUT'] + 1)
+        db.session.add(IdempotencyKey(key='abandoned', scope=template.scope, request_hash=template.request_hash,
+                                      created_at=stale))
+        db.session.commit()
+        db.session.remove()
+
+        is_stale = idempotency._is_stale
+        responses = []
+        def first_reclaimer_stalls(existing):
+            # The other retry runs completely while this one holds the stale claim
+            if threading.current_thread() is threading.main_thread() and not responses:
+                other = threading.Thread(target=lambda: responses.append(
+                    race_app.test_client().post(path, json={'name': 'Todo'}, headers=headers)))
+                other.start()
+                other.join(10)
+            return is_stale(existing)
+        monkeypatch.setattr(idempotency, '_is_stale', first_reclaimer_stalls)
+        first = client.post(path, json={'name': 'Todo'}, headers=headers)
+        second = responses[0]
+        assert (second.status_code, first.status_code) == (201, 201)
+        assert first.headers['Idempotent-Replayed'] == 'true' and first.data == second.data
+        assert Stage.query.filter_by(project_id=project_id).count() == 2 # 'template' and one 'abandoned'
+        db.session.remove()
+        db.engine.dispose()
+
+def test_idempotent_response_is_stored_with_the_write(client, monkeypatch):
+    # Writes are committed only together with the stored response
+    def broken_get_data(self, *args, **kwargs):
+        raise RuntimeError('disk full')
+    with monkeypatch.context() as patch:
+        patch.setattr('flask.Response.get_data', broken_get_data)
+        response = client.post('/api/projects', json={'name': 'Unstored'}, headers={'Idempotency-Key': 'unstored'})
+    assert response.status_code == 500
+    assert Project.query.filter_by(name='Unstored').count() == 0
+    assert db.session.get(IdempotencyKey, ('unstored', 'POST /api/projects')) is None
+    retry = client.post('/api/projects', json={'name': 'Unstored'}, headers={'Idempotency-Key': 'unstored'})
+    assert retry.status_code == 201
+
+def test_create_project_idempotency_key_abandoned_claim(client, app):
+    client.post('/api/projects', json={'name': 'Claim Template'}, headers={'Idempotency-Key': 'template'})
+    claim = db.session.get(IdempotencyKey, ('template', 'POST /api/projects'))
+    stale = utcnow() - timedelta(seconds=app.config['IDEMPOTENCY_LOCK_TIMEOUT'] + 1)
+    db.session.add(IdempotencyKey(key='abandoned', scope=claim.scope, request_hash=claim.request_hash, created_at=stale))
+    db.session.commit()
+    # The same body as 'template' would conflict on name, so the retry runs the handler for real
+    response = client.post('/api/projects', json={'name': 'Claim Template'}, headers={'Idempotency-Key': 'abandoned'})
+    assert response.status_code == 409
+    assert 'Idempotent-Replayed' not in response.headers
+    assert db.session.get(IdempotencyKey, ('abandoned', 'POST /api/projects'), populate_existing=True).status_code == 409
+
+# Optimistic concurrency: version / ETag / If-Match
+def test_project_version_and_etag(client):
+    created = client.post('/api/projects', json={'name': 'Versioned'})
+    assert created.json['version'] == 1
+    assert created.headers['ETag'] == '"1"'
+    project_id = created.json['id']
+    assert client.get(f'/api/projects/{project_id}').headers['ETag'] == '"1"'
+    updated = client.put(f'/api/projects/{project_id}', json={'description': 'Unconditional'})
+    assert updated.json['version'] == 2
+    assert updated.headers['ETag'] == '"2"'
+
+def test_update_project_if_match_single_statement(client, sql_statements):
+    project_id = client.post('/api/projects', json={'name': 'If-Match Project'}).json['id']
+    sql_statements.clear()
+    response = client.put(f'/api/projects/{project_id}', json={'description': 'Changed'}, headers={'If-Match': '"1"'})
+    assert response.status_code == 200
+    assert response.json['description'] == 'Changed'
+    assert response.headers['ETag'] == '"2"'
+    # One conditional UPDATE ... RETURNING and nothing else
+    assert len(sql_statements) == 1
+    assert sql_statements[0].startswith('UPDATE projects')
+
+def test_update_project_if_match_stale_version(client, sql_statements):
+    project_id = client.post('/api/projects', json={'name': 'Contended'}).json['id']
+    client.put(f'/api/projects/{project_id}', json={'description': 'First writer'}, headers={'If-Match': '"1"'})
+    sql_statements.clear()
+    response = client.put(f'/api/projects/{project_id}', json={'description': 'Second writer'}, headers={'If-Match': '"1"'})
+    assert response.status_code == 412
+    assert len(sql_statements) == 1
+    assert client.get(f'/api/projects/{project_id}').json['description'] == 'First writer'
+
+def test_update_project_if_match_missing_or_deleted(client):
+    response = client.put('/api/projects/non-existent-id', json={'name': 'X'}, headers={'If-Match': '"1"'})
+    assert response.status_code == 412
+    project_id = client.post('/api/projects', json={'name': 'Deleted Then Updated'}).json['id']
+    client.delete(f'/api/projects/{project_id}')
+    response = client.put(f'/api/projects/{project_id}', json={'name': 'Y'}, headers={'If-Match': '"1"'})
+    assert response.status_code == 412
+
+def test_update_project_if_match_name_conflict(client):
+    client.post('/api/projects', json={'name': 'Taken Name'})
+    project_id = client.post('/api/projects', json={'name': 'Other Name'}).json['id']
+    response = client.put(f'/api/projects/{project_id}', json={'name': 'Taken Name'}, headers={'If-Match': '"1"'})
+    assert response.status_code == 409
+
+# Write paths are single round trips: no pre-read, no post-commit refresh
+def test_project_write_statement_counts(client, sql_statements):
+    response = client.post('/api/projects', json={'name': 'Counted'})
+    assert response.status_code == 201
+    assert len(sql_statements) == 1 # INSERT ... RETURNING
+    project_id = response.json['id']
+    sql_statements.clear()
+    response = client.post('/api/projects', json={'name': 'Counted'})
+    assert response.status_code == 409 # From the unique index
+    assert len(sql_statements) == 1
+    sql_statements.clear()
+    response = client.put(f'/api/projects/{project_id}', json={'description': 'Updated'})
+    assert response.status_code == 200
+    assert response.json['description'] == 'Updated'
+    assert len(sql_statements) == 1 # UPDATE ... RETURNING
+    sql_statements.clear()
+    assert client.put('/api/projects/non-existent-id', json={'name': 'X'}).status_code == 404
+    assert len(sql_statements) == 1
+
+def test_get_project_board_content_previews(client, app, sql_statements):
+    project_id = client.post('/api/projects', json={'name': 'Big Cards'}).json['id']
+    stage_id = client.post(f'/api/projects/{project_id}/stages', json={'name': 'Logs'}).json['id']
+    long_log = 'x' * 50000
+    task_id = client.post(f'/api/stages/{stage_id}/tasks', json={'content': long_log}).json['id']
+    client.post(f'/api/tasks/{task_id}/subtasks', json={'content': 'short'})
+    db.session.expunge_all() # Board load starts from an empty identity map, like a fresh request
+    sql_statements.clear()
+    response = client.get(f'/api/projects/{project_id}')
+    assert response.status_code == 200
+    task = response.json['stages'][0]['tasks'][0]
+    assert task['content'] == long_log[:app.config['CONTENT_PREVIEW_LENGTH']]
+    assert task['content_length'] == 50000
+    assert task['subtasks'][0]['content'] == 'short'
+    assert task['subtasks'][0]['content_length'] == 5
+    # Project, stages, tasks and subtasks; the content column itself is never selected
+    assert len(sql_statements) == 4
+    for statement in sql_statements:
+        for expression in ('substr(subtasks.content', 'length(subtasks.content', 'substr(tasks.content', 'length(tasks.content'):
+            statement = statement.replace(expression, '')
+        assert 'tasks.content' not in statement
+
+def test_clone_project(client, sql_statements):
+    template_id = client.post('/api/projects', json={'name': 'Template', 'description': 'Sprint board'}).json['id']
+    stage_ids = [client.post(f'/api/projects/{template_id}/stages', json={'name': name}).json['id'] for name in ('Todo', 'Done')]
+    for index in range(3):
+        task_id = client.post(f'/api/stages/{stage_ids[index % 2]}/tasks', json={
+            'content': f'Task {index}', 'assignee': 'sam', 'start_date': '2024-01-30', 'end_date': '2024-02-02'
+        }).json['id']
+        client.post(f'/api/tasks/{task_id}/subtasks', json={'content': 'Step'})
+    client.delete(f'/api/stages/{stage_ids[1]}') # Soft-deleted stages are not copied
+    sql_statements.clear()
+
+    response = client.post(f'/api/projects/{template_id}/clone', json={'name': 'Sprint 12', 'shift_days': 3})
+    assert response.status_code == 201
+    assert response.json['copied'] == {'stages': 1, 'tasks': 2, 'subtasks': 2}
+    assert response.json['description'] == 'Sprint board'
+    # Set-based whatever the board size: INSERT ... SELECT for the project, then per
+    # table one for the id mapping and one for the copy
+    assert len([s for s in sql_statements if s.lstrip().upper().startswith('INSERT')]) == 7
+    board = client.get(f"/api/projects/{response.json['id']}").json
+    task = board['stages'][0]['tasks'][0]
+    assert task['id'] not in [t['id'] for t in client.get(f'/api/projects/{template_id}').json['stages'][0]['tasks']]
+    assert (task['start_date'], task['end_date'], task['assignee']) == ('2024-02-02', '2024-02-05', 'sam')
+    assert task['subtask_count'] == 1
+    assert task['subtasks'][0]['parent_task_id'] == task['id']
+
+    bare = client.post(f'/api/projects/{template_id}/clone', json={
+        'name': 'Stages only', 'include_tasks': False, 'include_assignees': False})
+    assert bare.json['copied'] == {'stages': 1, 'tasks': 0, 'subtasks': 0}
+    no_subtasks = client.post(f'/api/projects/{template_id}/clone', json={
+        'name': 'No subtasks', 'include_subtasks': False, 'include_assignees': False})
+    task = client.get(f"/api/projects/{no_subtasks.json['id']}").json['stages'][0]['tasks'][0]
+    assert (task['assignee'], task['subtask_count'], task['subtasks']) == (None, 0, [])
+
+def test_clone_project_errors(client):
+    template_id = client.post('/api/projects', json={'name': 'Template'}).json['id']
+    assert client.post(f'/api/projects/{template_id}/clone', json={}).status_code == 400
+    assert client.post(f'/api/projects/{template_id}/clone', json={'name': 'X', 'shift_days': '1'}).status_code == 400
+    assert client.post('/api/projects/non-existent-id/clone', json={'name': 'X'}).status_code == 404
+    assert client.post(f'/api/projects/{template_id}/clone', json={'name': 'Template'}).status_code == 409
+
+def test_get_project_board_is_streamed_byte_for_byte(client, app):
+    from app.board import load_board, preview_length
+    project_id = client.post('/api/projects', json={'name': 'Streamed', 'description': 'Ünïcode "quoted" ✓'}).json['id']
+    stage_ids = [client.post(f'/api/projects/{project_id}/stages', json={'name': name}).json['id']
+                 for name in ('To Do', 'Doing', 'Gone')]
+    client.delete(f'/api/stages/{stage_ids[2]}')
+    for stage_id in stage_ids[:2]:
+        for index in range(3):
+            task_id = client.post(f'/api/stages/{stage_id}/tasks', json={
+                'content': f'Task {index} ' + 'é' * 300, 'assignee': 'ana', 'start_date': '2024-05-01'}).json['id']
+            for subtask in range(index):
+                client.post(f'/api/tasks/{task_id}/subtasks', json={'content': f'Step {subtask}'})
+
+    response = client.get(f'/api/projects/{project_id}')
+    assert response.status_code == 200 and response.is_streamed
+    db.session.expunge_all()
+    project = load_board(project_id)
+    expected = app.json.response(project.to_dict(include_stages=True, preview_length=preview_length())).get_data()
+    assert response.get_data() == expected
+    assert response.headers['ETag'] == f'"{project.version}"'
+    assert [stage['name'] for stage in response.json['stages']] == ['To Do', 'Doing']
+
+def test_load_board_skips_deleted_stages_in_sql(client):
+    from app.board import load_board
+    project_id = client.post('/api/projects', json={'name': 'Pruned'}).json['id']
+    kept, gone = [client.post(f'/api/projects/{project_id}/stages', json={'name': name}).json['id'] for name in ('Kept', 'Gone')]
+    for _ in range(3):
+        task_id = client.post(f'/api/stages/{gone}/tasks', json={'content': 'Old'}).json['id']
+        client.post(f'/api/tasks/{task_id}/subtasks', json={'content': 'Old step'})
+    client.delete(f'/api/stages/{gone}')
+    db.session.expunge_all()
+    project = load_board(project_id)
+    assert [stage.id for stage in project.stages] == [kept]
+    # Nothing of the deleted stage was read
+    assert not [obj for obj in db.session.identity_map.values() if isinstance(obj, (Task, SubTask))]
+
+# GET /api/boards
+def test_get_boards_in_fixed_number_of_queries(client, sql_statements):
+    project_ids = []
+    for p in range(3):
+        project_id = client.post('/api/projects', json={'name': f'Portfolio {p}'}).json['id']
+        project_ids.append(project_id)
+        for s in range(2):
+            stage_id = client.post(f'/api/projects/{project_id}/stages', json={'name': f'Stage {s}'}).json['id']
+            for t in range(2):
+                task_id = client.post(f'/api/stages/{stage_id}/tasks', json={'content': f'Task {t}'}).json['id']
+                client.post(f'/api/tasks/{task_id}/subtasks', json={'content': 'Sub', 'completed': t == 1})
+    deleted_stage = client.post(f'/api/projects/{project_ids[0]}/stages', json={'name': 'Gone'}).json['id']
+    client.delete(f'/api/stages/{deleted_stage}')
+
+    sql_statements.clear()
+    ids = ','.join(project_ids + ['non-existent-id', project_ids[0]])
+    response = client.get(f'/api/boards?ids={ids}')
+    assert response.status_code == 200
+    assert len(sql_statements) == 4 # Projects, stages, tasks, subtasks for all the boards
+    boards = response.json
+    assert set(boards) == {*project_ids, 'non-existent-id'} # Duplicates are answered once
+    assert boards['non-existent-id'] == {'error': 'Project not found', 'status': 404}
+    for project_id in project_ids:
+        assert boards[project_id] == client.get(f'/api/projects/{project_id}').json # Same shape as a single board
+
+    sql_statements.clear()
+    shallow = client.get(f'/api/boards?ids={project_ids[1]}&depth=tasks').json[project_ids[1]]
+    assert len(sql_statements) == 3
+    assert [len(stage['tasks']) for stage in shallow['stages']] == [2, 2]
+    assert 'subtasks' not in shallow['stages'][0]['tasks'][0]
+    assert shallow['stages'][0]['tasks'][0]['subtask_count'] == 1
+    assert 'stages' not in client.get(f'/api/boards?ids={project_ids[1]}&depth=project').json[project_ids[1]]
+
+def test_get_boards_bad_requests(client):
+    assert client.get('/api/boards').status_code == 400
+    assert client.get('/api/boards?ids=a&depth=everything').status_code == 400
+    too_many = ','.join(f'id-{i}' for i in range(51))
+    assert client.get(f'/api/boards?ids={too_many}').status_code == 400
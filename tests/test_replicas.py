@@ -0,0 +1,75 @@
+import pytest
+from app import create_app, db
+from app.replicas import sync_replica
+from tests.conftest import TestConfig
+
+# Primary and replica as two SQLite files; the replica only changes on sync_replica()
+@pytest.fixture
+def replica_app(tmp_path):
+    class ReplicaConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'primary.db')
+        SQLALCHEMY_BINDS = {'replica': 'sqlite:///' + str(tmp_path / 'replica.db')}
+        REPLICA_SYNC_INTERVAL = 0
+        REPLICA_MAX_LAG = 60
+        REPLICA_READ_YOUR_WRITES = 60
+    app = create_app(ReplicaConfig)
+    with app.app_context():
+        db.create_all(bind_key=None)
+        sync_replica()
+        yield app
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+def test_gets_read_from_replica(replica_app):
+    writer, reader = replica_app.test_client(), replica_app.test_client()
+    created = writer.post('/api/projects', json={'name': 'Replicated'})
+    assert created.headers['X-DB-Route'] == 'primary'
+    # Not synced yet: a client that didn't write reads the (stale) replica
+    response = reader.get('/api/projects')
+    assert response.headers['X-DB-Route'] == 'replica'
+    assert response.json == []
+    with replica_app.app_context():
+        sync_replica()
+    response = reader.get(f"/api/projects/{created.json['id']}")
+    assert response.headers['X-DB-Route'] == 'replica'
+    assert response.json['name'] == 'Replicated'
+
+def test_read_your_writes_goes_to_primary(replica_app):
+    writer = replica_app.test_client()
+    project_id = writer.post('/api/projects', json={'name': 'Mine'}).json['id']
+    response = writer.get(f'/api/projects/{project_id}')
+    assert response.headers['X-DB-Route'] == 'primary'
+    assert response.json['name'] == 'Mine'
+    strong = replica_app.test_client().get('/api/projects', headers={'X-Read-Consistency': 'strong'})
+    assert strong.headers['X-DB-Route'] == 'primary'
+    assert len(strong.json) == 1
+
+def test_lagging_replica_falls_back_to_primary(replica_app):
+    replica_app.test_client().post('/api/projects', json={'name': 'Unsynced'})
+    replica_app.config['REPLICA_MAX_LAG'] = 0
+    response = replica_app.test_client().get('/api/projects')
+    assert response.headers['X-DB-Route'] == 'primary'
+    assert [p['name'] for p in response.json] == ['Unsynced']
+    with replica_app.app_context():
+        sync_replica()
+    assert replica_app.test_client().get('/api/projects').headers['X-DB-Route'] == 'replica'
+
+def test_sync_worker_starts_with_the_first_request(tmp_path):
+    class SyncConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'primary.db')
+        SQLALCHEMY_BINDS = {'replica': 'sqlite:///' + str(tmp_path / 'replica.db')}
+        REPLICA_SYNC_INTERVAL = 3600
+    sync_app = create_app(SyncConfig)
+    worker = sync_app.extensions['replica_sync_worker']
+    assert not worker.is_alive() # Building the app (CLI commands, scripts) starts nothing
+    with sync_app.app_context():
+        db.create_all(bind_key=None)
+        sync_replica()
+        sync_app.test_client().get('/api/projects')
+        assert worker.is_alive()
+        worker.stop()
+        worker.join(5)
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
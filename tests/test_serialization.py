@@ -0,0 +1,45 @@
+from datetime import datetime
+import pytest
+import app.serialization as serialization
+
+def create_task(client):
+    project_id = client.post('/api/projects', json={'name': 'Formats'}).json['id']
+    stage_id = client.post(f'/api/projects/{project_id}/stages', json={'name': 'Todo'}).json['id']
+    client.post(f'/api/stages/{stage_id}/tasks', json={'content': 'Ship', 'start_date': '2024-03-01'})
+    return project_id
+
+def test_json_dates_and_datetimes(client):
+    project_id = create_task(client)
+    task = client.get(f'/api/projects/{project_id}').json['stages'][0]['tasks'][0]
+    assert task['start_date'] == '2024-03-01'
+    assert task['end_date'] is None
+    assert task['created_at'].endswith('Z')
+    assert datetime.fromisoformat(task['created_at'][:-1])
+
+def test_msgpack_request_falls_back_to_json_without_package(client, monkeypatch):
+    monkeypatch.setattr(serialization, 'msgpack', None)
+    project_id = create_task(client)
+    response = client.get(f'/api/projects/{project_id}', headers={'Accept': 'application/msgpack'})
+    assert response.mimetype == 'application/json'
+    assert response.json['name'] == 'Formats'
+
+def test_msgpack_responses_and_bodies(client):
+    msgpack = pytest.importorskip('msgpack')
+    project_id = create_task(client)
+    response = client.get(f'/api/projects/{project_id}', headers={'Accept': 'application/msgpack'})
+    assert response.mimetype == 'application/msgpack'
+    assert 'Accept' in response.headers['Vary']
+    board = msgpack.unpackb(response.data, timestamp=3)
+    task = board['stages'][0]['tasks'][0]
+    assert task['start_date'] == '2024-03-01'
+    assert isinstance(task['created_at'], datetime)
+    assert board.keys() == client.get(f'/api/projects/{project_id}').json.keys()
+
+    stage_id = board['stages'][0]['id']
+    created = client.post(f'/api/stages/{stage_id}/tasks', data=msgpack.packb({'content': 'Packed'}),
+                          headers={'Content-Type': 'application/msgpack', 'Accept': 'application/msgpack'})
+    assert created.status_code == 201
+    assert msgpack.unpackb(created.data)['content'] == 'Packed'
+    broken = client.post(f'/api/stages/{stage_id}/tasks', data=b'\xc1',
+                         headers={'Content-Type': 'application/msgpack'})
+    assert broken.status_code == 400
@@ -0,0 +1,172 @@
+import pytest
+from sqlalchemy import create_engine, func, select
+from app import create_app, db
+from app.models import Project, ProjectName, Stage, Task, SubTask
+from app.project_names import ORPHANED_CLAIM_AGE
+from app.purge import utcnow
+from app.sharding import project_bucket, rebalance_shards
+from tests.conftest import TestConfig
+
+def shard_url(tmp_path, index):
+    return 'sqlite:///' + str(tmp_path / f'shard{index}.db')
+
+def make_sharded_app(tmp_path, count):
+    class ShardConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'main.db')
+        SHARD_DATABASE_URLS = [shard_url(tmp_path, index) for index in range(count)]
+    return create_app(ShardConfig)
+
+@pytest.fixture
+def sharded_app(tmp_path):
+    app = make_sharded_app(tmp_path, 2)
+    with app.app_context():
+        db.create_all(bind_key=None)
+        for index in range(3): # shard2 is only configured by test_rebalance_to_more_shards
+            # Every shard carries the full schema (in production: `flask db upgrade` per shard)
+            engine = create_engine(shard_url(tmp_path, index))
+            db.metadata.create_all(engine)
+            engine.dispose()
+        yield app
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+def count_rows(url, model):
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        count = conn.execute(select(func.count()).select_from(model.__table__)).scalar()
+    engine.dispose()
+    return count
+
+def create_tree(client, name):
+    project_id = client.post('/api/projects', json={'name': name}).json['id']
+    stage_id = client.post(f'/api/projects/{project_id}/stages', json={'name': 'Todo'}).json['id']
+    task_id = client.post(f'/api/stages/{stage_id}/tasks', json={'content': 'Work'}).json['id']
+    subtask = client.post(f'/api/tasks/{task_id}/subtasks', json={'content': 'Step'}).json
+    return project_id, stage_id, task_id, subtask['id']
+
+def test_project_trees_stay_on_one_shard(sharded_app, tmp_path):
+    client = sharded_app.test_client()
+    trees = [create_tree(client, f'Project {index}') for index in range(8)]
+    shards = {project_bucket(tree[0]) % 2 for tree in trees}
+    assert shards == {0, 1} # 8 random ids practically always land on both shards
+    for project_id, stage_id, task_id, subtask_id in trees:
+        # Child ids carry the project's bucket, so they route without a lookup
+        assert {stage_id[:4], task_id[:4], subtask_id[:4]} == {f'{project_bucket(project_id):04x}'}
+    for model in (Project, Stage, Task, SubTask):
+        assert sum(count_rows(shard_url(tmp_path, index), model) for index in range(2)) == 8
+    assert count_rows(sharded_app.config['SQLALCHEMY_DATABASE_URI'], Project) == 0
+
+def test_child_routes_and_list_gather_across_shards(sharded_app):
+    client = sharded_app.test_client()
+    trees = [create_tree(client, f'Project {index}') for index in range(6)]
+    listed = client.get('/api/projects?with_counts=1').json
+    assert [item['name'] for item in listed] == [f'Project {index}' for index in reversed(range(6))]
+    assert all(item['task_count'] == 1 for item in listed)
+
+    project_id, stage_id, task_id, subtask_id = trees[0]
+    assert client.put(f'/api/subtasks/{subtask_id}', json={'completed': True}).status_code == 200
+    task = client.get(f'/api/tasks/{task_id}').json
+    assert task['completed_subtask_count'] == 1
+    board = client.get(f'/api/projects/{project_id}').json
+    assert board['stages'][0]['tasks'][0]['id'] == task_id
+    boards = client.get('/api/boards?depth=tasks&ids=' + ','.join(tree[0] for tree in trees)).json
+    assert all(boards[tree[0]]['stages'][0]['tasks'][0]['id'] == tree[2] for tree in trees)
+    # Activity events are resolved to their project on the shard they were recorded on
+    assert sharded_app.extensions['activity'].flush() == 6 * 4 + 1
+    assert client.get(f'/api/projects/{project_id}/activity').json['events'][0]['action'] == 'subtask.completed'
+    assert client.delete(f'/api/stages/{stage_id}').status_code == 200
+    assert [item['id'] for item in client.get('/api/deletions').json['pending']] == [stage_id]
+    assert client.get('/api/tasks/0000-not-an-id').status_code == 404
+
+def test_rebalance_to_more_shards(sharded_app, tmp_path):
+    client = sharded_app.test_client()
+    trees = [create_tree(client, f'Project {index}') for index in range(9)]
+
+    grown = make_sharded_app(tmp_path, 3)
+    with grown.app_context():
+        moved = rebalance_shards(log=lambda message: None)
+        assert sum(moved.values()) == sum(1 for tree in trees if project_bucket(tree[0]) % 2 != project_bucket(tree[0]) % 3)
+        assert rebalance_shards(log=lambda message: None) == {} # Nothing left to move
+        grown_client = grown.test_client()
+        assert len(grown_client.get('/api/projects').json) == 9
+        for project_id, stage_id, task_id, subtask_id in trees:
+            board = grown_client.get(f'/api/projects/{project_id}').json
+            assert board['stages'][0]['tasks'][0]['subtasks'][0]['id'] == subtask_id
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    for index in range(3):
+        assert count_rows(shard_url(tmp_path, index), SubTask) == sum(
+            1 for tree in trees if project_bucket(tree[0]) % 3 == index)
+
+def test_clone_stays_on_the_source_shard(sharded_app):
+    client = sharded_app.test_client()
+    project_id, stage_id, task_id, subtask_id = create_tree(client, 'Template')
+    clone = client.post(f'/api/projects/{project_id}/clone', json={'name': 'Copy'}).json
+    assert project_bucket(clone['id']) % 2 == project_bucket(project_id) % 2
+    board = client.get(f"/api/projects/{clone['id']}").json
+    task = board['stages'][0]['tasks'][0]
+    assert task['id'][:4] == f"{project_bucket(clone['id']):04x}"
+    assert client.get(f"/api/tasks/{task['id']}").json['subtasks'][0]['content'] == 'Step'
+
+def test_batch_stays_on_one_shard(sharded_app):
+    client = sharded_app.test_client()
+    created = client.post('/api/batch', json={'operations': [
+        {'method': 'POST', 'path': '/api/projects', 'body': {'name': f'Batched {index}'}} for index in range(6)]})
+    assert created.status_code == 200
+    # Projects created in a batch join the shard of its first operation
+    assert len({project_bucket(result['body']['id']) % 2 for result in created.json['results']}) == 1
+
+    trees = [create_tree(client, f'Project {index}') for index in range(8)]
+    first = trees[0][0]
+    other = next(tree[0] for tree in trees if project_bucket(tree[0]) % 2 != project_bucket(first) % 2)
+    response = client.post('/api/batch', json={'operations': [
+        {'method': 'PUT', 'path': f'/api/projects/{first}', 'body': {'description': 'Changed'}},
+        {'method': 'PUT', 'path': f'/api/projects/{other}', 'body': {'description': 'Changed'}},
+    ]})
+    assert response.status_code == 400
+    assert response.json['failed_operation'] == 1
+    assert client.get(f'/api/projects/{first}').json['description'] != 'Changed'
+
+def test_project_names_are_unique_across_shards(sharded_app):
+    client = sharded_app.test_client()
+    statuses = [client.post('/api/projects', json={'name': 'Roadmap'}).status_code for _ in range(6)]
+    assert statuses == [201, 409, 409, 409, 409, 409]
+
+    trees = [create_tree(client, f'Project {index}') for index in range(8)]
+    roadmap = client.get('/api/projects').json[-1]['id']
+    other = next(tree[0] for tree in trees if project_bucket(tree[0]) % 2 != project_bucket(roadmap) % 2)
+    assert client.put(f'/api/projects/{other}', json={'name': 'Roadmap'}).status_code == 409
+    assert client.post(f'/api/projects/{other}/clone', json={'name': 'Roadmap'}).status_code == 409
+
+    # Renaming or deleting a project frees its name on every shard
+    assert client.put(f'/api/projects/{roadmap}', json={'name': 'Roadmap v1'}).status_code == 200
+    assert client.put(f'/api/projects/{other}', json={'name': 'Roadmap'}).status_code == 200
+    assert client.delete(f'/api/projects/{other}').status_code == 200
+    assert client.put(f'/api/projects/{roadmap}', json={'name': 'Roadmap'}).status_code == 200
+    assert client.post(f'/api/projects/{other}/restore').status_code == 409
+    assert ProjectName.query.filter_by(name='Roadmap').one().project_id == roadmap
+
+def test_orphaned_name_claim_is_taken_over(sharded_app):
+    # Left behind when a crash hit between the default database's commit and the shard's
+    orphan_id = '00000000-0000-4000-8000-000000000000'
+    db.session.add(ProjectName(name='Orphaned', project_id=orphan_id, claimed_at=utcnow()))
+    db.session.commit()
+    client = sharded_app.test_client()
+    assert client.post('/api/projects', json={'name': 'Orphaned'}).status_code == 409 # Could still be committing
+    ProjectName.query.filter_by(name='Orphaned').update({'claimed_at': utcnow() - ORPHANED_CLAIM_AGE})
+    db.session.commit()
+    project_id = client.post('/api/projects', json={'name': 'Orphaned'}).json['id']
+    assert ProjectName.query.filter_by(name='Orphaned').one().project_id == project_id
+
+def test_task_stays_in_its_project_tree(sharded_app):
+    client = sharded_app.test_client()
+    project_id, stage_id, task_id, subtask_id = create_tree(client, 'Source')
+    other_stage = client.post(f'/api/projects/{project_id}/stages', json={'name': 'Done'}).json['id']
+    foreign_stage = create_tree(client, 'Target')[1]
+    # Its id carries the source project's bucket, so it can't join another tree
+    assert client.put(f'/api/tasks/{task_id}', json={'stage_id': foreign_stage}).status_code == 400
+    assert client.patch(f'/api/tasks/{task_id}', json={'stage_id': foreign_stage}).status_code == 400
+    assert client.patch(f'/api/tasks/{task_id}', json={'stage_id': other_stage}).status_code == 200
+    assert client.get(f'/api/tasks/{task_id}').json['stage_id'] == other_stage
@@ -0,0 +1,59 @@
+import pytest
+from sqlalchemy import text
+from app import create_app, db
+from app.slow_queries import full_scans, redact
+from tests.conftest import TestConfig
+
+ADMIN = {'X-Admin-Token': 'secret'}
+
+@pytest.fixture()
+def logged_app(tmp_path):
+    class SlowQueryConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'slow.db')
+        ADMIN_TOKEN = 'secret'
+        SLOW_QUERY_THRESHOLD = 0 # Every statement counts as slow
+    logged_app = create_app(SlowQueryConfig)
+    with logged_app.app_context():
+        db.create_all(bind_key=None)
+        yield logged_app
+        db.session.remove()
+        db.engine.dispose()
+
+def test_slow_statements_are_logged_with_plans(logged_app):
+    client = logged_app.test_client()
+    project_id = client.post('/api/projects', json={'name': 'Secret plans'}).json['id']
+    stage_id = client.post(f'/api/projects/{project_id}/stages', json={'name': 'To Do'}).json['id']
+    client.post(f'/api/stages/{stage_id}/tasks', json={'content': 'Plan'})
+    client.delete('/api/admin/slow-queries', headers=ADMIN)
+    client.get(f'/api/projects/{project_id}').get_data()
+
+    body = client.get('/api/admin/slow-queries', headers=ADMIN).json
+    assert body['threshold_ms'] == 0
+    queries = body['queries']
+    assert len(queries) == 4 # The board loads in four queries
+    project_query = queries[-1] # Newest first
+    assert project_query['statement'].lstrip().startswith('SELECT')
+    assert (project_query['endpoint'], project_query['blueprint']) == ('projects_api.get_project', 'projects_api')
+    assert project_query['request'] == f'GET /api/projects/{project_id}'
+    assert '<bytes len=16>' in project_query['parameters'] # The id, not its value
+    assert any(line.startswith('SEARCH projects') for line in project_query['plan'])
+    assert project_query['duration_ms'] >= 0
+
+def test_full_scans_filter_and_admin_gate(logged_app):
+    client = logged_app.test_client()
+    client.get('/api/projects') # Found through the deleted_at index
+    db.session.execute(text('SELECT count(*) FROM tasks')).scalar() # Outside a request: no call site
+    db.session.rollback()
+    scans = client.get('/api/admin/slow-queries?full_scans=1&limit=1', headers=ADMIN).json['queries']
+    assert len(scans) == 1 and scans[0]['full_scans'] == ['tasks'] and scans[0]['endpoint'] is None
+    assert client.get('/api/admin/slow-queries').status_code == 403
+    assert client.get('/api/admin/slow-queries?limit=x', headers=ADMIN).status_code == 400
+    assert client.delete('/api/admin/slow-queries', headers=ADMIN).status_code == 200
+    assert client.get('/api/admin/slow-queries?full_scans=1', headers=ADMIN).json['queries'] == []
+
+def test_redaction_and_scan_detection():
+    assert redact(('alice@example.com', b'\x00' * 16, 3, None, True)) == ['<str len=17>', '<bytes len=16>', 3, None, True]
+    assert redact({'name': 'x'}) == {'name': '<str len=1>'}
+    plan = ['SCAN tasks', '  SEARCH subtasks USING INDEX ix_subtasks_parent_task_id (parent_task_id=?)',
+            'SCAN stages USING INDEX ix_stages_project_id', 'SCAN CONSTANT ROW']
+    assert full_scans(plan) == ['stages', 'tasks']
@@ -1,6 +1,8 @@
 import json
 import pytest
+from datetime import timedelta
 from app.models import Project, Stage, Task, SubTask, db # For verifying deletions and setup
+from app.purge import purge_deleted, utcnow
 
 # Helper fixture to create a project
 @pytest.fixture
@@ -119,7 +121,12 @@ def test_delete_stage_success(client, project, app): # app fixture to use db.ses
     data = delete_response.json
     assert data['message'] == 'Stage successfully deleted'
 
-    # Verify it's gone from DB along with its tasks and subtasks
+    # Hidden at once: the stage is gone from the board and its tasks can't be reached
+    assert client.get(f'/api/projects/{project_id}').json['stages'] == []
+    assert client.put(f'/api/tasks/{task_id}', json={'content': 'Changed'}).status_code == 404
+
+    # Verify it's gone from DB along with its tasks and subtasks once purged
+    purge_deleted(cutoff=utcnow() + timedelta(seconds=1))
     with app.app_context(): # Need app context for DB operations
         assert Stage.query.get(stage_id) is None
         assert Task.query.get(task_id) is None
@@ -162,3 +169,45 @@ def test_update_stage_empty_json(client, project):
     assert response.status_code == 400
     data = response.json
     assert data['error'] == "Request body cannot be empty. Please provide 'name' and/or 'order'."
+
+def test_update_missing_stage_with_invalid_body(client, project):
+    # A missing or deleted stage is reported before the body is validated
+    stage_id = client.post(f"/api/projects/{project['id']}/stages", json={'name': 'Deleted'}).json['id']
+    assert client.delete(f'/api/stages/{stage_id}').status_code == 200
+    for missing_id in ('non-existent-id', stage_id):
+        for body in ({}, {'name': ''}, {'order': 'x'}):
+            response = client.put(f'/api/stages/{missing_id}', json=body)
+            assert response.status_code == 404
+            assert response.json['error'] == 'Stage not found'
+
+def test_restore_stage(client, project):
+    project_id = project['id']
+    stage_id = client.post(f'/api/projects/{project_id}/stages', json={'name': 'Restorable Stage'}).json['id']
+    client.post(f'/api/stages/{stage_id}/tasks', json={'content': 'Task survives'})
+    assert client.delete(f'/api/stages/{stage_id}').status_code == 200
+    assert client.delete(f'/api/stages/{stage_id}').status_code == 404
+
+    response = client.post(f'/api/stages/{stage_id}/restore')
+    assert response.status_code == 200
+    assert response.json['tasks'][0]['content'] == 'Task survives'
+    assert len(client.get(f'/api/projects/{project_id}').json['stages']) == 1
+
+def test_restore_stage_of_deleted_project(client, project):
+    project_id = project['id']
+    stage_id = client.post(f'/api/projects/{project_id}/stages', json={'name': 'Orphaned Stage'}).json['id']
+    client.delete(f'/api/stages/{stage_id}')
+    client.delete(f'/api/projects/{project_id}')
+    assert client.post(f'/api/stages/{stage_id}/restore').status_code == 404
+
+def test_stage_write_statement_counts(client, project, sql_statements):
+    sql_statements.clear()
+    first = client.post(f"/api/projects/{project['id']}/stages", json={'name': 'One'})
+    second = client.post(f"/api/projects/{project['id']}/stages", json={'name': 'Two'})
+    assert (first.json['order'], second.json['order']) == (0, 1)
+    # INSERT ... SELECT checks the project and allocates the order in one statement
+    assert len(sql_statements) == 2
+    sql_statements.clear()
+    response = client.put(f"/api/stages/{first.json['id']}", json={'name': 'Renamed'})
+    assert response.status_code == 200
+    assert response.json['name'] == 'Renamed'
+    assert len(sql_statements) == 2 # UPDATE ... RETURNING and the (empty) task list
@@ -194,3 +194,129 @@ def test_update_subtask_empty_json(client, task):
     assert response.status_code == 400 # As per subtasks_bp.py logic
     data = response.json
     assert data['error'] == "Request body cannot be empty" # Matches illustrative code for subtasks_bp
+
+def test_update_missing_subtask_with_invalid_body(client, task):
+    # A missing subtask is reported before the body is validated, on PUT and PATCH
+    for method in (client.put, client.patch):
+        for body in ({}, {'content': ''}, {'completed': 'yes'}, {'order': 'x'}):
+            response = method('/api/subtasks/non-existent-id', json=body)
+            assert response.status_code == 404
+            assert response.json['error'] == 'Subtask not found'
+
+# Denormalized Task.subtask_count / Task.completed_subtask_count
+def test_subtask_counters_track_create_update_delete(client, task, app):
+    parent_task_id = task['id']
+    assert task['subtask_count'] == 0
+    assert task['completed_subtask_count'] == 0
+
+    first = client.post(f'/api/tasks/{parent_task_id}/subtasks', json={'content': 'Done already', 'completed': True}).json
+    second = client.post(f'/api/tasks/{parent_task_id}/subtasks', json={'content': 'Still open'}).json
+
+    with app.app_context():
+        parent = db.session.get(Task, parent_task_id)
+        assert (parent.subtask_count, parent.completed_subtask_count) == (2, 1)
+
+    # Toggling to the same value must not double count
+    client.put(f"/api/subtasks/{second['id']}", json={'completed': True})
+    client.put(f"/api/subtasks/{second['id']}", json={'completed': True})
+    with app.app_context():
+        parent = db.session.get(Task, parent_task_id)
+        assert (parent.subtask_count, parent.completed_subtask_count) == (2, 2)
+
+    client.put(f"/api/subtasks/{first['id']}", json={'completed': False})
+    client.delete(f"/api/subtasks/{second['id']}")
+    with app.app_context():
+        parent = db.session.get(Task, parent_task_id)
+        assert (parent.subtask_count, parent.completed_subtask_count) == (1, 0)
+
+def test_subtask_counters_on_board(client, project, task):
+    parent_task_id = task['id']
+    client.post(f'/api/tasks/{parent_task_id}/subtasks', json={'content': 'A', 'completed': True})
+    client.post(f'/api/tasks/{parent_task_id}/subtasks', json={'content': 'B'})
+
+    board = client.get(f"/api/projects/{project['id']}").json
+    board_task = board['stages'][0]['tasks'][0]
+    assert board_task['subtask_count'] == 2
+    assert board_task['completed_subtask_count'] == 1
+
+def test_recount_subtasks_command_repairs_drift(client, task, runner, app):
+    parent_task_id = task['id']
+    client.post(f'/api/tasks/{parent_task_id}/subtasks', json={'content': 'A', 'completed': True})
+    client.post(f'/api/tasks/{parent_task_id}/subtasks', json={'content': 'B'})
+
+    with app.app_context():
+        parent = db.session.get(Task, parent_task_id)
+        parent.subtask_count = 42
+        parent.completed_subtask_count = 7
+        db.session.commit()
+
+    result = runner.invoke(args=['recount-subtasks'])
+    assert result.exit_code == 0
+    assert 'Recomputed subtask counters' in result.output
+
+    with app.app_context():
+        parent = db.session.get(Task, parent_task_id)
+        assert (parent.subtask_count, parent.completed_subtask_count) == (2, 1)
+
+def test_update_subtask_if_match_keeps_counters(client, task):
+    subtask = client.post(f"/api/tasks/{task['id']}/subtasks", json={'content': 'Check'}).json
+    response = client.put(f"/api/subtasks/{subtask['id']}", json={'completed': True}, headers={'If-Match': '"1"'})
+    assert response.status_code == 200
+    assert response.headers['ETag'] == '"2"'
+    # Setting the same value again doesn't double count
+    client.put(f"/api/subtasks/{subtask['id']}", json={'completed': True}, headers={'If-Match': '"2"'})
+    parent = db.session.get(Task, task['id'], populate_existing=True)
+    assert parent.completed_subtask_count == 1
+    stale = client.put(f"/api/subtasks/{subtask['id']}", json={'completed': False}, headers={'If-Match': '"1"'})
+    assert stale.status_code == 412
+
+def test_subtask_write_statement_counts(client, task, sql_statements):
+    sql_statements.clear()
+    subtask = client.post(f"/api/tasks/{task['id']}/subtasks", json={'content': 'Counted'}).json
+    assert len(sql_statements) == 2 # INSERT ... SELECT and the counter UPDATE
+    sql_statements.clear()
+    assert client.put(f"/api/subtasks/{subtask['id']}", json={'completed': True}).status_code == 200
+    assert len(sql_statements) == 2 # UPDATE ... RETURNING and the counter recount
+    sql_statements.clear()
+    assert client.delete(f"/api/subtasks/{subtask['id']}").status_code == 200
+    assert len(sql_statements) == 2 # DELETE ... RETURNING and the counter UPDATE
+    parent = db.session.get(Task, task['id'], populate_existing=True)
+    assert (parent.subtask_count, parent.completed_subtask_count) == (0, 0)
+
+# PATCH /api/subtasks/<subtask_id>
+def test_patch_subtask_toggle(client, task, sql_statements):
+    subtask = client.post(f"/api/tasks/{task['id']}/subtasks", json={'content': 'Toggle me'}).json
+    sql_statements.clear()
+    response = client.patch(f"/api/subtasks/{subtask['id']}", json={'completed': True})
+    assert response.status_code == 200
+    assert response.json == {'id': subtask['id'], 'version': 2}
+    assert response.headers['ETag'] == '"2"'
+    assert len(sql_statements) == 2 # UPDATE ... RETURNING version and the counter UPDATE
+    parent = db.session.get(Task, task['id'], populate_existing=True)
+    assert parent.completed_subtask_count == 1
+
+    # Already completed: nothing is written and the version stays
+    response = client.patch(f"/api/subtasks/{subtask['id']}", json={'completed': True}, headers={'Prefer': 'return=minimal'})
+    assert response.status_code == 204
+    assert response.data == b''
+    assert response.headers['ETag'] == '"2"'
+    assert db.session.get(Task, task['id'], populate_existing=True).completed_subtask_count == 1
+
+    stale = client.patch(f"/api/subtasks/{subtask['id']}", json={'completed': False}, headers={'If-Match': '"1"'})
+    assert stale.status_code == 412
+    response = client.patch(f"/api/subtasks/{subtask['id']}", json={'completed': False, 'order': 3}, headers={'If-Match': '"2"'})
+    assert response.json['version'] == 3
+    stored = db.session.get(SubTask, subtask['id'], populate_existing=True)
+    assert (stored.completed, stored.order) == (False, 3)
+    assert db.session.get(Task, task['id'], populate_existing=True).completed_subtask_count == 0
+
+def test_patch_subtask_errors(client, task, sql_statements):
+    subtask = client.post(f"/api/tasks/{task['id']}/subtasks", json={'content': 'Check'}).json
+    sql_statements.clear()
+    response = client.patch(f"/api/subtasks/{subtask['id']}", json={'order': 2}, headers={'Prefer': 'return=minimal'})
+    assert response.status_code == 204
+    assert len(sql_statements) == 1 # A single UPDATE ... RETURNING version
+    assert client.patch('/api/subtasks/non-existent-id', json={'completed': True}).status_code == 404
+    assert client.patch('/api/subtasks/non-existent-id', json={'order': 1}).status_code == 404
+    assert client.patch(f"/api/subtasks/{subtask['id']}", json={'completed': 'yes'}).status_code == 400
+    assert client.patch(f"/api/subtasks/{subtask['id']}", json={}).status_code == 400
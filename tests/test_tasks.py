@@ -220,6 +220,14 @@ def test_update_task_empty_json(client, stage):
     data = response.json
     assert data['error'] == "Request body cannot be empty. Please provide fields to update."
 
+def test_update_missing_task_with_invalid_body(client, stage):
+    # A missing task is reported before the body is validated, on PUT and PATCH
+    for method in (client.put, client.patch):
+        for body in ({}, {'content': ''}, {'start_date': 'tomorrow'}, {'order': 'x'}):
+            response = method('/api/tasks/non-existent-id', json=body)
+            assert response.status_code == 404
+            assert response.json['error'] == 'Task not found'
+
 def test_create_task_minimal_payload(client, stage):
     stage_id = stage['id']
     response = client.post(f'/api/stages/{stage_id}/tasks', json={'content': 'Minimal Task'})
@@ -240,3 +248,80 @@ def test_create_task_minimal_payload(client, stage):
     assert task.assignee is None
     assert task.start_date is None
     assert task.end_date is None
+
+def test_create_task_idempotency_key_scoped_to_path(client, project, stage):
+    other = client.post(f"/api/projects/{project['id']}/stages", json={'name': 'Other Stage'}).json
+    headers = {'Idempotency-Key': 'task-key'}
+    first = client.post(f"/api/stages/{stage['id']}/tasks", json={'content': 'Once'}, headers=headers)
+    retry = client.post(f"/api/stages/{stage['id']}/tasks", json={'content': 'Once'}, headers=headers)
+    assert retry.json['id'] == first.json['id']
+    # The same key on a different stage is a different request
+    elsewhere = client.post(f"/api/stages/{other['id']}/tasks", json={'content': 'Once'}, headers=headers)
+    assert elsewhere.status_code == 201
+    assert elsewhere.json['id'] != first.json['id']
+    assert Task.query.count() == 2
+
+def test_update_task_if_match_move(client, project, stage, sql_statements):
+    other = client.post(f"/api/projects/{project['id']}/stages", json={'name': 'Done'}).json
+    task = client.post(f"/api/stages/{stage['id']}/tasks", json={'content': 'Drag me'}).json
+    sql_statements.clear()
+    response = client.put(f"/api/tasks/{task['id']}", json={'stage_id': other['id'], 'order': 0},
+                          headers={'If-Match': f'"{task["version"]}"'})
+    assert response.status_code == 200
+    assert response.json['stage_id'] == other['id']
+    assert response.json['version'] == task['version'] + 1
+    # The conditional UPDATE (target stage check included) and the subtasks of the returned task
+    assert len(sql_statements) == 2
+    # A concurrent drag with the old version loses instead of clobbering the move
+    stale = client.put(f"/api/tasks/{task['id']}", json={'stage_id': stage['id']}, headers={'If-Match': f'"{task["version"]}"'})
+    assert stale.status_code == 412
+    assert db.session.get(Task, task['id'], populate_existing=True).stage_id == other['id']
+
+def test_task_write_statement_counts(client, stage, sql_statements):
+    sql_statements.clear()
+    response = client.post(f"/api/stages/{stage['id']}/tasks", json={'content': 'Counted', 'end_date': '2024-05-01'})
+    assert response.status_code == 201
+    assert response.json['subtasks'] == []
+    assert response.json['end_date'] == '2024-05-01'
+    assert len(sql_statements) == 1 # INSERT ... SELECT ... RETURNING
+    sql_statements.clear()
+    assert client.post('/api/stages/non-existent-id/tasks', json={'content': 'Orphan'}).status_code == 404
+    assert len(sql_statements) == 1
+
+def test_get_task_full_content(client, stage):
+    long_log = 'line\n' * 10000
+    task = client.post(f"/api/stages/{stage['id']}/tasks", json={'content': long_log}).json
+    response = client.get(f"/api/tasks/{task['id']}")
+    assert response.status_code == 200
+    assert response.json['content'] == long_log
+    assert 'content_length' not in response.json
+    assert response.headers['ETag'] == '"1"'
+    assert client.get('/api/tasks/non-existent-id').status_code == 404
+
+# PATCH /api/tasks/<task_id>
+def test_patch_task_move(client, project, stage, sql_statements):
+    other = client.post(f"/api/projects/{project['id']}/stages", json={'name': 'Done'}).json
+    task = client.post(f"/api/stages/{stage['id']}/tasks", json={'content': 'Drag me'}).json
+    client.post(f"/api/tasks/{task['id']}/subtasks", json={'content': 'Not loaded'})
+    sql_statements.clear()
+    response = client.patch(f"/api/tasks/{task['id']}", json={'stage_id': other['id'], 'order': 0},
+                            headers={'If-Match': f'"{task["version"]}"'})
+    assert response.status_code == 200
+    assert response.json == {'id': task['id'], 'version': task['version'] + 1}
+    assert len(sql_statements) == 1 # The conditional UPDATE only; no subtasks are read
+    assert db.session.get(Task, task['id'], populate_existing=True).stage_id == other['id']
+
+    minimal = client.patch(f"/api/tasks/{task['id']}", json={'assignee': 'Ana'}, headers={'Prefer': 'return=minimal'})
+    assert minimal.status_code == 204
+    assert minimal.headers['ETag'] == f'"{task["version"] + 2}"'
+    stale = client.patch(f"/api/tasks/{task['id']}", json={'order': 1}, headers={'If-Match': f'"{task["version"]}"'})
+    assert stale.status_code == 412
+
+def test_patch_task_errors(client, stage):
+    task = client.post(f"/api/stages/{stage['id']}/tasks", json={'content': 'Stay'}).json
+    assert client.patch('/api/tasks/non-existent-id', json={'order': 1}).status_code == 404
+    response = client.patch(f"/api/tasks/{task['id']}", json={'stage_id': 'non-existent-stage'})
+    assert response.status_code == 404
+    assert 'Target stage' in response.json['error']
+    assert client.patch(f"/api/tasks/{task['id']}", json={'end_date': '05/01/2024'}).status_code == 400
+    assert client.patch(f"/api/tasks/{task['id']}", json={}).status_code == 400
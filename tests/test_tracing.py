@@ -0,0 +1,84 @@
+import json
+import pytest
+from app import create_app, db
+from app.tracing import EXPORTERS, export_request
+from tests.conftest import TestConfig
+
+@pytest.fixture()
+def traced_app(tmp_path):
+    class TracingConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'traced.db')
+        TRACING_ENABLED = True
+        TRACING_SAMPLE_RATE = 1.0
+        TRACING_EXPORT_PATH = str(tmp_path / 'traces.jsonl')
+    traced_app = create_app(TracingConfig)
+    with traced_app.app_context():
+        db.create_all(bind_key=None)
+        yield traced_app
+        db.session.remove()
+        db.engine.dispose()
+
+def read_traces(app):
+    with open(app.config['TRACING_EXPORT_PATH']) as f:
+        return [json.loads(line)['resourceSpans'][0]['scopeSpans'][0]['spans'] for line in f]
+
+def attributes(span):
+    return {a['key']: next(iter(a['value'].values())) for a in span['attributes']}
+
+def test_board_request_is_traced(traced_app):
+    client = traced_app.test_client()
+    project_id = client.post('/api/projects', json={'name': 'Traced'}).json['id']
+    stage_id = client.post(f'/api/projects/{project_id}/stages', json={'name': 'To Do'}).json['id']
+    client.post(f'/api/stages/{stage_id}/tasks', json={'content': 'Write tests'})
+    open(traced_app.config['TRACING_EXPORT_PATH'], 'w').close()
+
+    response = client.get(f'/api/projects/{project_id}')
+    assert response.status_code == 200
+    assert read_traces(traced_app) == [] # The streamed board's trace ends when the server closes the body
+    response.get_data()
+    response.close()
+    [spans] = read_traces(traced_app)
+    by_name = {}
+    for s in spans:
+        by_name.setdefault(s['name'], []).append(s)
+    [root] = by_name['GET /api/projects/<string:project_id>']
+    assert 'parentSpanId' not in root and root['kind'] == 2
+    assert attributes(root)['http.status_code'] == '200' and attributes(root)['http.streamed'] is True
+    assert {s['traceId'] for s in spans} == {root['traceId']}
+
+    [load] = by_name['load_board']
+    [stage] = by_name['Stage.to_dict']
+    assert load['parentSpanId'] == stage['parentSpanId'] == root['spanId']
+    queries = by_name['db SELECT']
+    assert len(queries) == 4 # Project (before streaming), then stages, tasks and subtasks
+    assert queries[0]['parentSpanId'] == root['spanId']
+    assert all(q['parentSpanId'] == load['spanId'] for q in queries[1:])
+    assert attributes(queries[0])['db.system'] == 'sqlite'
+
+    # Other responses are encoded in one piece
+    client.get('/api/projects')
+    [_, spans] = read_traces(traced_app)
+    [encode] = [s for s in spans if s['name'] == 'serialize.json']
+    assert int(attributes(encode)['bytes']) > 0
+
+def test_traceparent_continues_trace_and_controls_sampling(traced_app):
+    client = traced_app.test_client()
+    trace_id, parent_id = '4bf92f3577b34da6a3ce929d0e0e4736', '00f067aa0ba902b7'
+    client.get('/api/projects', headers={'traceparent': f'00-{trace_id}-{parent_id}-01'})
+    client.get('/api/projects', headers={'traceparent': f'00-{trace_id}-{parent_id}-00'}) # Caller didn't sample
+    [spans] = read_traces(traced_app)
+    root = next(s for s in spans if s['name'] == 'GET /api/projects')
+    assert (root['traceId'], root['parentSpanId']) == (trace_id, parent_id)
+
+def test_sample_rate_zero_and_custom_exporter(traced_app, monkeypatch):
+    exported = []
+    monkeypatch.setitem(traced_app.extensions, 'trace_exporter', exported.append)
+    monkeypatch.setitem(traced_app.config, 'TRACING_SAMPLE_RATE', 0.0)
+    client = traced_app.test_client()
+    client.get('/api/projects')
+    assert exported == []
+    monkeypatch.setitem(traced_app.config, 'TRACING_SAMPLE_RATE', 1.0)
+    client.get('/api/projects')
+    assert [s.name for s in exported[0]][-1] == 'GET /api/projects'
+    assert set(EXPORTERS) >= {'jsonl', 'otlp'}
+    assert export_request(exported[0], 'svc')['resourceSpans'][0]['resource']['attributes'][0]['value'] == {'stringValue': 'svc'}
@@ -0,0 +1,68 @@
+import os
+import uuid
+import pytest
+from flask_migrate import downgrade, upgrade
+from sqlalchemy import text
+from app import create_app, db
+from app.models import Project
+from tests.conftest import TestConfig
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+def test_keys_round_trip_as_16_bytes(client):
+    project_id = client.post('/api/projects', json={'name': 'Binary'}).json['id']
+    stage_id = client.post(f'/api/projects/{project_id}/stages', json={'name': 'Todo'}).json['id']
+    stored = db.session.execute(text('SELECT id, project_id FROM stages')).one()
+    assert (stored.id, stored.project_id) == (uuid.UUID(stage_id).bytes, uuid.UUID(project_id).bytes)
+    assert db.session.get(Project, project_id).id == project_id
+    assert client.get(f'/api/projects/{project_id}').json['stages'][0]['id'] == stage_id
+
+def test_only_the_canonical_spelling_finds_a_row(client):
+    project_id = client.post('/api/projects', json={'name': 'Spellings'}).json['id']
+    stage_id = client.post(f'/api/projects/{project_id}/stages', json={'name': 'Todo'}).json['id']
+    task_id = client.post(f'/api/stages/{stage_id}/tasks', json={'content': 'Work'}).json['id']
+    parsed = uuid.UUID(project_id)
+    for spelling in (project_id.upper(), parsed.hex, f'{{{project_id}}}', parsed.urn, 'not-a-uuid', 'x' * 16):
+        assert client.get(f'/api/projects/{spelling}').status_code == 404
+        assert client.put(f'/api/projects/{spelling}', json={'description': 'x'}).status_code == 404
+    assert client.get(f'/api/tasks/{uuid.UUID(task_id).hex}').status_code == 404
+    assert client.delete(f'/api/tasks/{task_id.upper()}').status_code == 404
+    assert client.get(f'/api/tasks/{task_id}').status_code == 200
+
+    boards = client.get(f'/api/boards?depth=stages&ids={project_id},{parsed.hex},{project_id.upper()}').json
+    assert boards[project_id]['id'] == project_id
+    assert boards[parsed.hex]['status'] == 404 and boards[project_id.upper()]['status'] == 404
+
+@pytest.fixture
+def migrated_app(tmp_path):
+    class MigrationConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'migrate.db')
+    app = create_app(MigrationConfig)
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+def test_migration_converts_keys_both_ways(migrated_app):
+    project_id, stage_id = str(uuid.uuid4()), str(uuid.uuid4())
+    upgrade(directory=MIGRATIONS, revision='7c2e9a1f4b86')
+    with db.engine.begin() as conn:
+        conn.execute(text("INSERT INTO projects (id, name, created_at, updated_at) "
+                          "VALUES (:id, 'Legacy', '2026-01-01', '2026-01-01')"), {'id': project_id})
+        conn.execute(text("INSERT INTO stages (id, name, project_id, \"order\", created_at, updated_at) "
+                          "VALUES (:id, 'Todo', :project_id, 0, '2026-01-01', '2026-01-01')"),
+                     {'id': stage_id, 'project_id': project_id})
+        # Not canonical: kept as text bytes, so it can't be found under the canonical id
+        conn.execute(text("INSERT INTO projects (id, name, created_at, updated_at) "
+                          "VALUES (:id, 'Odd', '2026-01-01', '2026-01-01')"), {'id': project_id.upper()})
+
+    upgrade(directory=MIGRATIONS, revision='b47d0e3a9c15')
+    with db.engine.connect() as conn:
+        stage = conn.execute(text('SELECT id, project_id FROM stages')).one()
+        assert (stage.id, stage.project_id) == (uuid.UUID(stage_id).bytes, uuid.UUID(project_id).bytes)
+        assert conn.execute(text("SELECT id FROM projects WHERE name = 'Odd'")).scalar() == project_id.upper().encode()
+
+    downgrade(directory=MIGRATIONS, revision='7c2e9a1f4b86')
+    with db.engine.connect() as conn:
+        assert conn.execute(text('SELECT id, project_id FROM stages')).one() == (stage_id, project_id)
+        assert conn.execute(text("SELECT id FROM projects WHERE name = 'Odd'")).scalar() == project_id.upper()